@@ -12,68 +12,367 @@ one default reminder setting.
 
 __author__ = "Sadeeptha Bandara, Kaveesha Nissanka"
 
+import argparse
+import asyncio
+import contextlib
+import csv
 import datetime
+import email.utils
+import functools
+import heapq
+import json
+import logging
 import pickle
+import queue
+import random
 import os.path
+import re
+import shlex
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dateutil import tz
 from dateutil.relativedelta import relativedelta
+from dateutil.rrule import rrulestr
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from google_auth_oauthlib.flow import InstalledAppFlow
+from google.auth.exceptions import TransportError
 from google.auth.transport.requests import Request
 
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for EventTable
+    np = None
+
+# Navigation accepts a year, a month or a day
+DATE_QUERY_PATTERN = re.compile(r'^(\d{4})(?:-(\d{2})(?:-(\d{2}))?)?$')
+# Search matches whole words, or the start of words
+WORD_PATTERN = re.compile(r'\w+')
+
+# An RRULE UNTIL holding only a date, which is read as the end of that day
+UNTIL_DATE_PATTERN = re.compile(r'UNTIL=(\d{8})(?=;|$)')
+# The parameters and values of an EXDATE or RDATE recurrence line
+RECURRENCE_DATES_PATTERN = re.compile(r'^(EXDATE|RDATE)((?:;[^:]*)?):(.*)$')
+
+# Invitations are only sent to Monash student addresses
+STUDENT_EMAIL_PATTERN = re.compile(r'^[a-z0-9_%+-]+(?:\.[a-z0-9_%+-]+)*@student\.monash\.edu$', re.IGNORECASE)
+
+# Requests failing with these statuses are retried
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+# Requests failing with these errors never reached the server, or lost the connection, and are retried.
+# socket.timeout and the connection errors are subclasses of OSError
+TRANSPORT_ERRORS = (OSError, httplib2.HttpLib2Error, TransportError)
+
 # If modifying these scopes, delete the file token.pickle.
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly', 'https://www.googleapis.com/auth/calendar']
 
+# Held while the credentials are loaded or refreshed, so threads sharing them only refresh them once
+CREDENTIALS_LOCK = threading.RLock()
+
 
-def get_calendar_api():  # pragma: no cover
+def get_calendar_api(lazy: bool = False, pool_size: int = None, instrumentation=None):  # pragma: no cover
     """
     Get an object which allows you to consume the Google Calendar API.
     You do not need to worry about what this function exactly does, nor create test cases for it.
+    :param: lazy - If True, the credentials are loaded and the API built on first use instead
+            pool_size - The most connections kept open, and so the most requests made at once,
+                        AuthorizedHttpPool.DEFAULT_SIZE if it is not given
+            instrumentation - An optional Instrumentation, which the bytes received are counted in
     """
-    creds = None
-    # The file token.pickle stores the user's access and refresh tokens, and is
-    # created automatically when the authorization flow completes for the first
-    # time.
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
-
-    # If there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        # Save the credentials for the next run
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
+    if lazy:
+        return LazyCalendarApi(functools.partial(get_calendar_api, pool_size=pool_size,
+                                                 instrumentation=instrumentation))
+
+    creds = get_credentials()
+    http = AuthorizedHttpPool(creds, AuthorizedHttpPool.DEFAULT_SIZE if pool_size is None else pool_size,
+                              instrumentation=instrumentation)
+    # The discovery document shipped with the client library is used, rather than downloading it
+    return build('calendar', 'v3', http=http, static_discovery=True, cache_discovery=False)
+
+
+def get_credentials():  # pragma: no cover
+    """
+    Load the user's credentials, refreshing them or letting the user log in if they are not valid
+    :return: The credentials
+    """
+    with CREDENTIALS_LOCK:
+        creds = None
+        # The file token.pickle stores the user's access and refresh tokens, and is
+        # created automatically when the authorization flow completes for the first
+        # time.
+        if os.path.exists('token.pickle'):
+            with open('token.pickle', 'rb') as token:
+                creds = pickle.load(token)
+
+        # If there are no (valid) credentials available, let the user log in.
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    'credentials.json', SCOPES)
+                creds = flow.run_local_server(port=0)
+            # Save the credentials for the next run
+            with open('token.pickle', 'wb') as token:
+                pickle.dump(creds, token)
+        return creds
+
+
+class LazyCalendarApi:
+    """
+    Stands in for the calendar API, only building it when it is first used
+    """
+
+    def __init__(self, build_api):
+        """
+        :param:  build_api - The function building the API
+        """
+        self._build_api = build_api
+        self._api = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.get_api(), name)
+
+    def get_api(self):
+        """
+        :return: The API, built on the first call
+        """
+        if self._api is None:
+            with self._lock:
+                if self._api is None:
+                    self._api = self._build_api()
+        return self._api
+
+
+class AuthorizedHttpPool:
+    """
+    A bounded pool of authorised keep alive HTTP connections, shared by threads.
+    The API client is built on the pool in place of a single httplib2.Http, which cannot be used by two threads
+    at once. Each request borrows a connection, opening one if none are free and the pool is not full, or
+    waiting for one to be returned otherwise. Returned connections stay open, so later requests skip the TLS
+    handshake. The credentials are refreshed before they expire, by one thread at a time
+    """
+    DEFAULT_SIZE = 8
+
+    def __init__(self, credentials, size: int = DEFAULT_SIZE, http_factory=None, timeout: float = None,
+                 lock=CREDENTIALS_LOCK, instrumentation=None):
+        """
+        :param:  credentials - The credentials requests are authorised with
+                 size - The most connections open at once
+                 http_factory - The function opening a connection, an AuthorizedHttp if it is not given
+                 timeout - The number of seconds to wait for a free connection, None to wait until one is free
+                 lock - The lock held while the credentials are refreshed
+                 instrumentation - An optional Instrumentation, which the bytes of each response body are
+                                   counted in as bytes_received. httplib2 has already decompressed the body
+        """
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
 
-    return build('calendar', 'v3', credentials=creds)
+        self.credentials = credentials
+        self.size = size
+        self.http_factory = http_factory
+        self.timeout = timeout
+        self.lock = lock
+        self.instrumentation = Instrumentation(enabled=False) if instrumentation is None else instrumentation
+        # The most recently returned connection is borrowed first, as it is the most likely to still be open
+        self._connections = queue.LifoQueue(size)
+        self._opened = 0
+        self._pool_lock = threading.Lock()
+
+    def _open(self):
+        if self.http_factory is not None:
+            return self.http_factory()
+        return AuthorizedHttp(self.credentials, http=httplib2.Http())
+
+    def acquire(self):
+        """
+        Borrow a connection, which must be returned with release
+        :return: The connection
+        """
+        try:
+            return self._connections.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            if self._opened < self.size:
+                self._opened += 1
+                return self._open()
+        try:
+            return self._connections.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError("No connection was free within {} seconds".format(self.timeout)) from None
+
+    def release(self, http):
+        """
+        Return a borrowed connection to the pool
+        :param:  http - The connection
+        """
+        self._connections.put_nowait(http)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a with block
+        """
+        http = self.acquire()
+        try:
+            yield http
+        finally:
+            self.release(http)
+
+    def refresh_credentials(self):
+        """
+        Refresh the credentials if they have expired. Threads finding them expired together wait for
+        the first to refresh them, rather than each refreshing them
+        """
+        if self.credentials.valid:
+            return
+        with self.lock:
+            if not self.credentials.valid:
+                self.credentials.refresh(Request())
+
+    def request(self, *args, **kwargs):
+        """
+        Make a request on a borrowed connection, taking the same arguments as httplib2.Http.request
+        :return: The response and its content
+        """
+        self.refresh_credentials()
+        with self.connection() as http:
+            response, content = http.request(*args, **kwargs)
+        self.instrumentation.count('bytes_received', len(content or b''))
+        return response, content
+
+    def close(self):
+        """
+        Close the connections which are not borrowed
+        """
+        while True:
+            try:
+                http = self._connections.get_nowait()
+            except queue.Empty:
+                return
+            with self._pool_lock:
+                self._opened -= 1
+            http.close()
 
 
 class Calendar:
     DEFAULT_CALENDAR_ID = "primary"
     DEFAULT_FUTURE_YEAR_RANGE = 2
     DEFAULT_PAST_YEAR_RANGE = 5
+    DEFAULT_PAGE_SIZE = 250
+    MAX_BATCH_SIZE = 50
+    DEFAULT_BATCH_RETRIES = 3
+    DEFAULT_BACKOFF_SECONDS = 1
+    DEFAULT_SHARD_WORKERS = 1
+    MAX_SHARD_SPLIT = 8
+    # All day events are placed at midnight utc, which can be up to a day from their start in the calendar's timezone
+    SHARD_OVERLAP = datetime.timedelta(days=1)
+    # Partial responses, holding only the parts of each event an operation uses
+    FIELDS_SUMMARY = 'nextPageToken,defaultReminders,timeZone,items(id,summary,start,end,reminders)'
+    FIELDS_INDEX = ('nextPageToken,defaultReminders,timeZone,'
+                    'items(id,summary,description,location,start,end,transparency,reminders)')
+    FIELDS_ATTENDEES = 'nextPageToken,defaultReminders,timeZone,items(id,summary,start,end,reminders,attendees)'
 
-    def __init__(self, api, calendar_id: str = DEFAULT_CALENDAR_ID):
+    def __init__(self, api, calendar_id: str = DEFAULT_CALENDAR_ID, event_store=None, cache=None,
+                 lazy: bool = False, executor=None, instrumentation=None, shard_workers: int = DEFAULT_SHARD_WORKERS,
+                 expand_recurring: bool = False):
         """"
         Initialises the Calendar, with the default calendarId
         :param:  api - The google calendar API reference
                  calendar_id - The id of the calendar, by default it is set to the users primary calendar
+                 event_store - An optional EventStore, which events are read from instead of the API
+                 cache - An optional ResponseCache, which repeated event windows are answered from
+                 lazy - If True, the reminder defaults are not requested until they are first needed,
+                        or are taken from the first events list response
+                 executor - The RequestExecutor every request is made through, which should be shared by
+                            the calendars of a user. A new one is created if it is not given
+                 instrumentation - An optional Instrumentation, which the timings of operations and counts of
+                                   events and cache hits are recorded to. It is also given to the new executor
+                 shard_workers - The number of requests made at once when fetching a window of events. Above 1,
+                                 windows holding more than a page are split into shards which are fetched
+                                 concurrently
+                 expand_recurring - If True, recurring events are fetched once, and their instances within each
+                                    window are expanded locally from their recurrence rules
         """
+        if shard_workers < 1:
+            raise ValueError("Shard workers must be at least 1")
+
         self.api = api
+        self.shard_workers = shard_workers
+        self.expand_recurring = expand_recurring
+        self.instrumentation = Instrumentation(enabled=False) if instrumentation is None else instrumentation
+        self.executor = RequestExecutor(instrumentation=self.instrumentation) if executor is None else executor
         self.calendar_id = calendar_id
-        self.reminder_defaults = self.get_calendar_reminder_defaults()
-        self.event_reminder_defaults = self.reminder_defaults
+        self.event_store = event_store
+        self.cache = cache
+        self._window_anchor = None
+        self._indexed_events = None
+        self._date_index = None
+        self._keyword_index = None
+        self._interval_index = None
+        self.reminder_scheduler = None
+        self._reminder_defaults = None
+        self._event_reminder_defaults = None
+        # The calendar's timezone, which all day events start at midnight in, from the last events list
+        self.time_zone = None
+        if not lazy:
+            self.reminder_defaults = self.get_calendar_reminder_defaults()
+            self.event_reminder_defaults = self.reminder_defaults
+
+    @property
+    def reminder_defaults(self):
+        """
+        The global reminder defaults for the calendar, requested on first use
+        """
+        if self._reminder_defaults is None:
+            self._reminder_defaults = self.get_calendar_reminder_defaults()
+        return self._reminder_defaults
+
+    @reminder_defaults.setter
+    def reminder_defaults(self, reminder_defaults):
+        self._reminder_defaults = reminder_defaults
+
+    @property
+    def event_reminder_defaults(self):
+        """
+        The reminder defaults returned with the last events list, or the calendar's before any list
+        """
+        if self._event_reminder_defaults is None:
+            return self.reminder_defaults
+        return self._event_reminder_defaults
+
+    @event_reminder_defaults.setter
+    def event_reminder_defaults(self, reminder_defaults):
+        self._event_reminder_defaults = reminder_defaults
+        # The events list returns the same defaults, which saves requesting them separately
+        if self._reminder_defaults is None:
+            self._reminder_defaults = reminder_defaults
+
+    def _read_list_settings(self, events_response):
+        """
+        Keep the reminder defaults and timezone of the calendar returned with an events list
+        :param:  events_response - The response of the events list request
+        """
+        self.event_reminder_defaults = events_response['defaultReminders'][
+            0]  # REVIEW: Retrieve reminder 'method' as well?
+        if 'timeZone' in events_response:
+            self.time_zone = get_time_zone(events_response['timeZone'], self.time_zone)
 
     def get_calendar_reminder_defaults(self):
         """
         Get the global reminder defaults for calendar
         :return: The calendars default reminder
         """
-        calendar_resource = self.api.calendarList().get(calendarId=self.calendar_id).execute()
+        calendar_resource = self.executor.execute(self.api.calendarList().get(calendarId=self.calendar_id))
         return calendar_resource['defaultReminders'][0]  # REVIEW: Retrieve reminder 'method' as well?
 
     def get_upcoming_events(self, starting_time: str, number_of_events: int):
@@ -86,56 +385,397 @@ class Calendar:
         if number_of_events <= 0:
             raise ValueError("Number of events must be at least 1")
 
-        events_response = self.api.events().list(calendarId=self.calendar_id, timeMin=starting_time,
-                                                 maxResults=number_of_events, singleEvents=True,
-                                                 orderBy='startTime').execute()
+        events_response = self.executor.execute(
+            self.api.events().list(calendarId=self.calendar_id, timeMin=starting_time, maxResults=number_of_events,
+                                   singleEvents=True, orderBy='startTime'))
 
-        self.event_reminder_defaults = events_response['defaultReminders'][
-            0]  # REVIEW: Retrieve reminder 'method' as well?
+        self._read_list_settings(events_response)
         return events_response.get('items', [])
 
-    def _get_events_from_year(self, years):
+    def iter_events(self, time_min: str, time_max: str, page_size: int = DEFAULT_PAGE_SIZE,
+                    prefetch: bool = False, fields: str = None, single_events: bool = True):
+        """
+        Lazily iterate over the events between two times, following every page of the response
+        :param:  time_min - The lower bound (exclusive) for an event's end time, in ISO format
+                 time_max - The upper bound (exclusive) for an event's start time, in ISO format
+                 page_size - The maximum number of events requested per page
+                 prefetch - If True, the next page is requested in the background while the
+                            current page is being consumed
+                 fields - The partial response to request, such as FIELDS_SUMMARY, None for whole events
+                 single_events - If False, recurring events are returned once with their recurrence rules,
+                                 along with their modified and cancelled instances, in no particular order
+        :return: A generator yielding the events one at a time, ordered by start time
+        """
+        for page in self.iter_event_pages(time_min, time_max, page_size, prefetch, fields, single_events):
+            for event in page:
+                yield event
+
+    def iter_event_pages(self, time_min: str, time_max: str, page_size: int = DEFAULT_PAGE_SIZE,
+                         prefetch: bool = False, fields: str = None, single_events: bool = True):
+        """
+        Lazily iterate over the pages of events between two times
+        :param:  time_min - The lower bound (exclusive) for an event's end time, in ISO format
+                 time_max - The upper bound (exclusive) for an event's start time, in ISO format
+                 page_size - The maximum number of events requested per page
+                 prefetch - If True, the next page is requested in the background while the
+                            current page is being consumed
+                 fields - The partial response to request, such as FIELDS_SUMMARY, None for whole events
+                 single_events - If False, recurring events are returned once with their recurrence rules
+        :return: A generator yielding a list of events for each page, ordered by start time
+        """
+        if page_size <= 0:
+            raise ValueError("Page size must be at least 1")
+
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            events_response = self._list_events_page(time_min, time_max, page_size, fields=fields,
+                                                     single_events=single_events)
+            self._read_list_settings(events_response)
+
+            page_token = None
+            while True:
+                next_page_token = events_response.get('nextPageToken')
+                # A repeated token would request the same page forever
+                has_next_page = bool(next_page_token) and next_page_token != page_token
+
+                next_page = None
+                if has_next_page and executor is not None:
+                    next_page = executor.submit(self._list_events_page, time_min, time_max, page_size,
+                                                next_page_token, fields, single_events)
+
+                items = events_response.get('items', [])
+                self.instrumentation.count('events_received', len(items))
+                yield items
+
+                if not has_next_page:
+                    break
+                if next_page is not None:
+                    events_response = next_page.result()
+                else:
+                    events_response = self._list_events_page(time_min, time_max, page_size, next_page_token,
+                                                             fields, single_events)
+                page_token = next_page_token
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def _list_events_page(self, time_min: str, time_max: str, page_size: int, page_token: str = None,
+                          fields: str = None, single_events: bool = True):
+        """
+        Request a single page of events between two times
+        :param:  time_min - The lower bound for an event's end time, in ISO format
+                 time_max - The upper bound for an event's start time, in ISO format
+                 page_size - The maximum number of events in the page
+                 page_token - The token of the page to request, None for the first page
+                 fields - The partial response to request, None for whole events
+                 single_events - If False, recurring events are returned once, and the page is not ordered
+        :return: The events list response for the page
+        """
+        options = {} if fields is None else {'fields': fields}
+        if single_events:
+            # The API can only order by start time when recurring events are expanded into instances
+            options['orderBy'] = 'startTime'
+        return self.executor.execute(
+            self.api.events().list(calendarId=self.calendar_id, singleEvents=single_events, timeMin=time_min,
+                                   timeMax=time_max, maxResults=page_size, pageToken=page_token, **options))
+
+    def _get_year_window(self, years):
+        """
+        Get the time window between now and the specified number of years
+        :param:  years - The number of years from now
+                            positive for years to the future, negative for years in the past
+        :return: A tuple of the start and end of the window, in ISO format
+        """
+        time_now = self._get_window_anchor()
+        change_date = time_now + relativedelta(years=years)
+
+        return get_date_iso(min(time_now, change_date)), get_date_iso(max(time_now, change_date))
+
+    def _get_window_anchor(self):
+        """
+        Get the time that event windows are measured from.
+        With a cache, the same time is used until the cached windows expire, so that repeated
+        views request identical windows
+        :return: The current utc time, or the time the cached windows were measured from
+        """
+        time_now = datetime.datetime.utcnow()
+        if self.cache is None:
+            return time_now
+
+        cache_ttl = datetime.timedelta(seconds=self.cache.ttl)
+        if self._window_anchor is None or time_now - self._window_anchor >= cache_ttl:
+            self._window_anchor = time_now
+        return self._window_anchor
+
+    def _get_events_from_year(self, years, fields: str = None):
         """
         Get events within specified year limit
         :param:  years - The number of years that need to display events
                             positive for years to the future, negative for years in the past
+                 fields - The partial response to request, None for whole events
         :return: A list of the events upto the specified number of years
         """
-        time_now = datetime.datetime.utcnow()
-        change_date = time_now + relativedelta(years=years)
+        time_min, time_max = self._get_year_window(years)
+        return self._get_window_events(time_min, time_max, fields)
 
-        time_min = get_date_iso(min(time_now, change_date))
-        time_max = get_date_iso(max(time_now, change_date))
+    def _get_window_events(self, time_min: str, time_max: str, fields: str = None):
+        """
+        Get the events between two times, from the cache if they were fetched recently
+        :param:  time_min - The lower bound for an event's end time, in ISO format
+                 time_max - The upper bound for an event's start time, in ISO format
+                 fields - The partial response to request, None for whole events.
+                          Only requests for fields the event store holds are answered from it
+        :return: A list of the events, ordered by start time
+        """
+        cache_key = self._get_cache_key(time_min, time_max, fields)
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.instrumentation.count('cache_hits')
+                events, self.event_reminder_defaults, self.time_zone = cached
+                return list(events)
+            self.instrumentation.count('cache_misses')
 
-        events_response = self.api.events().list(calendarId=self.calendar_id, singleEvents=True,
-                                                 orderBy='startTime', timeMin=time_min,
-                                                 timeMax=time_max).execute()
+        with self.instrumentation.span('fetch_window'):
+            if self.event_store is not None and self.event_store.holds_fields(fields):
+                events = self._get_stored_events(time_min, time_max)
+            elif self.expand_recurring:
+                events = self._get_expanded_events(time_min, time_max, fields)
+            elif self.shard_workers > 1:
+                events = self._get_sharded_events(time_min, time_max, fields=fields)
+            else:
+                events = list(self.iter_events(time_min, time_max, fields=fields))
 
-        self.event_reminder_defaults = events_response['defaultReminders'][
-            0]  # REVIEW: Retrieve reminder 'method' as well?
-        return events_response.get('items', [])
+        if self.cache is not None:
+            self.cache.put(cache_key, (events, self.event_reminder_defaults, self.time_zone))
+            return list(events)
+        return events
+
+    def _get_cache_key(self, time_min: str, time_max: str, fields: str = None):
+        single_events = not self.expand_recurring
+        return (self.calendar_id, time_min, time_max, single_events, 'startTime' if single_events else None,
+                fields)
+
+    def _iter_window_events(self, time_min: str, time_max: str, fields: str = None,
+                            page_size: int = DEFAULT_PAGE_SIZE):
+        """
+        Lazily get the events between two times, from the cache or the event store if they hold them,
+        and otherwise a page at a time from the API. The events are not cached, so that only a page of them
+        is held in memory
+        :param:  time_min - The lower bound for an event's end time, in ISO format
+                 time_max - The upper bound for an event's start time, in ISO format
+                 fields - The partial response to request, None for whole events
+                 page_size - The maximum number of events requested per page
+        :return: A generator yielding the events, ordered by start time
+        """
+        cached = self.cache.get(self._get_cache_key(time_min, time_max, fields)) if self.cache is not None else None
+        if cached is not None:
+            self.instrumentation.count('cache_hits')
+            events, self.event_reminder_defaults, self.time_zone = cached
+            yield from events
+        elif self.event_store is not None and self.event_store.holds_fields(fields):
+            self._sync_event_store()
+            yield from self.event_store.iter_events(time_min, time_max, page_size)
+        elif self.expand_recurring or self.shard_workers > 1:
+            # Expanding and sharding need the whole window before the events are in order
+            yield from self._get_window_events(time_min, time_max, fields)
+        else:
+            yield from self.iter_events(time_min, time_max, page_size, prefetch=True, fields=fields)
+
+    def _get_expanded_events(self, time_min: str, time_max: str, fields: str = None):
+        """
+        Get the events between two times, fetching each recurring event once and expanding its instances
+        within the window from its recurrence rules.
+        Modified instances replace the instance they were moved from, and cancelled instances are left out
+        :param:  time_min - The lower bound for an event's end time, in ISO format
+                 time_max - The upper bound for an event's start time, in ISO format
+                 fields - The partial response to request, None for whole events
+        :return: A list of the events and instances, ordered by start time
+        """
+        if fields is not None:
+            fields = fields.replace('items(', 'items(status,recurrence,recurringEventId,originalStartTime,', 1)
+
+        events = []
+        recurring_events = []
+        exceptions = {}
+        for event in self.iter_events(time_min, time_max, fields=fields, single_events=False):
+            if 'recurrence' in event:
+                recurring_events.append(event)
+            elif 'recurringEventId' in event:
+                original_start = parse_event_time(event['originalStartTime'])
+                exceptions[(event['recurringEventId'], original_start.timestamp())] = event
+            elif event.get('status') != 'cancelled':
+                events.append(event)
+
+        window_start, window_end = parse_iso_time(time_min), parse_iso_time(time_max)
+        for recurring_event in recurring_events:
+            events.extend(expand_recurring_event(recurring_event, window_start, window_end, exceptions))
+        # Instances moved into the window from outside it were not expanded
+        events.extend(event for event in exceptions.values()
+                      if event.get('status') != 'cancelled' and parse_event_time(event['end']) > window_start
+                      and parse_event_time(event['start']) < window_end)
+
+        events.sort(key=lambda event: get_event_timestamp(event['start']))
+        return events
+
+    def _get_sharded_events(self, time_min: str, time_max: str, page_size: int = DEFAULT_PAGE_SIZE,
+                            fields: str = None):
+        """
+        Get the events between two times, fetching shards of the window concurrently.
+        The first page of the whole window is requested first, so a sparse window takes a single request.
+        When a page is not the whole of its shard, the rest of the shard is split by the density of that page,
+        into shards expected to hold about a page each, so busy periods are fetched in parallel.
+        Events overlapping the boundary of two shards are returned by both, and only kept once
+        :param:  time_min - The lower bound for an event's end time, in ISO format
+                 time_max - The upper bound for an event's start time, in ISO format
+                 page_size - The maximum number of events requested per page
+                 fields - The partial response to request, None for whole events
+        :return: A list of the events, ordered by start time
+        """
+        window_start, window_end = parse_iso_time(time_min), parse_iso_time(time_max)
+        pieces = {}
+
+        with ThreadPoolExecutor(max_workers=self.shard_workers) as pool:
+            def submit(start, end):
+                future = pool.submit(self._list_events_page, get_utc_iso(start), get_utc_iso(end), page_size,
+                                     None, fields)
+                pending[future] = (start, end)
+
+            pending = {}
+            submit(window_start, window_end)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start, end = pending.pop(future)
+                    events_response = future.result()
+                    self._read_list_settings(events_response)
+                    items = events_response.get('items', [])
+                    self.instrumentation.count('events_received', len(items))
+                    pieces[(start, 0)] = items
+
+                    next_page_token = events_response.get('nextPageToken')
+                    if not next_page_token or not items:
+                        continue
+                    # Every event starting before the last one of the page is in the page
+                    rest_start = parse_event_time(items[-1]['start']) - self.SHARD_OVERLAP
+                    if rest_start <= start:
+                        # Too dense to split by time, so page through the rest of the shard in order
+                        pieces[(start, 1)] = pool.submit(self._list_remaining_events, start, end, page_size,
+                                                         next_page_token, fields)
+                        continue
+                    # Split the rest into pieces expected to hold about a page each
+                    pages = (end - rest_start) / (rest_start + self.SHARD_OVERLAP - start)
+                    splits = max(2, min(self.MAX_SHARD_SPLIT, int(pages) + 1))
+                    for piece_start, piece_end in split_window(rest_start, end, (end - rest_start) / splits):
+                        submit(piece_start, piece_end)
+
+        events = []
+        seen = set()
+        for key in sorted(pieces):
+            piece = pieces[key]
+            for event in piece.result() if key[1] else piece:
+                if event['id'] not in seen:
+                    seen.add(event['id'])
+                    events.append(event)
+        return events
+
+    def _list_remaining_events(self, start, end, page_size: int, page_token: str, fields: str = None):
+        """
+        Page through the rest of the events between two times, from a page token
+        :param:  start - The lower bound for an event's end time
+                 end - The upper bound for an event's start time
+                 page_size - The maximum number of events requested per page
+                 page_token - The token of the first page to request
+                 fields - The partial response to request, None for whole events
+        :return: A list of the events, ordered by start time
+        """
+        time_min, time_max = get_utc_iso(start), get_utc_iso(end)
+        events = []
+        while page_token:
+            events_response = self._list_events_page(time_min, time_max, page_size, page_token, fields)
+            items = events_response.get('items', [])
+            self.instrumentation.count('events_received', len(items))
+            events.extend(items)
+            next_page_token = events_response.get('nextPageToken')
+            page_token = next_page_token if next_page_token != page_token else None
+        return events
 
-    def get_past_events(self, years_past: int = DEFAULT_PAST_YEAR_RANGE):
+    def _get_stored_events(self, time_min: str, time_max: str):
+        """
+        Bring the event store up to date, and read the events between two times from it
+        :param:  time_min - The lower bound for an event's end time, in ISO format
+                 time_max - The upper bound for an event's start time, in ISO format
+        :return: A list of the stored events, ordered by start time
+        """
+        self._sync_event_store()
+        return self.event_store.get_events(time_min, time_max)
+
+    def _sync_event_store(self):
+        """
+        Bring the event store up to date, and take the calendar's reminder defaults and timezone from it
+        """
+        self.event_store.sync()
+        default_reminders = self.event_store.get_default_reminders()
+        if default_reminders:
+            self.event_reminder_defaults = default_reminders[0]
+        self.time_zone = get_time_zone(self.event_store.get_time_zone(), self.time_zone)
+
+    def get_past_events(self, years_past: int = DEFAULT_PAST_YEAR_RANGE, fields: str = None):
         """
          Get events within specified year limit in the past
          :param: years_past - The number of years
+                 fields - The partial response to request, such as FIELDS_SUMMARY, None for whole events
         :return: A list of the events in the past
         """
         if years_past < 0:
             raise ValueError("Year Input cannot be negative")
 
         year_input = - years_past
-        return self._get_events_from_year(year_input)
+        with self.instrumentation.span('get_past_events'):
+            return self._get_events_from_year(year_input, fields)
 
-    def get_future_events(self, years_future: int = DEFAULT_FUTURE_YEAR_RANGE):
+    def get_future_events(self, years_future: int = DEFAULT_FUTURE_YEAR_RANGE, fields: str = None):
         """
          Get events within specified year limit in the future
          :param: years_future - The number of years
+                 fields - The partial response to request, such as FIELDS_SUMMARY, None for whole events
         :return: A list of the events in the future
         """
         if years_future < 0:
             raise ValueError("Year Input cannot be negative")
-        return self._get_events_from_year(years_future)
+        with self.instrumentation.span('get_future_events'):
+            return self._get_events_from_year(years_future, fields)
+
+    def iter_past_events(self, years_past: int = DEFAULT_PAST_YEAR_RANGE, fields: str = FIELDS_INDEX):
+        """
+        Stream the events within specified year limit in the past, so that only a page of them is held in memory
+        :param:  years_past - The number of years
+                 fields - The partial response to request, None for whole events
+        :return: A generator yielding the Events in the past, ordered by start time
+        """
+        if years_past < 0:
+            raise ValueError("Year Input cannot be negative")
+        return self.iter_to_events(self._iter_window_events(*self._get_year_window(-years_past), fields))
+
+    def iter_future_events(self, years_future: int = DEFAULT_FUTURE_YEAR_RANGE, fields: str = FIELDS_INDEX):
+        """
+        Stream the events within specified year limit in the future, so that only a page of them is held in memory
+        :param:  years_future - The number of years
+                 fields - The partial response to request, None for whole events
+        :return: A generator yielding the Events in the future, ordered by start time
+        """
+        if years_future < 0:
+            raise ValueError("Year Input cannot be negative")
+        return self.iter_to_events(self._iter_window_events(*self._get_year_window(years_future), fields))
+
+    def get_event_details(self, event_id: str):
+        """
+        Get the whole of a single event, for when more is needed than a partial response holds
+        :param:  event_id - The id of the event
+        :return: The event, as returned by the API
+        """
+        return self.executor.execute(self.api.events().get(calendarId=self.calendar_id, eventId=event_id))
 
     def get_events_with_reminders(self, events):
         """
@@ -143,86 +783,239 @@ class Calendar:
         :param:  events - the list of events to return reminders from
         :return: A list of the formatted event reminders
         """
-        for event in events:
-            if event['reminders']['useDefault']:
-                event['reminders'] = [self.reminder_defaults]
-            else:
-                try:
-                    event['reminders']['overrides']
-                except KeyError:
-                    event['reminders'] = []
-                else:
-                    event['reminders'] = event['reminders']['overrides']
-
-        return events
+        with self.instrumentation.span('get_events_with_reminders'):
+            self.instrumentation.count('events_processed', len(events))
+            return [self.get_event_reminder(event) for event in events]
 
     def get_event_reminder(self, event):
         """"
         Returns the event with the reminder reformatted for later use
+        The given event is left unchanged, so that it can be reformatted again
         :param:  event - The event that will be reformatted
         :return: A formatted event reminder
         """
         if event['reminders']['useDefault']:
-            event['reminders'] = [self.reminder_defaults]
+            reminders = [self.reminder_defaults]
         else:
-            try:
-                event['reminders']['overrides']
-            except KeyError:
-                event['reminders'] = []
-            else:
-                event['reminders'] = event['reminders']['overrides']
-        return event
+            reminders = event['reminders'].get('overrides', [])
+        return dict(event, reminders=reminders)
 
-    def navigate_to_events(self, time):
+    def navigate_to_events(self, time, refresh: bool = False):
         """
         Allows Users to navigate to events within a specific timeline
-        :param:  time - The time that the user wishes to go to
+        The events are fetched and indexed by date on the first navigation, later navigations
+        are answered from the index
+        :param:  time - The time that the user wishes to go to, as a year, month or day (YYYY, YYYY-MM, YYYY-MM-DD)
+                 refresh - If True, the events are fetched again before navigating
         :return: A list of the search results
         """
-        events = self.get_past_events()
-        events += self.get_future_events()
-        resultList = []
-        for event in events:
-            try:
-                eventTime = event['start']['dateTime'].split('T', 1)
-            except KeyError:
-                eventTime = [event['start']['date']]
-            if time in eventTime[0]:
-                result = 'Event:' + event['summary'] + ' at ' + event['start'].get('dateTime',
-                                                                                   event['start'].get('date'))
-                if event['reminders']['useDefault']:
-                    result += '\nReminder in 10 minutes before event'
-                else:
-                    for reminder in event['reminders']['overrides']:
-                        result += '\nReminder in ' + str(reminder['minutes']) + ' minutes before event as ' + reminder[
-                            'method']
-                resultList.append(result)
+        with self.instrumentation.span('navigate_to_events'):
+            resultList = [self._format_event_result(event) for event in self.get_events_on(time, refresh)]
         if len(resultList) < 1:
             resultList = "Nothing showed up at this time: " + time
         return resultList
 
-    def search_events(self, keyword: str):
+    def get_events_on(self, time, refresh: bool = False):
+        """
+        Get the events starting within a year, month or day, from the date index
+        :param:  time - The year, month or day, as YYYY, YYYY-MM or YYYY-MM-DD
+                 refresh - If True, the events are fetched again first
+        :return: A list of the Events, empty if the time is not a valid year, month or day
+        """
+        events = self._get_indexed_events(refresh)
+        if self._date_index is None:
+            with self.instrumentation.span('build_date_index'):
+                self._date_index = DateIndex(events)
+
+        try:
+            return self._date_index.get_events(time)
+        except ValueError:
+            return []
+
+    def find_events(self, keyword: str, match_all: bool = True, refresh: bool = False):
+        """
+        Get the events matching the words of a keyword, from the keyword index
+        :param:  keyword - The words to search for
+                 match_all - If True, events must match every word of the keyword, otherwise any word
+                 refresh - If True, the events are fetched again first
+        :return: A list of the matching Events
+        """
+        events = self._get_indexed_events(refresh)
+        if self._keyword_index is None:
+            with self.instrumentation.span('build_keyword_index'):
+                self._keyword_index = KeywordIndex(events)
+        with self.instrumentation.span('keyword_search'):
+            return self._keyword_index.search(keyword, match_all=match_all)
+
+    def get_events_between(self, start, end, refresh: bool = False):
+        """
+        Get the events overlapping a time range, such as 14:00 to 15:30 on a day, from the interval index
+        :param:  start - The start of the range, a timezone aware datetime or ISO formatted time
+                 end - The end of the range
+                 refresh - If True, the events are fetched again first
+        :return: A list of the Events, ordered by start
+        """
+        return self._get_interval_index(refresh).overlapping(start, end)
+
+    def find_conflicts(self, refresh: bool = False):
+        """
+        Find every pair of events which overlap each other
+        :param:  refresh - If True, the events are fetched again first
+        :return: A list of (earlier Event, later Event) pairs
+        """
+        return self._get_interval_index(refresh).conflicts()
+
+    def find_free_slots(self, start, end, duration, calendar_ids=None, refresh: bool = False):
+        """
+        Find the gaps between events long enough for a new event
+        :param:  start - The start of the range searched, a timezone aware datetime or ISO formatted time
+                 end - The end of the range searched
+                 duration - The shortest gap wanted, a timedelta
+                 calendar_ids - If given, the gaps are found in the busy times of these calendars, from the
+                                free/busy endpoint, rather than in the events of this calendar
+                 refresh - If True, the events are fetched again first
+        :return: A list of (start, end) of each gap, as utc datetimes
+        """
+        if calendar_ids is None:
+            return self._get_interval_index(refresh).free_slots(start, end, duration)
+        busy_intervals = self.get_busy_intervals(start, end, calendar_ids)
+        return find_free_slots([(busy_start.timestamp(), busy_end.timestamp())
+                                for intervals in busy_intervals.values() for busy_start, busy_end in intervals],
+                               start, end, duration)
+
+    def get_busy_intervals(self, start, end, calendar_ids=None):
+        """
+        Get the busy times of calendars from the free/busy endpoint, which also answers for calendars
+        whose events cannot be read
+        :param:  start - The start of the range, a timezone aware datetime or ISO formatted time
+                 end - The end of the range
+                 calendar_ids - The ids of the calendars, this calendar if they are not given
+        :return: A dictionary of each calendar id, to a list of its busy (start, end) as timezone aware datetimes
+        """
+        if calendar_ids is None:
+            calendar_ids = [self.calendar_id]
+        if not isinstance(start, str):
+            start = get_utc_iso(start)
+        if not isinstance(end, str):
+            end = get_utc_iso(end)
+
+        response = self.executor.execute(self.api.freebusy().query(body={
+            'timeMin': start, 'timeMax': end, 'items': [{'id': calendar_id} for calendar_id in calendar_ids]}))
+
+        busy_intervals = {}
+        for calendar_id in calendar_ids:
+            calendar = response['calendars'].get(calendar_id, {})
+            if calendar.get('errors'):
+                raise ValueError("Free/busy unavailable for {}: {}".format(
+                    calendar_id, ', '.join(error.get('reason', '') for error in calendar['errors'])))
+            busy_intervals[calendar_id] = [(parse_iso_time(busy['start']), parse_iso_time(busy['end']))
+                                           for busy in calendar.get('busy', [])]
+        return busy_intervals
+
+    def _get_interval_index(self, refresh: bool = False):
+        events = self._get_indexed_events(refresh)
+        if self._interval_index is None:
+            with self.instrumentation.span('build_interval_index'):
+                self._interval_index = IntervalIndex(events)
+        return self._interval_index
+
+    def _get_indexed_events(self, refresh: bool = False):
+        """
+        Get the past and future events that navigation and search are answered from.
+        They are fetched on first use, and the indexes over them are built as they are needed
+        :param:  refresh - If True, the events are fetched again and the indexes dropped
+        :return: A list of the events
+        """
+        if refresh or self._indexed_events is None:
+            events = self.get_past_events(fields=self.FIELDS_INDEX)
+            events += self.get_future_events(fields=self.FIELDS_INDEX)
+            self._indexed_events = self.to_events(events)
+            self._date_index = None
+            self._keyword_index = None
+            self._interval_index = None
+        return self._indexed_events
+
+    def schedule_reminders(self, callback, years_future: int = DEFAULT_FUTURE_YEAR_RANGE):
+        """
+        Start firing the reminders of the future events in the background.
+        Events deleted through the calendar have their reminders cancelled
+        :param:  callback - The function called with the Event, the Reminder and the fire time of each reminder
+                 years_future - The number of years of events to schedule
+        :return: The running ReminderScheduler, which events can be added to, updated in and removed from
+        """
+        if self.reminder_scheduler is not None:
+            self.reminder_scheduler.stop()
+        scheduler = ReminderScheduler(callback)
+        scheduler.add_events(self.to_events(self.get_future_events(years_future, self.FIELDS_SUMMARY)))
+        scheduler.start()
+        self.reminder_scheduler = scheduler
+        return scheduler
+
+    def to_events(self, events):
+        """
+        Convert events returned by the API into the compact Event form, resolving their reminders
+        against the calendar's defaults
+        :param:  events - The events, as returned by the API
+        :return: A list of the Events
+        """
+        with self.instrumentation.span('to_events'):
+            self.instrumentation.count('events_processed', len(events))
+            return [Event.from_api(event, self.reminder_defaults, self.time_zone) for event in events]
+
+    def iter_to_events(self, events):
+        """
+        Lazily convert events returned by the API into the compact Event form, as they arrive
+        :param:  events - An iterable of the events, as returned by the API
+        :return: A generator yielding the Events
+        """
+        for event in events:
+            # The defaults and timezone are read for each event, as they arrive with the first page
+            yield Event.from_api(event, self.reminder_defaults, self.time_zone)
+
+    def _format_event_result(self, event):
+        """
+        Format an event and its reminders for display
+        :param:  event - The Event to format
+        :return: The formatted event
+        """
+        if event.uses_default_reminders:
+            reminder_lines = ['Reminder in 10 minutes before event']
+        else:
+            reminder_lines = [format_reminder(reminder) for reminder in event.reminders]
+        return '\n'.join(['Event:' + event.summary + ' at ' + event.start_text] + reminder_lines)
+
+    def export_events(self, formatter, years_past: int = DEFAULT_PAST_YEAR_RANGE,
+                      years_future: int = DEFAULT_FUTURE_YEAR_RANGE, page_size: int = DEFAULT_PAGE_SIZE):
+        """
+        Stream the events from the past years to the future years to a formatter, a page at a time,
+        so that only one page of events is held in memory
+        :param:  formatter - The EventFormatter to write the events to
+                 years_past - The number of years in the past
+                 years_future - The number of years in the future
+                 page_size - The maximum number of events requested per page
+        :return: The number of events written
+        """
+        if years_past < 0 or years_future < 0:
+            raise ValueError("Year Input cannot be negative")
+
+        time_min, _ = self._get_year_window(-years_past)
+        _, time_max = self._get_year_window(years_future)
+        return formatter.write_events(self.iter_to_events(
+            self._iter_window_events(time_min, time_max, self.FIELDS_INDEX, page_size)))
+
+    def search_events(self, keyword: str, match_all: bool = True, refresh: bool = False):
         """"
         Allows the user to search for events
+        Every word of the keyword is matched against the start of the words in the summary, description,
+        location and reminders of the events
         :param:  keyword - The keyword that the user wishes to search with
+                 match_all - If True, events must match every word of the keyword, otherwise any word
+                 refresh - If True, the events are fetched again before searching
         :return: A list of the search results
         """
-
-        events = self.get_past_events()
-        events += self.get_future_events()
-        resultList = []
-        for event in events:
-            if keyword.lower() in event['summary'].lower():
-                result = 'Event:' + event['summary'] + ' at ' + event['start'].get('dateTime',
-                                                                                   event['start'].get('date'))
-
-                if event['reminders']['useDefault']:
-                    result += '\nReminder in 10 minutes before event'
-                else:
-                    for reminder in event['reminders']['overrides']:
-                        result += '\nReminder in ' + str(reminder['minutes']) + ' minutes before event as ' + reminder[
-                            'method']
-                resultList.append(result)
+        with self.instrumentation.span('search_events'):
+            resultList = [self._format_event_result(event)
+                          for event in self.find_events(keyword, match_all=match_all, refresh=refresh)]
         if len(resultList) < 1:
             resultList.append("Nothing showed up in your search")
         return resultList
@@ -233,72 +1026,2139 @@ class Calendar:
         :param: event - The event that needs to be deleted
         """
         event_id = event['id']
-        self.api.events().delete(calendarId=self.calendar_id, eventId=event_id).execute()
+        self.executor.execute(self.api.events().delete(calendarId=self.calendar_id, eventId=event_id))
+        self._forget_event(event_id)
         print('Event ', event['summary'], ' Successfully Deleted')
 
+    def delete_events_bulk(self, events, max_retries: int = DEFAULT_BATCH_RETRIES,
+                           backoff: float = DEFAULT_BACKOFF_SECONDS):
+        """
+        Deletes many events from the calendar, using batch requests of up to 50 deletes each.
+        Deletes failing with a transient error are retried with exponential backoff
+        :param:  events - The events that need to be deleted
+                 max_retries - The number of times failed deletes are retried
+                 backoff - The number of seconds waited before the first retry, doubled for each retry after
+        :return: A dictionary of the 'deleted' event ids, the 'failed' event ids mapped to their error,
+                 and the number of 'retries' made
+        """
+        event_ids = list(dict.fromkeys(event['id'] for event in events))
+        with self.instrumentation.span('delete_events_bulk'):
+            succeeded, failed, retries = self._execute_batched(
+                event_ids, lambda event_id: self.api.events().delete(calendarId=self.calendar_id, eventId=event_id),
+                max_retries, backoff)
 
-def get_date_iso(date_str: str):
-    """
-    :param: date_str should be in utc format
-    """
-    return date_str.isoformat() + 'Z'
+        self._forget_events(set(succeeded))
+        return {'deleted': [event_id for event_id in event_ids if event_id in succeeded],
+                'failed': failed,
+                'retries': retries}
 
+    def invite_attendees(self, events, emails, send_updates: str = 'all', max_retries: int = DEFAULT_BATCH_RETRIES,
+                         backoff: float = DEFAULT_BACKOFF_SECONDS):
+        """
+        Invite attendees to many events, patching the events in batch requests of up to 50.
+        The new attendees are merged into the attendees the events already have. A patch replaces the whole
+        list, so the attendees of events fetched without them, such as with FIELDS_INDEX, are fetched first in
+        batch requests. Requests failing with a transient error are retried with exponential backoff
+        :param:  events - The events, as returned by the API
+                 emails - The email addresses to invite, which must all be student.monash.edu addresses
+                 send_updates - Who is emailed about the invitation, 'all', 'externalOnly' or 'none'
+                 max_retries - The number of times failed patches are retried
+                 backoff - The number of seconds waited before the first retry, doubled for each retry after
+        :return: A dictionary of the 'invited' event ids mapped to the addresses added to each, the event ids
+                 already inviting every address as 'unchanged', the 'failed' event ids mapped to their error,
+                 and the number of 'retries' made
+        """
+        emails = list(dict.fromkeys(email.strip().lower() for email in emails))
+        invalid = [email for email in emails if not STUDENT_EMAIL_PATTERN.match(email)]
+        if invalid:
+            raise ValueError("Only student.monash.edu addresses can be invited: " + ', '.join(invalid))
 
-"""
-The following is runner code unrelated to the functionality and is only to be used
-demo the functionality. Therefore, this code is not used in coverage testing
-"""
+        events = dict((event['id'], event) for event in events)
+        failed = {}
+        retries = 0
+        # A missing attendees field means the event was fetched without it, not that it has no attendees
+        missing = [event_id for event_id, event in events.items() if 'attendees' not in event]
+        if missing:
+            with self.instrumentation.span('fetch_attendees'):
+                fetched, failed, retries = self._execute_batched(
+                    missing, lambda event_id: self.api.events().get(calendarId=self.calendar_id, eventId=event_id,
+                                                                    fields='id,attendees'),
+                    max_retries, backoff)
+            for event_id in missing:
+                if event_id in fetched:
+                    events[event_id] = dict(events[event_id], attendees=fetched[event_id].get('attendees', []))
+                else:
+                    del events[event_id]
 
+        bodies = {}
+        added = {}
+        unchanged = []
+        for event in events.values():
+            attendees = event['attendees']
+            invited = {attendee.get('email', '').lower() for attendee in attendees}
+            new_emails = [email for email in emails if email not in invited]
+            if not new_emails:
+                unchanged.append(event['id'])
+                continue
+            added[event['id']] = new_emails
+            bodies[event['id']] = {'attendees': attendees + [{'email': email} for email in new_emails]}
 
-def get_choice():      #
-    print('Please enter your choice')
-    print('1. View past events.')
-    print('2. View future events')
-    print('3. Navigate to an event with the date')
-    print('4. Search for an event and reminders')
-    print('5. Delete an event and reminders')
-    print('6. Exit')
+        with self.instrumentation.span('invite_attendees'):
+            succeeded, patch_failed, patch_retries = self._execute_batched(
+                list(bodies), lambda event_id: self.api.events().patch(
+                    calendarId=self.calendar_id, eventId=event_id, body=bodies[event_id], sendUpdates=send_updates),
+                max_retries, backoff)
+        failed.update(patch_failed)
+        retries += patch_retries
 
-    choice = int(input('Your choice as an integer: '))
+        if succeeded and self.cache is not None:
+            self.cache.invalidate(self.calendar_id)
+        return {'invited': {event_id: new_emails for event_id, new_emails in added.items() if event_id in succeeded},
+                'unchanged': unchanged,
+                'failed': failed,
+                'retries': retries}
 
-    return choice
+    def _execute_batched(self, request_ids, build_request, max_retries: int, backoff: float):
+        """
+        Execute one request per id in batch requests, retrying the requests that fail with a transient error
+        :param:  request_ids - The unique ids of the requests
+                 build_request - A function building the request for an id
+                 max_retries - The number of times failed requests are retried
+                 backoff - The number of seconds waited before the first retry, doubled for each retry after
+        :return: A tuple of the responses of the succeeded requests by id, the errors of the failed requests by id,
+                 and the number of retries made
+        """
+        succeeded = {}
+        failed = {}
 
+        def handle_response(request_id, response, exception):
+            if exception is None:
+                succeeded[request_id] = response
+                failed.pop(request_id, None)
+            else:
+                failed[request_id] = exception
 
-def print_events(events, calendar):
-    result_list = []
-    for event in events:
-        result = 'Event:' + event['summary'] + ' at ' + event['start'].get('dateTime',
-                                                                           event['start'].get('date'))
-        event = calendar.get_event_reminder(event)
-        for reminder in event['reminders']:
-            result += '\nReminder in ' + str(reminder['minutes']) + ' minutes before event as ' + reminder[
-                'method']
-        result_list.append(result)
-    print_results(result_list)
+        pending = list(request_ids)
+        retries = 0
+        while pending:
+            for start in range(0, len(pending), self.MAX_BATCH_SIZE):
+                batch_ids = pending[start:start + self.MAX_BATCH_SIZE]
+                batch = self.api.new_batch_http_request(callback=handle_response)
+                for request_id in batch_ids:
+                    batch.add(build_request(request_id), request_id=request_id)
+                try:
+                    self.executor.execute(batch, cost=len(batch_ids))
+                except (HttpError,) + TRANSPORT_ERRORS as error:  # The whole batch failed, so each of its requests did
+                    for request_id in batch_ids:
+                        handle_response(request_id, None, error)
+
+            pending = [request_id for request_id in pending
+                       if request_id in failed and is_retryable_error(failed[request_id])]
+            if pending and retries < max_retries:
+                time.sleep(backoff * 2 ** retries)
+                retries += 1
+            else:
+                break
 
+        return succeeded, failed, retries
 
-def print_results(result_list):
-    i = 1
-    for printResult in result_list:
-        print(i, printResult)
-        i += 1
+    def _forget_event(self, event_id: str):
+        """
+        Remove a deleted event from the local copies of the calendar's events
+        :param:  event_id - The id of the deleted event
+        """
+        self._forget_events({event_id})
 
+    def _forget_events(self, event_ids):
+        """
+        Remove deleted events from the local copies of the calendar's events, with one pass over each copy
+        :param:  event_ids - A set of the ids of the deleted events
+        """
+        if not event_ids:
+            return
+        if self.cache is not None:
+            self.cache.invalidate(self.calendar_id)
+        if self.event_store is not None:
+            self.event_store.remove_events(event_ids)
+        if self._indexed_events is not None:
+            self._indexed_events = [indexed for indexed in self._indexed_events if indexed.id not in event_ids]
+        if self._date_index is not None:
+            self._date_index.remove_events(event_ids)
+        for event_id in event_ids:
+            if self._keyword_index is not None:
+                self._keyword_index.remove_event(event_id)
+            if self._interval_index is not None:
+                self._interval_index.remove_event(event_id)
+            if self.reminder_scheduler is not None:
+                self.reminder_scheduler.remove_event(event_id)
 
-def get_event_to_delete(calendar):
-    print('Select event to be deleted')
-    events = calendar.get_past_events()
-    events += calendar.get_future_events()
-    print_events(events, calendar)
-    try:
-        events_index = int(input('Enter the number of the event that you wish to delete: ')) - 1
-        return events[events_index]
-    except IndexError:
-        print("Index out of bounds")
-        get_event_to_delete(calendar)
+
+class MultiCalendar:
+    """
+    A combined view over several calendars.
+    The calendars are fetched concurrently, and their events merged into a single stream ordered by start time
+    """
+    DEFAULT_MAX_WORKERS = 8
+
+    def __init__(self, api, calendar_ids, max_workers: int = DEFAULT_MAX_WORKERS, executor=None):
+        """
+        Initialises a Calendar for each of the calendar ids, concurrently
+        :param:  api - The google calendar API reference, which must be safe to use from several threads
+                 calendar_ids - The ids of the calendars to combine
+                 max_workers - The maximum number of requests made at once
+                 executor - The RequestExecutor shared by the calendars, a new one if it is not given
+        """
+        if max_workers <= 0:
+            raise ValueError("Number of workers must be at least 1")
+
+        self.api = api
+        self.calendar_ids = list(dict.fromkeys(calendar_ids))
+        self.max_workers = max_workers
+        self.executor = RequestExecutor() if executor is None else executor
+        calendars = self._map(lambda calendar_id: Calendar(api, calendar_id, executor=self.executor),
+                              self.calendar_ids)
+        self.calendars = dict(zip(self.calendar_ids, calendars))
+
+    def _map(self, function, items):
+        """
+        Apply a function to each item on a thread pool
+        :return: A list of the results, in the order of the items
+        """
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            return list(executor.map(function, items))
+
+    def get_past_events(self, years_past: int = Calendar.DEFAULT_PAST_YEAR_RANGE):
+        """
+        Get the events of every calendar within specified year limit in the past
+        :param: years_past - The number of years
+        :return: A list of (calendar id, event) pairs, ordered by start time
+        """
+        return self._merge(lambda calendar: calendar.get_past_events(years_past))
+
+    def get_future_events(self, years_future: int = Calendar.DEFAULT_FUTURE_YEAR_RANGE):
+        """
+        Get the events of every calendar within specified year limit in the future
+        :param: years_future - The number of years
+        :return: A list of (calendar id, event) pairs, ordered by start time
+        """
+        return self._merge(lambda calendar: calendar.get_future_events(years_future))
+
+    def _merge(self, fetch):
+        """
+        Fetch events from every calendar concurrently, and merge them by start time.
+        All day events start at midnight in their own calendar's timezone. Each calendar's events are sorted
+        by that time before merging, which is close to linear as they arrive nearly in order
+        :param:  fetch - A function fetching the start time ordered events of a calendar
+        :return: A list of (calendar id, event) pairs, ordered by start time
+        """
+        event_lists = self._map(lambda calendar_id: fetch(self.calendars[calendar_id]), self.calendar_ids)
+        streams = [sorted(((get_event_timestamp(event['start'], self.calendars[calendar_id].time_zone), calendar_id,
+                            event) for event in events), key=lambda item: item[0])
+                   for calendar_id, events in zip(self.calendar_ids, event_lists)]
+        return [(calendar_id, event)
+                for timestamp, calendar_id, event in heapq.merge(*streams, key=lambda item: item[0])]
+
+    def to_events(self, calendar_events):
+        """
+        Convert merged events into Events, resolving reminders against the defaults of each event's own calendar
+        :param:  calendar_events - A list of (calendar id, event) pairs, as returned by the get events methods
+        :return: A list of the Events
+        """
+        return [Event.from_api(event, self.calendars[calendar_id].reminder_defaults,
+                               self.calendars[calendar_id].time_zone)
+                for calendar_id, event in calendar_events]
+
+    def get_event_reminder(self, calendar_id: str, event):
+        """
+        Returns the event with the reminder reformatted, using the reminder defaults of its own calendar
+        :param:  calendar_id - The id of the calendar the event belongs to
+                 event - The event that will be reformatted
+        :return: A formatted event reminder
+        """
+        return self.calendars[calendar_id].get_event_reminder(event)
+
+
+class AsyncCalendar:
+    """
+    Awaitable versions of the Calendar methods, for use from an asyncio event loop.
+    The blocking API requests are run on a thread pool, so several can be in flight at once
+    """
+    DEFAULT_MAX_CONCURRENCY = 10
+
+    def __init__(self, calendar, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        """
+        Wraps a Calendar
+        :param:  calendar - The Calendar to run the requests of, its api must be safe to use from several threads
+                 max_concurrency - The maximum number of requests in flight at once
+        """
+        if max_concurrency <= 0:
+            raise ValueError("Concurrency limit must be at least 1")
+
+        self.calendar = calendar
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        # Waiting for the requests in flight on another thread leaves the event loop free to run meanwhile
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def close(self):
+        """
+        Shut down the thread pool, once the requests in flight have finished
+        """
+        self._executor.shutdown(wait=True)
+
+    async def _run(self, function, *args, **kwargs):
+        """
+        Run a blocking function on the thread pool
+        :return: The result of the function
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    async def get_upcoming_events(self, starting_time: str, number_of_events: int):
+        """
+        Awaitable version of Calendar.get_upcoming_events
+        """
+        return await self._run(self.calendar.get_upcoming_events, starting_time, number_of_events)
+
+    async def get_past_events(self, years_past: int = Calendar.DEFAULT_PAST_YEAR_RANGE):
+        """
+        Awaitable version of Calendar.get_past_events
+        """
+        return await self._run(self.calendar.get_past_events, years_past)
+
+    async def get_future_events(self, years_future: int = Calendar.DEFAULT_FUTURE_YEAR_RANGE):
+        """
+        Awaitable version of Calendar.get_future_events
+        """
+        return await self._run(self.calendar.get_future_events, years_future)
+
+    async def navigate_to_events(self, time, refresh: bool = False):
+        """
+        Awaitable version of Calendar.navigate_to_events
+        """
+        return await self._run(self.calendar.navigate_to_events, time, refresh=refresh)
+
+    async def search_events(self, keyword: str, match_all: bool = True, refresh: bool = False):
+        """
+        Awaitable version of Calendar.search_events
+        """
+        return await self._run(self.calendar.search_events, keyword, match_all=match_all, refresh=refresh)
+
+    async def delete_events(self, event):
+        """
+        Awaitable version of Calendar.delete_events
+        """
+        return await self._run(self.calendar.delete_events, event)
+
+    async def delete_events_bulk(self, events, max_retries: int = Calendar.DEFAULT_BATCH_RETRIES,
+                                 backoff: float = Calendar.DEFAULT_BACKOFF_SECONDS):
+        """
+        Awaitable version of Calendar.delete_events_bulk
+        """
+        return await self._run(self.calendar.delete_events_bulk, events, max_retries=max_retries, backoff=backoff)
+
+    async def iter_events(self, time_min: str, time_max: str, page_size: int = Calendar.DEFAULT_PAGE_SIZE):
+        """
+        Asynchronously iterate over the events between two times, requesting each page on the thread pool
+        :param:  time_min - The lower bound (exclusive) for an event's end time, in ISO format
+                 time_max - The upper bound (exclusive) for an event's start time, in ISO format
+                 page_size - The maximum number of events requested per page
+        :return: An async generator yielding the events one at a time, ordered by start time
+        """
+        pages = self.calendar.iter_event_pages(time_min, time_max, page_size)
+        while True:
+            page = await self._run(next, pages, None)
+            if page is None:
+                break
+            for event in page:
+                yield event
+
+
+class Reminder:
+    """
+    A reminder of an event, sent by a method ('email' or 'popup') a number of minutes before the event
+    """
+    __slots__ = ('method', 'minutes')
+
+    def __init__(self, method: str, minutes: int):
+        object.__setattr__(self, 'method', method)
+        object.__setattr__(self, 'minutes', minutes)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Reminder is immutable")
+
+    def __eq__(self, other):
+        if not isinstance(other, Reminder):
+            return NotImplemented
+        return (self.method, self.minutes) == (other.method, other.minutes)
+
+    def __hash__(self):
+        return hash((self.method, self.minutes))
+
+    def __repr__(self):
+        return 'Reminder({!r}, {!r})'.format(self.method, self.minutes)
+
+    @classmethod
+    def from_api(cls, reminder):
+        """
+        :param: reminder - A reminder, as returned by the API
+        :return: The Reminder
+        """
+        return cls(reminder.get('method'), reminder.get('minutes'))
+
+
+class Event:
+    """
+    The compact, immutable form of an event returned by the API.
+    Its times are parsed, and its reminders resolved against the calendar defaults, once when it is created
+    """
+    __slots__ = ('id', 'summary', 'description', 'location', 'start', 'end', 'all_day', 'start_text',
+                 'uses_default_reminders', 'reminders', 'transparent')
+
+    def __init__(self, id: str, summary: str, start, end=None, all_day: bool = False, start_text: str = None,
+                 description: str = '', location: str = '', uses_default_reminders: bool = False, reminders=(),
+                 transparent: bool = False):
+        """
+        :param:  id - The id of the event
+                 summary - The title of the event
+                 start - The start of the event, as a timezone aware datetime
+                 end - The end of the event, the start if it is not given
+                 all_day - True if the event lasts whole days
+                 start_text - The start as displayed, the ISO format of the start if it is not given
+                 description - The description of the event
+                 location - The location of the event
+                 uses_default_reminders - True if the event's reminders are the calendar's defaults
+                 reminders - The Reminders of the event
+                 transparent - True if the event does not block time, so it leaves the time free
+        """
+        values = {'id': id, 'summary': summary, 'description': description, 'location': location,
+                  'start': start, 'end': start if end is None else end, 'all_day': all_day,
+                  'start_text': start.isoformat() if start_text is None else start_text,
+                  'uses_default_reminders': uses_default_reminders, 'reminders': tuple(reminders),
+                  'transparent': transparent}
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Event is immutable")
+
+    def __repr__(self):
+        return 'Event({!r}, {!r}, {})'.format(self.id, self.summary, self.start_text)
+
+    @classmethod
+    def from_api(cls, event, reminder_defaults=None, time_zone=None):
+        """
+        Convert an event returned by the API
+        :param:  event - The event, as returned by the API
+                 reminder_defaults - The calendar's default reminder, or list of default reminders
+                 time_zone - The calendar's timezone, as a tzinfo, which all day events start at midnight in.
+                             They start at midnight utc if it is not given
+        :return: The Event
+        """
+        reminders = event.get('reminders', {})
+        uses_default_reminders = reminders.get('useDefault', False)
+        if uses_default_reminders:
+            if reminder_defaults is None:
+                reminder_defaults = []
+            elif isinstance(reminder_defaults, dict):
+                reminder_defaults = [reminder_defaults]
+            resolved = reminder_defaults
+        else:
+            resolved = reminders.get('overrides', [])
+
+        start = parse_event_time(event['start'], time_zone)
+        return cls(id=event.get('id'), summary=event.get('summary', ''), start=start,
+                   end=parse_event_time(event['end'], time_zone) if 'end' in event else None,
+                   all_day='dateTime' not in event['start'],
+                   start_text=event['start'].get('dateTime', event['start'].get('date')),
+                   description=event.get('description', ''), location=event.get('location', ''),
+                   uses_default_reminders=uses_default_reminders,
+                   reminders=[Reminder.from_api(reminder) for reminder in resolved],
+                   transparent=event.get('transparency') == 'transparent')
+
+
+class EventTable:
+    """
+    The start and end times, all day flags, calendars and earliest reminders of Events, held as columns of
+    NumPy arrays so that range and reminder queries over many events are vectorised.
+    Queries return boolean masks, which can be combined with & and |, and turned back into Events with to_events.
+    numpy must be installed to use this class
+    """
+    NO_REMINDER = -1
+    SECONDS_PER_WEEK = 7 * 24 * 60 * 60
+
+    def __init__(self, events, calendar_ids=None):
+        """
+        Builds the columns
+        :param:  events - The Events
+                 calendar_ids - The id of the calendar of each event, or None if they are from a single calendar
+        """
+        if np is None:
+            raise ImportError("EventTable needs numpy to be installed")
+
+        self.events = list(events)
+        if calendar_ids is None:
+            calendar_ids = [Calendar.DEFAULT_CALENDAR_ID] * len(self.events)
+        self.calendar_ids = list(dict.fromkeys(calendar_ids))
+        calendar_positions = {calendar_id: position for position, calendar_id in enumerate(self.calendar_ids)}
+
+        self.start = np.array([event.start.timestamp() for event in self.events], dtype=np.float64)
+        self.end = np.array([event.end.timestamp() for event in self.events], dtype=np.float64)
+        self.all_day = np.array([event.all_day for event in self.events], dtype=bool)
+        self.calendar = np.array([calendar_positions[calendar_id] for calendar_id in calendar_ids], dtype=np.int32)
+        self.reminder_minutes = np.array(
+            [min((reminder.minutes for reminder in event.reminders), default=self.NO_REMINDER)
+             for event in self.events], dtype=np.int32)
+
+    def __len__(self):
+        return len(self.events)
+
+    def overlapping(self, time_min, time_max):
+        """
+        :param:  time_min - The start of the window, as a timezone aware datetime or ISO formatted time
+                 time_max - The end of the window, as a timezone aware datetime or ISO formatted time
+        :return: A mask of the events overlapping the window
+        """
+        return (self.start < to_timestamp(time_max)) & (self.end > to_timestamp(time_min))
+
+    def starting_between(self, time_min, time_max):
+        """
+        :param:  time_min - The start of the window (inclusive), as a timezone aware datetime or ISO formatted time
+                 time_max - The end of the window (exclusive), as a timezone aware datetime or ISO formatted time
+        :return: A mask of the events starting within the window
+        """
+        return (self.start >= to_timestamp(time_min)) & (self.start < to_timestamp(time_max))
+
+    def with_reminder_under(self, minutes: int):
+        """
+        :param:  minutes - The number of minutes
+        :return: A mask of the events with a reminder sent less than the minutes before them
+        """
+        return (self.reminder_minutes != self.NO_REMINDER) & (self.reminder_minutes < minutes)
+
+    def from_calendar(self, calendar_id: str):
+        """
+        :param:  calendar_id - The id of the calendar
+        :return: A mask of the events of the calendar
+        """
+        if calendar_id not in self.calendar_ids:
+            return np.zeros(len(self.events), dtype=bool)
+        return self.calendar == self.calendar_ids.index(calendar_id)
+
+    def histogram(self, time_min, time_max, bin_seconds: float, mask=None):
+        """
+        Count the events starting in each of a series of equal periods
+        :param:  time_min - The start of the first period, as a timezone aware datetime or ISO formatted time
+                 time_max - The end of the last period, as a timezone aware datetime or ISO formatted time
+                 bin_seconds - The length of each period, in seconds
+                 mask - An optional mask of the events to count
+        :return: A tuple of the counts, and the timestamps the periods start at
+        """
+        first, last = to_timestamp(time_min), to_timestamp(time_max)
+        edges = np.arange(first, last + bin_seconds, bin_seconds)
+        starts = self.start if mask is None else self.start[mask]
+        counts, edges = np.histogram(starts[(starts >= first) & (starts < last)], bins=edges)
+        return counts, edges[:-1]
+
+    def events_per_week(self, time_min, time_max, mask=None):
+        """
+        Count the events starting in each week from a time
+        :return: A tuple of the counts, and the timestamps the weeks start at
+        """
+        return self.histogram(time_min, time_max, self.SECONDS_PER_WEEK, mask)
+
+    def to_events(self, mask):
+        """
+        :param:  mask - A mask of events
+        :return: A list of the Events selected by the mask
+        """
+        return [self.events[position] for position in np.flatnonzero(mask)]
+
+
+class EventFormatter:
+    """
+    Writes Events to a stream, such as stdout or a file, as each one arrives.
+    Events are written as numbered plain text, as one JSON object per line, or as CSV rows
+    """
+    TEXT = 'text'
+    JSON_LINES = 'jsonl'
+    CSV = 'csv'
+    MODES = (TEXT, JSON_LINES, CSV)
+    CSV_COLUMNS = ['query', 'id', 'summary', 'start', 'end', 'all_day', 'location', 'description', 'reminders',
+                   'status']
+
+    def __init__(self, stream=None, mode: str = TEXT):
+        """
+        :param:  stream - The writable to write to, stdout by default
+                 mode - One of 'text', 'jsonl' or 'csv'
+        """
+        if mode not in self.MODES:
+            raise ValueError("Output mode must be one of " + ', '.join(self.MODES))
+
+        self.stream = sys.stdout if stream is None else stream
+        self.mode = mode
+        self.count = 0
+        self.query = None
+        self._csv_writer = None
+
+    def start_query(self, query: str):
+        """
+        Start the output of a query, when the results of several queries are written to the same stream.
+        Text output is headed by the query and numbered from 1 again, the other modes record it with each result
+        :param:  query - The query
+        """
+        self.query = query
+        if self.mode == self.TEXT:
+            self.count = 0
+            self.stream.write('> ' + query + '\n')
+
+    def write_event(self, event):
+        """
+        Write a single event
+        :param:  event - The Event to write
+        """
+        if self.mode == self.TEXT:
+            self.write_result(format_event(event))
+            return
+
+        record = event_to_dict(event)
+        if self.mode == self.CSV:
+            record['reminders'] = ';'.join(format_reminder(reminder) for reminder in event.reminders)
+        self._write_record(record)
+
+    def write_status(self, event_id: str, status: str, detail: str = ''):
+        """
+        Write the outcome of an operation on an event, such as a delete
+        :param:  event_id - The id of the event
+                 status - The outcome
+                 detail - Further detail, such as an error
+        """
+        if self.mode == self.TEXT:
+            self.write_result(' '.join(part for part in [status, event_id, detail] if part))
+        else:
+            self._write_record({'id': event_id, 'status': status + (': ' + detail if detail else '')})
+
+    def _write_record(self, record):
+        """
+        Write a record as a JSON line or a CSV row, with the current query
+        :param:  record - A dictionary of the values to write
+        """
+        self.count += 1
+        if self.query is not None:
+            record = dict(record, query=self.query)
+
+        if self.mode == self.JSON_LINES:
+            self.stream.write(json.dumps(record) + '\n')
+        else:
+            if self._csv_writer is None:
+                self._csv_writer = csv.DictWriter(self.stream, fieldnames=self.CSV_COLUMNS, lineterminator='\n')
+                self._csv_writer.writeheader()
+            self._csv_writer.writerow(record)
+
+    def write_result(self, result: str):
+        """
+        Write an already formatted result, numbered in the same way as events
+        :param:  result - The formatted result
+        """
+        if self.mode != self.TEXT:
+            raise ValueError("Formatted results can only be written as text")
+        self.count += 1
+        self.stream.write(str(self.count) + ' ' + result + '\n')
+
+    def write_events(self, events):
+        """
+        Write events as they are produced
+        :param:  events - An iterable of Events
+        :return: The number of events written
+        """
+        written = 0
+        for event in events:
+            self.write_event(event)
+            written += 1
+        return written
+
+
+class DateIndex:
+    """
+    The events of a calendar, indexed by the date they start on.
+    Events on a year, month or day are found with a binary search over the sorted start dates
+    """
+
+    def __init__(self, events):
+        """
+        Builds the index
+        :param:  events - The Events to index
+        """
+        dated_events = sorted(((event.start.date(), event) for event in events), key=lambda item: item[0])
+        self._dates = [date for date, event in dated_events]
+        self._events = [event for date, event in dated_events]
+
+    def __len__(self):
+        return len(self._events)
+
+    def get_events(self, time: str):
+        """
+        Get the events starting within a year, month or day
+        :param:  time - The year, month or day, as YYYY, YYYY-MM or YYYY-MM-DD
+        :return: A list of the events, ordered by start date
+        """
+        first_date, end_date = get_date_range(time)
+        return self._events[bisect_left(self._dates, first_date):bisect_left(self._dates, end_date)]
+
+    def remove_event(self, event_id: str):
+        """
+        Remove an event from the index
+        :param:  event_id - The id of the event to remove
+        """
+        self.remove_events({event_id})
+
+    def remove_events(self, event_ids):
+        """
+        Remove events from the index, with one pass over it
+        :param:  event_ids - A set of the ids of the events to remove
+        """
+        kept = [position for position, event in enumerate(self._events) if event.id not in event_ids]
+        if len(kept) < len(self._events):
+            self._dates = [self._dates[position] for position in kept]
+            self._events = [self._events[position] for position in kept]
+
+
+class KeywordIndex:
+    """
+    An inverted index from the words in the summary, description, location and reminders of events,
+    to the events they appear in.
+    The words are also kept sorted, so that every word starting with a prefix is found with a binary search
+    """
+
+    def __init__(self, events=()):
+        """
+        Builds the index
+        :param:  events - The Events to index
+        """
+        self._postings = {}
+        self._words = []
+        self._events = {}
+        self._event_words = {}
+        self._next_position = 0
+        for event in events:
+            self.add_event(event)
+
+    def __len__(self):
+        return len(self._events)
+
+    def add_event(self, event):
+        """
+        Add an event to the index, replacing any event with the same id
+        :param:  event - The Event to add
+        """
+        event_id = event.id
+        self.remove_event(event_id)
+
+        words = get_event_words(event)
+        self._events[event_id] = (self._next_position, event)
+        self._event_words[event_id] = words
+        self._next_position += 1
+        for word in words:
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = set()
+                insort(self._words, word)
+            postings.add(event_id)
+
+    def remove_event(self, event_id: str):
+        """
+        Remove an event from the index, if it is present
+        :param:  event_id - The id of the event to remove
+        """
+        words = self._event_words.pop(event_id, None)
+        if words is None:
+            return
+
+        del self._events[event_id]
+        for word in words:
+            postings = self._postings[word]
+            postings.discard(event_id)
+            if not postings:
+                del self._postings[word]
+                del self._words[bisect_left(self._words, word)]
+
+    def search(self, query: str, match_all: bool = True, prefix: bool = True):
+        """
+        Find the events matching the words of a query
+        :param:  query - The words to search for, case insensitive
+                 match_all - If True, events must match every word, otherwise any word
+                 prefix - If True, a word also matches the words it is the start of
+        :return: A list of the matching events, in the order they were added
+        """
+        matches = None
+        for word in tokenize(query):
+            event_ids = self._lookup(word, prefix)
+            if matches is None:
+                matches = set(event_ids)
+            elif match_all:
+                matches &= event_ids
+            else:
+                matches |= event_ids
+
+        if not matches:
+            return []
+        return [event for position, event in sorted((self._events[event_id] for event_id in matches),
+                                                    key=lambda item: item[0])]
+
+    def _lookup(self, word: str, prefix: bool):
+        """
+        :return: The ids of the events containing the word, or a word starting with it
+        """
+        if not prefix:
+            return self._postings.get(word, set())
+
+        event_ids = set()
+        position = bisect_left(self._words, word)
+        while position < len(self._words) and self._words[position].startswith(word):
+            event_ids |= self._postings[self._words[position]]
+            position += 1
+        return event_ids
+
+
+class IntervalIndex:
+    """
+    The events of a calendar, indexed by the interval of time they take.
+    The events are sorted by start, and viewed as an implicit balanced binary tree, in which each node holds
+    the latest end of the events below it. Overlap queries skip every subtree ending before the query starts,
+    so they take O(log n + k) for k overlapping events
+    """
+
+    def __init__(self, events, include_all_day: bool = True):
+        """
+        Builds the index
+        :param:  events - The Events to index
+                 include_all_day - If False, all day events are left out, so they do not count as busy
+        """
+        intervals = sorted(((event.start.timestamp(), event.end.timestamp(), event) for event in events
+                            if include_all_day or not event.all_day), key=lambda interval: interval[:2])
+        self._starts = [start for start, end, event in intervals]
+        self._ends = [end for start, end, event in intervals]
+        self._events = [event for start, end, event in intervals]
+        self._removed = set()
+        self._max_ends = list(self._ends)
+        self._build(0, len(self._ends))
+
+    def __len__(self):
+        return len(self._events) - len(self._removed)
+
+    def _build(self, low: int, high: int):
+        """
+        Fill in the latest end below the node of the range, the middle of the range
+        :return: The latest end in the range
+        """
+        if low >= high:
+            return float('-inf')
+        middle = (low + high) // 2
+        self._max_ends[middle] = max(self._ends[middle], self._build(low, middle), self._build(middle + 1, high))
+        return self._max_ends[middle]
+
+    def remove_event(self, event_id: str):
+        """
+        Remove an event from the index
+        :param:  event_id - The id of the event to remove
+        """
+        self._removed.add(event_id)
+
+    def overlapping(self, start, end):
+        """
+        Get the events overlapping a time range
+        :param:  start - The start of the range, a timezone aware datetime or ISO formatted time
+                 end - The end of the range
+        :return: A list of the Events starting before the end and ending after the start, ordered by start
+        """
+        start, end = to_timestamp(start), to_timestamp(end)
+        # Only events starting before the end can overlap, which are a prefix of the sorted events
+        starting_before = bisect_left(self._starts, end)
+        found = []
+        ranges = [(0, len(self._ends))]
+        while ranges:
+            low, high = ranges.pop()
+            if low >= min(high, starting_before):
+                continue
+            middle = (low + high) // 2
+            if self._max_ends[middle] <= start:
+                continue
+            if middle < starting_before and self._ends[middle] > start:
+                found.append(middle)
+            ranges.append((low, middle))
+            ranges.append((middle + 1, high))
+        return [self._events[position] for position in sorted(found)
+                if self._events[position].id not in self._removed]
+
+    def conflicts(self):
+        """
+        Find every pair of overlapping events, sweeping through the events in order of start while keeping
+        the ends of the events still going in a heap. Transparent events leave their time free, so they do not
+        conflict with anything
+        :return: A list of (earlier Event, later Event) pairs, ordered by the start of the later event
+        """
+        pairs = []
+        active = []
+        for position, event in enumerate(self._events):
+            if event.id in self._removed or event.transparent:
+                continue
+            while active and active[0][0] <= self._starts[position]:
+                heapq.heappop(active)
+            pairs.extend((self._events[earlier], event) for earlier in sorted(earlier for _, earlier in active))
+            heapq.heappush(active, (self._ends[position], position))
+        return pairs
+
+    def free_slots(self, start, end, duration):
+        """
+        Find the gaps between events long enough for a new event. Transparent events do not take up time,
+        as in the free/busy endpoint
+        :param:  start - The start of the range searched, a timezone aware datetime or ISO formatted time
+                 end - The end of the range searched
+                 duration - The shortest gap wanted, a timedelta
+        :return: A list of (start, end) of each gap, as utc datetimes
+        """
+        busy = [(event.start.timestamp(), event.end.timestamp()) for event in self.overlapping(start, end)
+                if not event.transparent]
+        return find_free_slots(busy, start, end, duration)
+
+
+class ReminderScheduler:
+    """
+    Fires the reminders of events at their time, while running in a background thread.
+    The fire times of every reminder are kept in a min heap, so the next reminder due is always at the top,
+    and the thread sleeps on a single timer until it is due or the reminders change.
+    Updated and removed events leave their old reminders in the heap, which are skipped when they reach the top
+    because their event's version has changed. Versions are never reused, so an event is forgotten as soon as it
+    has no reminders left to fire
+    """
+
+    def __init__(self, callback, clock=time.time, logger=None):
+        """
+        :param:  callback - The function called with the Event, the Reminder and the fire time (a posix timestamp)
+                            of each reminder as it is due
+                 clock - The function returning the current posix time
+                 logger - The logger errors raised by the callback are logged to, the Calendar module's by default
+        """
+        self.callback = callback
+        self.clock = clock
+        self.logger = logging.getLogger(__name__) if logger is None else logger
+        self._heap = []
+        self._events = {}
+        self._versions = {}
+        self._pending = {}
+        self._live = 0
+        self._sequence = 0
+        self._version = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def __len__(self):
+        """
+        :return: The number of reminders waiting to fire
+        """
+        with self._condition:
+            return self._live
+
+    def add_event(self, event):
+        """
+        Schedule the reminders of an event still to come, replacing those of the event with the same id
+        :param:  event - The Event, with its reminders resolved against the calendar's defaults
+        """
+        self.add_events([event])
+
+    update_event = add_event
+
+    def add_events(self, events):
+        """
+        Schedule the reminders of many events, replacing those of events already scheduled
+        :param:  events - The Events
+        """
+        now = self.clock()
+        with self._condition:
+            entries = []
+            for event in events:
+                self._discard(event.id)
+                self._version += 1
+                start = event.start.timestamp()
+                pending = len(entries)
+                for reminder in event.reminders:
+                    fire_time = start - (reminder.minutes or 0) * 60
+                    if fire_time >= now:
+                        self._sequence += 1
+                        entries.append((fire_time, self._sequence, event.id, self._version, reminder))
+                if len(entries) > pending:  # Events whose reminders have all passed are not kept
+                    self._versions[event.id] = self._version
+                    self._events[event.id] = event
+                    self._pending[event.id] = len(entries) - pending
+
+            if len(entries) > len(self._heap):
+                # Building the heap again is linear, rather than pushing each entry
+                self._heap.extend(entries)
+                heapq.heapify(self._heap)
+            else:
+                for entry in entries:
+                    heapq.heappush(self._heap, entry)
+            self._live += len(entries)
+            self._compact()
+            self._condition.notify()
+
+    def remove_event(self, event_id: str):
+        """
+        Cancel the reminders of an event
+        :param:  event_id - The id of the event
+        """
+        with self._condition:
+            self._discard(event_id)
+            self._compact()
+            self._condition.notify()
+
+    def _discard(self, event_id: str):
+        """
+        Mark the scheduled reminders of an event as stale, to be skipped when they reach the top of the heap
+        """
+        if event_id in self._events:
+            self._forget(event_id)
+            self._live -= self._pending.pop(event_id)
+
+    def _forget(self, event_id: str):
+        del self._events[event_id]
+        del self._versions[event_id]
+
+    def _compact(self):
+        """
+        Drop the stale entries once they outnumber the live ones, so updates cannot grow the heap forever
+        """
+        if len(self._heap) > 2 * self._live + 64:
+            self._heap = [entry for entry in self._heap if self._is_live(entry)]
+            heapq.heapify(self._heap)
+
+    def _is_live(self, entry):
+        return self._versions.get(entry[2]) == entry[3]
+
+    def next_fire_time(self):
+        """
+        :return: The posix time the next reminder is due, None if there are none
+        """
+        with self._condition:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def _drop_stale(self):
+        while self._heap and not self._is_live(self._heap[0]):
+            heapq.heappop(self._heap)
+
+    def due(self, now: float = None):
+        """
+        Take the reminders due by a time, without firing them
+        :param:  now - The posix time, the current time if it is not given
+        :return: A list of (fire time, Event, Reminder), ordered by fire time
+        """
+        if now is None:
+            now = self.clock()
+        due = []
+        with self._condition:
+            while True:
+                self._drop_stale()
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                fire_time, _, event_id, _, reminder = heapq.heappop(self._heap)
+                self._live -= 1
+                due.append((fire_time, self._events[event_id], reminder))
+                self._pending[event_id] -= 1
+                if not self._pending[event_id]:  # Every reminder of the event has fired
+                    del self._pending[event_id]
+                    self._forget(event_id)
+        return due
+
+    def fire_due(self, now: float = None):
+        """
+        Fire the reminders due by a time. An error raised by the callback is logged, and the other reminders
+        still fire
+        :param:  now - The posix time, the current time if it is not given
+        :return: The number of reminders fired
+        """
+        due = self.due(now)
+        for fire_time, event, reminder in due:
+            try:
+                self.callback(event, reminder, fire_time)
+            except Exception:
+                self.logger.exception("Reminder callback failed for event %s", event.id)
+        return len(due)
+
+    def start(self):
+        """
+        Start firing reminders in a background thread
+        """
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='ReminderScheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread, waiting for it to finish
+        """
+        with self._condition:
+            thread = self._thread
+            self._stopping = True
+            self._condition.notify()
+        if thread is not None:
+            thread.join()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            self.fire_due()
+            with self._condition:
+                if self._stopping:
+                    return
+                next_fire_time = self.next_fire_time()
+                timeout = None if next_fire_time is None else max(0.0, next_fire_time - self.clock())
+                # Woken early when the reminders change or the scheduler is stopped
+                self._condition.wait(timeout)
+                if self._stopping:
+                    return
+
+
+class ResponseCache:
+    """
+    A least recently used cache of event list responses, whose entries expire after a time to live.
+    Entries are keyed on the request, with the calendar id first, and can be shared between calendars
+    """
+    DEFAULT_TTL_SECONDS = 300
+    DEFAULT_MAX_ENTRIES = 32
+
+    def __init__(self, ttl: float = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 clock=time.monotonic):
+        """
+        Creates an empty cache
+        :param:  ttl - The number of seconds an entry is kept for
+                 max_entries - The number of entries kept, the least recently used entry is evicted past this
+                 clock - The function returning the current time in seconds
+        """
+        if ttl <= 0 or max_entries <= 0:
+            raise ValueError("Time to live and maximum entries must be positive")
+
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Get an entry, if it is present and has not expired
+        :param:  key - The key of the entry
+        :return: The cached value, or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value):
+        """
+        Add or replace an entry, evicting the least recently used entry if the cache is full
+        :param:  key - The key of the entry
+                 value - The value to cache
+        """
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, calendar_id: str):
+        """
+        Remove every entry of a calendar
+        :param:  calendar_id - The id of the calendar
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == calendar_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RequestExecutor:
+    """
+    Executes API requests within the per user rate limit, retrying transient errors.
+    Requests take tokens from a token bucket refilled at the rate limit, and wait when it is empty.
+    Failed requests are retried with exponential backoff and jitter, or after the time the server asks for
+    """
+    DEFAULT_RATE = 10  # Requests per second, the Calendar API allows 600 requests per minute per user
+    DEFAULT_BURST = 10
+    DEFAULT_MAX_RETRIES = 5
+    DEFAULT_BACKOFF_SECONDS = 1
+    MAX_BACKOFF_SECONDS = 32
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST, max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF_SECONDS, clock=time.monotonic, sleep=None, jitter=random.random,
+                 instrumentation=None):
+        """
+        :param:  rate - The number of requests allowed per second, None for no limit
+                 burst - The number of requests which can be made at once, after a pause
+                 max_retries - The number of times a failed request is retried
+                 backoff - The number of seconds waited before the first retry, doubled for each retry after
+                 clock - The function returning the current time in seconds
+                 sleep - The function waiting for a number of seconds, time.sleep if it is not given
+                 jitter - The function returning a random fraction, to spread out retries
+                 instrumentation - An optional Instrumentation, which the timings, calls and retries of requests
+                                   are recorded to
+        """
+        if (rate is not None and rate <= 0) or burst <= 0 or max_retries < 0:
+            raise ValueError("Rate and burst must be positive, and retries cannot be negative")
+
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.clock = clock
+        self.sleep = sleep
+        self.jitter = jitter
+        self.instrumentation = Instrumentation(enabled=False) if instrumentation is None else instrumentation
+
+        self.requests = 0
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        self._tokens = burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """
+        :return: A dictionary of the number of requests and retries made, and the seconds spent waiting
+        """
+        with self._lock:
+            return {'requests': self.requests, 'retries': self.retries, 'throttled_seconds': self.throttled_seconds}
+
+    def execute(self, request, cost: int = 1):
+        """
+        Execute a request, waiting for the rate limit and retrying transient errors
+        :param:  request - The request, anything with an execute method
+                 cost - The number of requests it counts as towards the rate limit, such as the size of a batch
+        :return: The response of the request
+        """
+        attempt = 0
+        while True:
+            self._acquire(cost)
+            self.instrumentation.count('api_calls', cost)
+            try:
+                with self.instrumentation.span('api_request'):
+                    return request.execute()
+            except (HttpError,) + TRANSPORT_ERRORS as error:
+                self.instrumentation.count('api_errors')
+                if attempt >= self.max_retries or not is_retryable_error(error):
+                    raise
+                delay = self._get_retry_delay(error, attempt)
+                with self._lock:
+                    self.retries += 1
+                    self.throttled_seconds += delay
+                self.instrumentation.count('api_retries')
+                self._sleep(delay)
+                attempt += 1
+
+    def _acquire(self, cost: int):
+        """
+        Take tokens from the bucket, waiting until they would have been refilled if it is empty
+        :param:  cost - The number of tokens to take
+        """
+        with self._lock:
+            self.requests += cost
+            if self.rate is None:
+                return
+
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Taking the tokens before waiting reserves them, so concurrent callers queue up behind each other
+            self._tokens -= cost
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+            self.throttled_seconds += wait
+
+        if wait > 0:
+            self._sleep(wait)
+
+    def _get_retry_delay(self, error, attempt: int):
+        """
+        :return: The number of seconds to wait before retrying a failed request
+        """
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            return retry_after
+        delay = min(self.MAX_BACKOFF_SECONDS, self.backoff * 2 ** attempt)
+        return delay / 2 + self.jitter() * delay / 2
+
+    def _sleep(self, seconds: float):
+        (time.sleep if self.sleep is None else self.sleep)(seconds)
+
+
+class Instrumentation:
+    """
+    Records the timings of operations, and counters such as API calls and cache hits, to a sink.
+    Timings are taken with spans, used as context managers around the code being timed.
+    A disabled Instrumentation records nothing, and its spans do nothing, so leaving the hooks in hot paths
+    costs almost nothing
+    """
+    _DISABLED_SPAN = contextlib.nullcontext()
+
+    def __init__(self, sink=None, enabled: bool = True, clock=time.perf_counter):
+        """
+        :param:  sink - Where the timings and counters are recorded, a new MemorySink if it is not given
+                 enabled - If False, nothing is recorded
+                 clock - The function returning the current time in seconds
+        """
+        self.sink = MemorySink() if sink is None else sink
+        self.enabled = enabled
+        self.clock = clock
+
+    def span(self, name: str):
+        """
+        Time the code within a with block
+        :param:  name - The name the timing is recorded under
+        :return: The context manager timing the block
+        """
+        if not self.enabled:
+            return self._DISABLED_SPAN
+        return self._span(name)
+
+    @contextlib.contextmanager
+    def _span(self, name: str):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.sink.record_timing(name, self.clock() - start)
+
+    def count(self, name: str, value: int = 1):
+        """
+        Add to a counter
+        :param:  name - The name of the counter
+                 value - The amount added
+        """
+        if self.enabled:
+            self.sink.add(name, value)
+
+
+class MemorySink:
+    """
+    Keeps the count, total and maximum of each timing, and the total of each counter, in memory
+    """
+
+    def __init__(self):
+        self._timings = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def record_timing(self, name: str, seconds: float):
+        with self._lock:
+            count, total, maximum = self._timings.get(name, (0, 0.0, 0.0))
+            self._timings[name] = (count + 1, total + seconds, max(maximum, seconds))
+
+    def add(self, name: str, value: int):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def stats(self):
+        """
+        :return: A dictionary of the 'timings', each a dictionary of its count, total, mean and max seconds,
+                 and the 'counters'
+        """
+        with self._lock:
+            timings = {name: {'count': count, 'total': total, 'mean': total / count, 'max': maximum}
+                       for name, (count, total, maximum) in self._timings.items()}
+            return {'timings': timings, 'counters': dict(self._counters)}
+
+    def reset(self):
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+
+
+class LoggingSink:
+    """
+    Logs each timing and counter as it is recorded
+    """
+
+    def __init__(self, logger=None, level: int = logging.DEBUG):
+        """
+        :param:  logger - The logger written to, the logger of this module if it is not given
+                 level - The level the records are logged at
+        """
+        self.logger = logging.getLogger(__name__) if logger is None else logger
+        self.level = level
+
+    def record_timing(self, name: str, seconds: float):
+        self.logger.log(self.level, '%s took %.3f ms', name, seconds * 1000)
+
+    def add(self, name: str, value: int):
+        self.logger.log(self.level, '%s +%d', name, value)
+
+
+class PrometheusSink(MemorySink):
+    """
+    Keeps the timings and counters in memory, and writes them to a file in the Prometheus text format,
+    for the node exporter's textfile collector to pick up
+    """
+    DEFAULT_PREFIX = 'calendar'
+
+    def __init__(self, path: str, prefix: str = DEFAULT_PREFIX):
+        """
+        :param:  path - The file written to
+                 prefix - The prefix of the metric names
+        """
+        super().__init__()
+        self.path = path
+        self.prefix = prefix
+
+    def render(self):
+        """
+        :return: The timings and counters, in the Prometheus text format
+        """
+        stats = self.stats()
+        seconds = self.prefix + '_operation_seconds'
+        lines = ['# TYPE {} summary'.format(seconds)]
+        for name, timing in sorted(stats['timings'].items()):
+            lines.append('{}_sum{{operation="{}"}} {}'.format(seconds, name, timing['total']))
+            lines.append('{}_count{{operation="{}"}} {}'.format(seconds, name, timing['count']))
+        for name, value in sorted(stats['counters'].items()):
+            counter = '{}_{}_total'.format(self.prefix, name)
+            lines.append('# TYPE {} counter'.format(counter))
+            lines.append('{} {}'.format(counter, value))
+        return '\n'.join(lines) + '\n'
+
+    def write(self):
+        """
+        Write the metrics to the file, replacing it at once so that it is never read half written
+        """
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'w') as metrics_file:
+            metrics_file.write(self.render())
+        os.replace(temporary_path, self.path)
+
+
+class EventStore:
+    """
+    A local SQLite copy of the events of a calendar.
+    The first sync downloads every event, later syncs only pull the events changed or deleted since,
+    using the sync token returned by the API.
+    Only the fields of events that listing, searching, navigating and exporting use are synced, so requests for
+    other fields, or whole events, are not answered from the store
+    """
+    DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.calendar_events')
+    GONE_STATUS = 410
+    MAX_DELETE_PARAMETERS = 500
+    # The status of events is needed to find the cancelled ones in incremental syncs
+    SYNC_FIELDS = ('nextPageToken,nextSyncToken,defaultReminders,timeZone,'
+                   'items(id,status,summary,description,location,start,end,transparency,reminders)')
+
+    def __init__(self, api, calendar_id: str = Calendar.DEFAULT_CALENDAR_ID, directory: str = DEFAULT_DIRECTORY,
+                 executor=None):
+        """
+        Opens (or creates) the store of a calendar
+        :param:  api - The google calendar API reference
+                 calendar_id - The id of the calendar to keep a copy of
+                 directory - The directory the database file is kept in
+                 executor - The RequestExecutor requests are made through, a new one if it is not given
+        """
+        self.api = api
+        self.executor = RequestExecutor() if executor is None else executor
+        self.calendar_id = calendar_id
+        os.makedirs(directory, exist_ok=True)
+        file_name = re.sub(r'[^\w.@-]', '_', calendar_id) + '.sqlite3'
+        self.path = os.path.join(directory, file_name)
+
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS events '
+                                    '(id TEXT PRIMARY KEY, start REAL NOT NULL, end REAL NOT NULL, '
+                                    'payload TEXT NOT NULL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS events_by_start ON events (start)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)')
+
+    def sync(self):
+        """
+        Bring the store up to date with the calendar.
+        A full sync is done if the store has never been synced, or if the API rejects the sync token
+        """
+        sync_token = self._get_state('sync_token')
+        if sync_token is None:
+            self._pull(full=True)
+            return
+
+        try:
+            self._pull(full=False, syncToken=sync_token)
+        except HttpError as error:
+            if error.resp.status != self.GONE_STATUS:
+                raise
+            # The sync token has expired, so the store has to be rebuilt
+            self._pull(full=True)
+
+    def _pull(self, full: bool, **list_args):
+        """
+        Page through an events list request and write the result to the store in one transaction
+        :param:  full - True if the store should be replaced by the result, False to apply it as changes
+                 list_args - Extra arguments for the events list request
+        """
+        with self._lock, self.connection:
+            if full:
+                self.connection.execute('DELETE FROM events')
+
+            page_token = None
+            while True:
+                events_response = self.executor.execute(
+                    self.api.events().list(calendarId=self.calendar_id, singleEvents=True, showDeleted=not full,
+                                           pageToken=page_token, fields=self.SYNC_FIELDS, **list_args))
+                time_zone = get_time_zone(events_response.get('timeZone'))
+                for event in events_response.get('items', []):
+                    if event.get('status') == 'cancelled':
+                        self.connection.execute('DELETE FROM events WHERE id = ?', (event['id'],))
+                    else:
+                        self._write_event(event, time_zone)
+
+                next_page_token = events_response.get('nextPageToken')
+                if not next_page_token or next_page_token == page_token:
+                    break
+                page_token = next_page_token
+
+            self._set_state('sync_token', events_response.get('nextSyncToken'))
+            self._set_state('default_reminders', json.dumps(events_response.get('defaultReminders', [])))
+            if events_response.get('timeZone'):
+                self._set_state('time_zone', events_response['timeZone'])
+
+    def holds_fields(self, fields: str):
+        """
+        :param:  fields - The partial response of an events list request, None for whole events
+        :return: True if the stored events have every field of the events the request asks for
+        """
+        item_fields = None if fields is None else get_item_fields(fields)
+        return item_fields is not None and item_fields <= get_item_fields(self.SYNC_FIELDS)
+
+    def _write_event(self, event, time_zone=None):
+        """
+        Insert or replace an event in the store
+        :param:  event - The event resource, as returned by the API
+                 time_zone - The calendar's timezone, which all day events start at midnight in
+        """
+        start = get_event_timestamp(event['start'], time_zone)
+        end = get_event_timestamp(event['end'], time_zone) if 'end' in event else start
+        self.connection.execute('INSERT OR REPLACE INTO events (id, start, end, payload) VALUES (?, ?, ?, ?)',
+                                (event['id'], start, end, json.dumps(event)))
+
+    def _get_state(self, key: str):
+        row = self.connection.execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str):
+        self.connection.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)', (key, value))
+
+    def get_events(self, time_min: str, time_max: str):
+        """
+        Get the stored events overlapping a time window, as the events list request would
+        :param:  time_min - The lower bound (exclusive) for an event's end time, in ISO format
+                 time_max - The upper bound (exclusive) for an event's start time, in ISO format
+        :return: A list of the events, ordered by start time
+        """
+        with self._lock:
+            rows = self.connection.execute('SELECT payload FROM events WHERE start < ? AND end > ? '
+                                           'ORDER BY start, id',
+                                           (parse_iso_time(time_max).timestamp(),
+                                            parse_iso_time(time_min).timestamp())).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_time_zone(self):
+        """
+        :return: The IANA name of the calendar's timezone, as of the last sync, None if it is not known
+        """
+        return self._get_state('time_zone')
+
+    def iter_events(self, time_min: str, time_max: str, page_size: int = Calendar.DEFAULT_PAGE_SIZE):
+        """
+        Lazily get the stored events overlapping a time window, reading a page of rows at a time
+        :param:  time_min - The lower bound (exclusive) for an event's end time, in ISO format
+                 time_max - The upper bound (exclusive) for an event's start time, in ISO format
+                 page_size - The number of rows read at once
+        :return: A generator yielding the events, ordered by start time
+        """
+        start, end = parse_iso_time(time_max).timestamp(), parse_iso_time(time_min).timestamp()
+        last_start, last_id = float('-inf'), ''
+        while True:
+            # Each page continues after the last row of the one before, so the lock is not held between pages
+            with self._lock:
+                rows = self.connection.execute('SELECT start, id, payload FROM events WHERE start < ? AND end > ? '
+                                               'AND (start > ? OR (start = ? AND id > ?)) ORDER BY start, id LIMIT ?',
+                                               (start, end, last_start, last_start, last_id, page_size)).fetchall()
+            for row in rows:
+                yield json.loads(row[2])
+            if len(rows) < page_size:
+                return
+            last_start, last_id = rows[-1][0], rows[-1][1]
+
+    def get_default_reminders(self):
+        """
+        :return: The default reminders of the calendar, as of the last sync
+        """
+        default_reminders = self._get_state('default_reminders')
+        return json.loads(default_reminders) if default_reminders else []
+
+    def remove_event(self, event_id: str):
+        """
+        Remove an event from the store, without waiting for the next sync
+        :param:  event_id - The id of the event to remove
+        """
+        self.remove_events([event_id])
+
+    def remove_events(self, event_ids):
+        """
+        Remove events from the store in one transaction, without waiting for the next sync
+        :param:  event_ids - The ids of the events to remove
+        """
+        event_ids = list(event_ids)
+        with self._lock, self.connection:
+            # Older SQLite builds allow at most 999 parameters in a statement
+            for start in range(0, len(event_ids), self.MAX_DELETE_PARAMETERS):
+                chunk = event_ids[start:start + self.MAX_DELETE_PARAMETERS]
+                self.connection.execute('DELETE FROM events WHERE id IN ({})'.format(', '.join('?' * len(chunk))),
+                                        chunk)
+
+    def close(self):
+        self.connection.close()
+
+
+def get_date_iso(date_str: str):
+    """
+    :param: date_str should be in utc format
+    """
+    return date_str.isoformat() + 'Z'
+
+
+def get_utc_iso(time):
+    """
+    :param: time - A timezone aware datetime
+    :return: The time in utc, in the ISO format used by the API
+    """
+    return get_date_iso(time.astimezone(datetime.timezone.utc).replace(tzinfo=None))
+
+
+def split_window(start, end, step):
+    """
+    Split a window of time into consecutive shards
+    :param:  start - The start of the window
+             end - The end of the window
+             step - The length of each shard, a timedelta or relativedelta. The last shard may be shorter
+    :return: A list of the (start, end) of each shard
+    """
+    shards = []
+    shard_start = start
+    while shard_start < end:
+        shard_end = min(shard_start + step, end)
+        shards.append((shard_start, shard_end))
+        shard_start = shard_end
+    return shards
+
+
+def parse_iso_time(time_str: str):
+    """
+    Parse an ISO formatted time, as used by the API, into a timezone aware datetime
+    :param: time_str - The time, naive times are taken as utc
+    """
+    if time_str.endswith('Z'):
+        time_str = time_str[:-1] + '+00:00'
+    parsed = datetime.datetime.fromisoformat(time_str)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+
+def parse_event_time(event_time, time_zone=None):
+    """
+    Parse an event's start or end into a timezone aware datetime, in the event's own timezone
+    :param: event_time - The 'start' or 'end' of an event, holding either a 'dateTime' or an all day 'date'
+            time_zone - The calendar's timezone, as a tzinfo, which all day dates are taken as midnight in.
+                        All day dates are taken as midnight utc if it is not given
+    """
+    if 'dateTime' in event_time or time_zone is None:
+        return parse_iso_time(event_time.get('dateTime', event_time.get('date')))
+    return datetime.datetime.combine(datetime.date.fromisoformat(event_time['date']), datetime.time(),
+                                     tzinfo=time_zone)
+
+
+def get_time_zone(name: str, default=None):
+    """
+    :param:  name - The IANA name of a timezone, such as 'Australia/Melbourne', as returned by the API
+             default - The value returned if there is no name, or it is not a known timezone
+    :return: The timezone, as a tzinfo
+    """
+    time_zone = tz.gettz(name) if name else None
+    return default if time_zone is None else time_zone
+
+
+def expand_recurring_event(event, window_start, window_end, exceptions=None):
+    """
+    Lazily expand the instances of a recurring event within a window, from its recurrence rules.
+    Only the instances up to the end of the window are generated
+    :param:  event - The recurring event, as returned by the API with singleEvents=False
+             window_start - The lower bound for an instance's end time, a timezone aware datetime
+             window_end - The upper bound for an instance's start time, a timezone aware datetime
+             exceptions - A dictionary of the modified and cancelled instances, by the recurring event's id
+                          and the timestamp of the instance's original start. Matched instances are removed
+    :return: A generator yielding the instances, in the form the API returns them with singleEvents=True
+    """
+    all_day = 'dateTime' not in event['start']
+    start = parse_event_time(event['start'])
+    duration = parse_event_time(event['end']) - start
+    time_zone = get_time_zone(event['start'].get('timeZone')) if not all_day else None
+    if time_zone is not None:
+        # Instances keep their wall clock time across daylight saving changes
+        start = start.astimezone(time_zone)
+
+    rules = []
+    dates = {'EXDATE': [], 'RDATE': []}
+    for line in event['recurrence']:
+        match = RECURRENCE_DATES_PATTERN.match(line)
+        if match:
+            dates[match.group(1)].extend(parse_recurrence_dates(match.group(2), match.group(3), start.tzinfo))
+        else:
+            rules.append(UNTIL_DATE_PATTERN.sub(r'UNTIL=\1T235959Z', line))
+
+    recurrence = rrulestr('\n'.join(rules), dtstart=start, forceset=True)
+    for date in dates['RDATE']:
+        recurrence.rdate(date)
+    for date in dates['EXDATE']:
+        recurrence.exdate(date)
+
+    if exceptions is None:
+        exceptions = {}
+    for instance_start in recurrence.xafter(window_start - duration):
+        if instance_start >= window_end:
+            break
+        exception = exceptions.pop((event['id'], instance_start.timestamp()), None)
+        if exception is not None:
+            if exception.get('status') != 'cancelled':
+                yield exception
+            continue
+        yield make_instance(event, instance_start, duration, all_day)
+
+
+def parse_recurrence_dates(parameters: str, values: str, default_timezone):
+    """
+    Parse the dates of an EXDATE or RDATE recurrence line
+    :param:  parameters - The parameters of the line, such as ';TZID=Australia/Melbourne' or ';VALUE=DATE'
+             values - The comma separated dates, such as 20200810T100000, 20200810T000000Z or 20200810
+             default_timezone - The timezone of dates without one, the timezone of the event
+    :return: A list of timezone aware datetimes. Dates without a time are midnight utc, as all day events are
+    """
+    time_zone = default_timezone
+    for parameter in parameters.split(';'):
+        if parameter.startswith('TZID='):
+            time_zone = tz.gettz(parameter[len('TZID='):]) or default_timezone
+
+    parsed = []
+    for value in values.split(','):
+        if len(value) == 8:
+            parsed.append(datetime.datetime.strptime(value, '%Y%m%d').replace(tzinfo=datetime.timezone.utc))
+        elif value.endswith('Z'):
+            parsed.append(datetime.datetime.strptime(value, '%Y%m%dT%H%M%SZ').replace(tzinfo=datetime.timezone.utc))
+        else:
+            parsed.append(datetime.datetime.strptime(value, '%Y%m%dT%H%M%S').replace(tzinfo=time_zone))
+    return parsed
+
+
+def make_instance(event, start, duration, all_day: bool):
+    """
+    Make an instance of a recurring event
+    :param:  event - The recurring event
+             start - The start of the instance
+             duration - The length of the event
+             all_day - If True, the instance is all day
+    :return: The instance, in the form the API returns it with singleEvents=True
+    """
+    instance = {key: value for key, value in event.items() if key != 'recurrence'}
+    if all_day:
+        instance_id = start.strftime('%Y%m%d')
+        instance['start'] = {'date': start.date().isoformat()}
+        instance['end'] = {'date': (start + duration).date().isoformat()}
+    else:
+        instance_id = start.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        instance['start'] = dict(event['start'], dateTime=start.isoformat())
+        instance['end'] = dict(event['end'], dateTime=(start + duration).isoformat())
+    instance['id'] = event['id'] + '_' + instance_id
+    instance['recurringEventId'] = event['id']
+    instance['originalStartTime'] = dict(instance['start'])
+    return instance
+
+
+def get_date_range(time: str):
+    """
+    Get the range of dates covered by a year, month or day
+    :param: time - The year, month or day, as YYYY, YYYY-MM or YYYY-MM-DD
+    :return: A tuple of the first date in the range, and the date after the range
+    """
+    match = DATE_QUERY_PATTERN.match(time.strip())
+    if match is None:
+        raise ValueError("Time must be given as YYYY, YYYY-MM or YYYY-MM-DD")
+
+    year, month, day = match.groups()
+    first_date = datetime.date(int(year), int(month or 1), int(day or 1))
+    if day is not None:
+        step = relativedelta(days=1)
+    elif month is not None:
+        step = relativedelta(months=1)
+    else:
+        step = relativedelta(years=1)
+    return first_date, first_date + step
+
+
+def format_reminder(reminder):
+    """
+    :param: reminder - The Reminder
+    :return: The reminder as displayed
+    """
+    return 'Reminder in ' + str(reminder.minutes) + ' minutes before event as ' + str(reminder.method)
+
+
+def format_event(event):
+    """
+    :param: event - The Event
+    :return: The event and each of its reminders, as displayed
+    """
+    return '\n'.join(['Event:' + event.summary + ' at ' + event.start_text] +
+                     [format_reminder(reminder) for reminder in event.reminders])
+
+
+def event_to_dict(event):
+    """
+    :param: event - The Event
+    :return: The event as a dictionary of plain values, for exporting
+    """
+    end = event.end.date() if event.all_day else event.end
+    return {'id': event.id, 'summary': event.summary, 'start': event.start_text, 'end': end.isoformat(),
+            'all_day': event.all_day, 'location': event.location, 'description': event.description,
+            'reminders': [{'method': reminder.method, 'minutes': reminder.minutes} for reminder in event.reminders]}
+
+
+def is_retryable_error(error):
+    """
+    Check if a failed request may succeed when retried
+    :param: error - The error the request failed with
+    """
+    if isinstance(error, TRANSPORT_ERRORS):
+        return True
+    if not isinstance(error, HttpError):
+        return False  # Programming errors and unexpected responses are not helped by retrying
+    if error.resp.status in RETRYABLE_STATUSES:
+        return True
+    content = error.content or b''
+    if isinstance(content, str):
+        content = content.encode()
+    return error.resp.status == 403 and b'ratelimitexceeded' in content.lower()
+
+
+def get_retry_after(error):
+    """
+    Get the number of seconds a server asked to wait before retrying, from the Retry-After header of an error
+    :param: error - The error a request failed with
+    :return: The number of seconds, or None if the error has no valid Retry-After header
+    """
+    if not isinstance(error, HttpError):
+        return None
+    try:
+        retry_after = error.resp.get('retry-after')
+    except AttributeError:
+        return None
+    if not isinstance(retry_after, str):
+        return None
+
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_time = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_time - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+def get_item_fields(fields: str):
+    """
+    :param:  fields - The partial response of an events list request, such as 'nextPageToken,items(id,summary)'
+    :return: A set of the fields of the events asked for, None if every field is
+    """
+    _, _, item_fields = fields.partition('items(')
+    if item_fields:
+        return set(item_fields.rstrip(')').split(','))
+    return None if 'items' in fields.split(',') else set()
+
+
+def find_free_slots(busy, start, end, duration):
+    """
+    Find the gaps between busy intervals long enough for a new event
+    :param:  busy - The (start, end) posix timestamps of the busy intervals, in any order, which may overlap
+             start - The start of the range searched, a timezone aware datetime or ISO formatted time
+             end - The end of the range searched
+             duration - The shortest gap wanted, a timedelta
+    :return: A list of (start, end) of each gap, as utc datetimes
+    """
+    start, end = to_timestamp(start), to_timestamp(end)
+    shortest = duration.total_seconds()
+    slots = []
+    free_from = start
+    for busy_start, busy_end in sorted(busy):
+        if busy_start - free_from >= shortest:
+            slots.append((free_from, min(busy_start, end)))
+        free_from = max(free_from, busy_end)
+        if free_from >= end:
+            break
+    if end - free_from >= shortest:
+        slots.append((free_from, end))
+    return [(datetime.datetime.fromtimestamp(slot_start, datetime.timezone.utc),
+             datetime.datetime.fromtimestamp(slot_end, datetime.timezone.utc))
+            for slot_start, slot_end in slots if slot_end - slot_start >= shortest]
+
+
+def tokenize(text: str):
+    """
+    Split text into lower case words
+    """
+    return WORD_PATTERN.findall(text.lower())
+
+
+def get_event_words(event):
+    """
+    Get the searchable words of an event, from its summary, description, location and reminders
+    :param: event - The Event
+    """
+    words = set()
+    for text in [event.summary, event.description, event.location]:
+        words.update(tokenize(text))
+    if not event.uses_default_reminders:
+        for reminder in event.reminders:
+            words.update(tokenize(str(reminder.method) + ' ' + str(reminder.minutes)))
+    return words
+
+
+def to_timestamp(time):
+    """
+    Get the posix timestamp of a time
+    :param: time - A timezone aware datetime, or an ISO formatted time
+    """
+    if isinstance(time, str):
+        time = parse_iso_time(time)
+    return time.timestamp()
+
+
+def get_event_timestamp(event_time, time_zone=None):
+    """
+    Get the posix timestamp of an event's start or end
+    :param: event_time - The 'start' or 'end' of an event, holding either a 'dateTime' or an all day 'date'
+            time_zone - The calendar's timezone, which all day dates are taken as midnight in, utc if not given
+    """
+    return parse_event_time(event_time, time_zone).timestamp()
+
+
+"""
+The following is runner code unrelated to the functionality and is only to be used
+demo the functionality. Therefore, this code is not used in coverage testing
+"""
+
+
+def get_choice():      #
+    print('Please enter your choice')
+    print('1. View past events.')
+    print('2. View future events')
+    print('3. Navigate to an event with the date')
+    print('4. Search for an event and reminders')
+    print('5. Delete an event and reminders')
+    print('6. Exit')
+
+    choice = int(input('Your choice as an integer: '))
+
+    return choice
+
+
+def print_events(events, calendar):
+    EventFormatter().write_events(calendar.iter_to_events(events))
+
+
+def print_results(result_list):
+    if isinstance(result_list, str):  # A message that nothing was found
+        result_list = [result_list]
+    formatter = EventFormatter()
+    for printResult in result_list:
+        formatter.write_result(printResult)
+
+
+def get_event_to_delete(calendar):
+    print('Select event to be deleted')
+    events = calendar.get_past_events(fields=Calendar.FIELDS_SUMMARY)
+    events += calendar.get_future_events(fields=Calendar.FIELDS_SUMMARY)
+    print_events(events, calendar)
+    try:
+        events_index = int(input('Enter the number of the event that you wish to delete: ')) - 1
+        return events[events_index]
+    except IndexError:
+        print("Index out of bounds")
+        return get_event_to_delete(calendar)
+
+
+def add_query_commands(commands):
+    """
+    Add the commands which can be run from the command line, or as a line of a batch
+    :param: commands - The subparsers to add the commands to
+    """
+    past = commands.add_parser('past', help='view past events')
+    past.add_argument('--years', type=int, default=Calendar.DEFAULT_PAST_YEAR_RANGE)
+
+    future = commands.add_parser('future', help='view future events')
+    future.add_argument('--years', type=int, default=Calendar.DEFAULT_FUTURE_YEAR_RANGE)
+
+    navigate = commands.add_parser('navigate', help='view the events of a year, month or day')
+    navigate.add_argument('date', help='YYYY, YYYY-MM or YYYY-MM-DD')
+
+    search = commands.add_parser('search', help='search events and reminders by keyword')
+    search.add_argument('keywords', nargs='+')
+    search.add_argument('--any', action='store_true', help='match any keyword, rather than every keyword')
+
+    show = commands.add_parser('show', help='view the whole of events by id')
+    show.add_argument('event_ids', nargs='+')
+
+    delete = commands.add_parser('delete', help='delete events by id')
+    delete.add_argument('event_ids', nargs='+')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='View, search and delete Google Calendar events. '
+                                                 'Run without a command for the interactive menu.')
+    parser.add_argument('--format', choices=EventFormatter.MODES, default=EventFormatter.TEXT,
+                        help='output format')
+    parser.add_argument('--calendar', default=Calendar.DEFAULT_CALENDAR_ID, help='id of the calendar to use')
+    parser.add_argument('--metrics', metavar='FILE', help='write timings and counters to a Prometheus text file')
+    commands = parser.add_subparsers(dest='command')
+    add_query_commands(commands)
+
+    batch = commands.add_parser('batch', help='run many commands, one per line, from a file or stdin')
+    batch.add_argument('file', nargs='?', type=argparse.FileType('r'), default='-')
+    return parser
+
+
+def build_query_parser():
+    parser = argparse.ArgumentParser(prog='batch', add_help=False)
+    add_query_commands(parser.add_subparsers(dest='command'))
+    return parser
+
+
+def run_query(calendar, args, formatter):
+    """
+    Run a single command against a calendar
+    :param:  calendar - The Calendar
+             args - The parsed command
+             formatter - The EventFormatter to write the results to
+    """
+    if args.command == 'past':
+        formatter.write_events(calendar.iter_past_events(args.years))
+    elif args.command == 'future':
+        formatter.write_events(calendar.iter_future_events(args.years))
+    elif args.command == 'navigate':
+        formatter.write_events(calendar.get_events_on(args.date))
+    elif args.command == 'search':
+        formatter.write_events(calendar.find_events(' '.join(args.keywords), match_all=not args.any))
+    elif args.command == 'show':
+        formatter.write_events(calendar.to_events([calendar.get_event_details(event_id)
+                                                   for event_id in args.event_ids]))
+    elif args.command == 'delete':
+        summary = calendar.delete_events_bulk([{'id': event_id} for event_id in args.event_ids])
+        for event_id in summary['deleted']:
+            formatter.write_status(event_id, 'deleted')
+        for event_id, error in summary['failed'].items():
+            formatter.write_status(event_id, 'failed', str(error))
+
+
+def run_batch(calendar, lines, formatter):
+    """
+    Run many commands against the same calendar, so the events are only fetched once
+    :param:  calendar - The Calendar
+             lines - The commands, one per line, blank lines and lines starting with # are skipped
+             formatter - The EventFormatter to write the results to
+    :return: The number of commands which could not be run
+    """
+    query_parser = build_query_parser()
+    errors = 0
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        formatter.start_query(line)
+        try:
+            args = query_parser.parse_args(shlex.split(line))
+            if args.command is None:
+                raise ValueError("No command given")
+            run_query(calendar, args, formatter)
+        except SystemExit:  # argparse exits on an invalid command, after printing its usage
+            errors += 1
+            formatter.write_status('', 'error', 'invalid command')
+        except (ValueError, HttpError) + TRANSPORT_ERRORS as error:  # Each query fails on its own
+            errors += 1
+            formatter.write_status('', 'error', str(error))
+    return errors
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        run_menu()
+        return
+
+    sink = PrometheusSink(args.metrics) if args.metrics else None
+    instrumentation = Instrumentation(sink, enabled=sink is not None)
+    executor = RequestExecutor(instrumentation=instrumentation)
+    api = get_calendar_api(lazy=True, instrumentation=instrumentation)
+    calendar = Calendar(api, args.calendar, event_store=EventStore(api, args.calendar, executor=executor),
+                        cache=ResponseCache(), lazy=True, executor=executor, instrumentation=instrumentation)
+    formatter = EventFormatter(sys.stdout, args.format)
+    try:
+        if args.command == 'batch':
+            if run_batch(calendar, args.file, formatter):
+                sys.exit(1)
+        else:
+            run_query(calendar, args, formatter)
+    finally:
+        if sink is not None:
+            sink.write()
 
 
-def main():
-    primary_calendar = Calendar(get_calendar_api())
+def run_menu():
+    api = get_calendar_api(lazy=True)
+    executor = RequestExecutor()
+    primary_calendar = Calendar(api, event_store=EventStore(api, executor=executor), cache=ResponseCache(), lazy=True,
+                                executor=executor)
 
     # time_now = datetime.datetime.utcnow().isoformat() + 'Z'  # 'Z' indicates UTC time
     # primary_calendar.get_upcoming_events(time_now, 3)
@@ -312,19 +3172,19 @@ def main():
             years = input('')
             try:
                 years = int(years)
-                events = primary_calendar.get_past_events(years)
+                events = primary_calendar.iter_past_events(years)
             except ValueError:
-                events = primary_calendar.get_past_events()
-            print_events(events, primary_calendar)
+                events = primary_calendar.iter_past_events()
+            EventFormatter().write_events(events)
         elif choice == 2:
             print("Enter number of years that you would like to view. (Enter any letter or character to view default years(2))")
             years = input('')
             try:
                 years = int(years)
-                events = primary_calendar.get_future_events(years)
+                events = primary_calendar.iter_future_events(years)
             except ValueError:
-                events = primary_calendar.get_future_events()
-            print_events(events, primary_calendar)
+                events = primary_calendar.iter_future_events()
+            EventFormatter().write_events(events)
         elif choice == 3:
             date = input("Enter date for search: ")
             results = primary_calendar.navigate_to_events(date)
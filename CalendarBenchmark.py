@@ -0,0 +1,516 @@
+"""
+Benchmarks for the calendar application
+
+Usage
+    python CalendarBenchmark.py startup [--repeat N] [--fake]
+    python CalendarBenchmark.py suite [--events N] [--latency SECONDS] [--samples N] [--save-baseline FILE]
+                                      [--compare FILE]
+
+The startup benchmark compares the time taken before the menu can be shown, when the API and the
+calendar's reminder defaults are loaded eagerly, and when they are loaded lazily on first use.
+It uses the credentials in token.pickle, in the same way as the application, unless --fake is given.
+
+The suite times the fetch, search, navigate, overlap, reminder, scheduling, invite and delete paths of a
+Calendar against FakeCalendarApi, a deterministic generated calendar, and reports throughput, latency
+percentiles and peak memory. Results can be saved as a baseline, and later runs compared against it to find regressions.
+"""
+
+__author__ = "Sadeeptha Bandara, Kaveesha Nissanka"
+
+import argparse
+import datetime
+import itertools
+import json
+import statistics
+import time
+import tracemalloc
+
+from dateutil.relativedelta import relativedelta
+
+from Calendar import Calendar, ReminderScheduler, RequestExecutor, get_calendar_api, parse_iso_time
+
+SUMMARIES = ['FIT2107 Lecture', 'FIT2107 Tutorial', 'Team Meeting', 'Consultation', 'Exam Revision', 'Lab Session',
+             'Workshop', 'Seminar', 'Gym', 'Dinner']
+LOCATIONS = ['Clayton Campus', 'Caulfield Campus', 'Online', 'Library']
+SEARCH_KEYWORDS = ['fit2107', 'lecture', 'meeting', 'lab', 'seminar campus', 'online', 'rev', 'nothing']
+
+
+class FakeRequest:
+    """
+    A request to the fake API, which waits for the injected latency when it is executed
+    """
+
+    def __init__(self, api, handle, **kwargs):
+        self.api = api
+        self.handle = handle
+        self.kwargs = kwargs
+
+    def execute(self):
+        self.api.requests += 1
+        if self.api.latency:
+            time.sleep(self.api.latency)
+        return self.handle(**self.kwargs)
+
+
+class FakeBatch:
+    """
+    A batch request to the fake API, executing its requests with a single round trip
+    """
+
+    def __init__(self, api, callback):
+        self.api = api
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.api.requests += 1
+        if self.api.latency:
+            time.sleep(self.api.latency)
+        for request_id, request in self.requests:
+            try:
+                response = request.handle(**request.kwargs)
+            except Exception as error:
+                self.callback(request_id, None, error)
+            else:
+                self.callback(request_id, response, None)
+
+
+class FakeEvents:
+    def __init__(self, api):
+        self.api = api
+
+    def list(self, **kwargs):
+        return FakeRequest(self.api, self.api.list_events, **kwargs)
+
+    def get(self, **kwargs):
+        return FakeRequest(self.api, self.api.get_event, **kwargs)
+
+    def delete(self, **kwargs):
+        return FakeRequest(self.api, self.api.delete_event, **kwargs)
+
+    def patch(self, **kwargs):
+        return FakeRequest(self.api, self.api.patch_event, **kwargs)
+
+
+class FakeCalendarList:
+    def __init__(self, api):
+        self.api = api
+
+    def get(self, **kwargs):
+        return FakeRequest(self.api, lambda calendarId: {'id': calendarId,
+                                                         'defaultReminders': self.api.default_reminders},
+                           **kwargs)
+
+
+class FakeCalendarApi:
+    """
+    A deterministic stand in for the Google Calendar API, serving a generated calendar.
+    Events are spread evenly over the default 5 years past and 2 years future, and are generated when they are
+    listed, so even calendars of a million events take little memory. A fraction are all day, and a fraction
+    have their own reminders. Each request waits for the injected latency
+    """
+    DEFAULT_PAGE_SIZE = 250
+    MAX_PAGE_SIZE = 2500
+    EVENT_DURATION = datetime.timedelta(hours=1)
+    ALL_DAY_DURATION = datetime.timedelta(days=1)
+
+    def __init__(self, number_of_events: int, latency: float = 0.0, seed: int = 0, start=None,
+                 all_day_every: int = 10, overrides_every: int = 3):
+        """
+        :param:  number_of_events - The number of events in the calendar
+                 latency - The number of seconds each request waits
+                 seed - Changes which events are all day, and the text and reminders of events
+                 start - The timezone aware start of the first event, 5 years before today by default
+                 all_day_every - One in this many events is all day
+                 overrides_every - One in this many events has its own reminders
+        """
+        if start is None:
+            today = datetime.datetime.now(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+            start = today - relativedelta(years=Calendar.DEFAULT_PAST_YEAR_RANGE)
+            end = today + relativedelta(years=Calendar.DEFAULT_FUTURE_YEAR_RANGE)
+        else:
+            end = start + relativedelta(years=Calendar.DEFAULT_PAST_YEAR_RANGE + Calendar.DEFAULT_FUTURE_YEAR_RANGE)
+
+        self.number_of_events = number_of_events
+        self.latency = latency
+        self.seed = seed
+        self.start = start
+        self.spacing = (end - start) / max(number_of_events, 1)
+        self.all_day_every = all_day_every
+        self.overrides_every = overrides_every
+        self.default_reminders = [{'method': 'popup', 'minutes': 10}]
+        self.deleted = set()
+        self.requests = 0
+
+    def events(self):
+        return FakeEvents(self)
+
+    def calendarList(self):
+        return FakeCalendarList(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    def _mix(self, number: int):
+        """
+        :return: A pseudo random number derived from an event number and the seed
+        """
+        return (number * 2654435761 + self.seed * 40503) % 4294967296
+
+    def make_event(self, number: int):
+        """
+        Generate an event
+        :param:  number - The number of the event, from 0
+        :return: The event, as the API returns it
+        """
+        mix = self._mix(number)
+        start = self.start + self.spacing * number
+        event = {'kind': 'calendar#event', 'id': 'event{:08d}'.format(number), 'status': 'confirmed',
+                 'summary': SUMMARIES[mix % len(SUMMARIES)] + ' ' + str(number % 97),
+                 'location': LOCATIONS[(mix >> 8) % len(LOCATIONS)],
+                 'description': 'Generated event number ' + str(number),
+                 'htmlLink': 'https://www.google.com/calendar/event?eid=' + str(number),
+                 'etag': '"{}"'.format(mix), 'iCalUID': 'event{:08d}@google.com'.format(number), 'sequence': 0,
+                 'created': self.start.isoformat(), 'updated': self.start.isoformat(),
+                 'creator': {'email': 'student@student.monash.edu', 'self': True},
+                 'organizer': {'email': 'student@student.monash.edu', 'self': True},
+                 'attendees': [{'email': 'attendee{}@student.monash.edu'.format((mix >> shift) % 50),
+                                'responseStatus': 'needsAction'} for shift in (3, 9, 15)]}
+        if mix % 4 == 0:
+            event['conferenceData'] = {
+                'conferenceId': 'abc-defg-{:03d}'.format(mix % 1000),
+                'entryPoints': [{'entryPointType': 'video', 'uri': 'https://meet.google.com/abc-defg-hij'}],
+                'conferenceSolution': {'key': {'type': 'hangoutsMeet'}, 'name': 'Google Meet'}}
+
+        if number % self.all_day_every == 0:
+            event['start'] = {'date': start.date().isoformat()}
+            event['end'] = {'date': (start.date() + self.ALL_DAY_DURATION).isoformat()}
+        else:
+            event['start'] = {'dateTime': start.isoformat()}
+            event['end'] = {'dateTime': (start + self.EVENT_DURATION).isoformat()}
+
+        if number % self.overrides_every == 0:
+            event['reminders'] = {'useDefault': False,
+                                  'overrides': [{'method': 'email', 'minutes': 5 + (mix >> 4) % 60},
+                                                {'method': 'popup', 'minutes': 5 + (mix >> 12) % 30}]}
+        else:
+            event['reminders'] = {'useDefault': True}
+        return event
+
+    def _get_start(self, number: int):
+        start = self.start + self.spacing * number
+        if number % self.all_day_every == 0:
+            return datetime.datetime.combine(start.date(), datetime.time(), tzinfo=datetime.timezone.utc)
+        return start
+
+    def _get_end(self, number: int):
+        if number % self.all_day_every == 0:
+            return self._get_start(number) + self.ALL_DAY_DURATION
+        return self._get_start(number) + self.EVENT_DURATION
+
+    def _first_number_at(self, time):
+        """
+        :return: The number of the first event starting at or after a time
+        """
+        number = max(0, int((time - self.start) / self.spacing))
+        while number > 0 and self._get_start(number - 1) >= time:
+            number -= 1
+        while number < self.number_of_events and self._get_start(number) < time:
+            number += 1
+        return number
+
+    def list_events(self, calendarId, timeMin=None, timeMax=None, maxResults=None, pageToken=None, fields=None,
+                    **kwargs):
+        """
+        Answer an events list request, a page at a time, with only the fields asked for
+        """
+        page_size = min(maxResults or self.DEFAULT_PAGE_SIZE, self.MAX_PAGE_SIZE)
+        if pageToken is not None:
+            number = int(pageToken)
+        elif timeMin is not None:
+            # Events which started up to a day before the window may still overlap it
+            number = self._first_number_at(parse_iso_time(timeMin) - self.ALL_DAY_DURATION)
+        else:
+            number = 0
+        time_min = parse_iso_time(timeMin) if timeMin is not None else None
+        time_max = parse_iso_time(timeMax) if timeMax is not None else None
+
+        items = []
+        while number < self.number_of_events and len(items) < page_size:
+            if time_max is not None and self._get_start(number) >= time_max:
+                number = self.number_of_events
+                break
+            if (time_min is None or self._get_end(number) > time_min) and number not in self.deleted:
+                items.append(self.make_event(number))
+            number += 1
+
+        response = {'kind': 'calendar#events', 'summary': calendarId, 'timeZone': 'UTC',
+                    'defaultReminders': self.default_reminders, 'items': items}
+        if number < self.number_of_events:
+            response['nextPageToken'] = str(number)
+        return project(response, fields)
+
+    def _get_number(self, event_id: str):
+        number = int(event_id[len('event'):])
+        if number >= self.number_of_events or number in self.deleted:
+            raise KeyError(event_id)
+        return number
+
+    def get_event(self, calendarId, eventId, **kwargs):
+        return self.make_event(self._get_number(eventId))
+
+    def patch_event(self, calendarId, eventId, body, **kwargs):
+        return dict(self.make_event(self._get_number(eventId)), **body)
+
+    def delete_event(self, calendarId, eventId):
+        self.deleted.add(self._get_number(eventId))
+        return ''
+
+
+def project(response, fields: str):
+    """
+    Keep only the fields of a list response asked for, as a partial response does
+    :param:  response - The response
+             fields - The fields, such as 'nextPageToken,items(id,summary)', None for the whole response
+    :return: The partial response
+    """
+    if fields is None:
+        return response
+    item_fields = None
+    if '(' in fields:
+        fields, _, item_fields = fields.partition('items(')
+        item_fields = set(item_fields.rstrip(')').split(','))
+        fields += 'items'
+    partial = {field: response[field] for field in fields.split(',') if field in response}
+    if item_fields is not None:
+        partial['items'] = [{field: item[field] for field in item_fields if field in item}
+                            for item in response['items']]
+    return partial
+
+
+def time_call(function, repeat: int, setup=None):
+    """
+    Time a function
+    :param:  function - The function to time, called without arguments, or with the result of setup if it is given
+             repeat - The number of times to call it
+             setup - An optional function called before each call, which is not timed
+    :return: A list of the time taken by each call, in seconds
+    """
+    timings = []
+    for _ in range(repeat):
+        arguments = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        function(*arguments)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def benchmark_startup(repeat: int, api_factory=get_calendar_api):
+    """
+    Time constructing the calendar used by the application, eagerly and lazily
+    :param:  repeat - The number of times each startup is timed
+             api_factory - The function returning the API, taking whether it should be lazy
+    :return: A dictionary of the startup mode, to the list of timings in seconds
+    """
+    return {
+        'eager': time_call(lambda: Calendar(api_factory(lazy=False)), repeat),
+        'lazy': time_call(lambda: Calendar(api_factory(lazy=True), lazy=True), repeat),
+    }
+
+
+def percentile(timings, fraction: float):
+    """
+    :param:  timings - The timings
+             fraction - The percentile, as a fraction
+    :return: The timing below which the fraction of timings fall
+    """
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(operation, items: int = 1, repeat: int = 1, setup=None):
+    """
+    Time an operation, and track the peak memory it allocates.
+    The timed calls run without tracemalloc, which slows down allocation heavy code several times over,
+    and the peak memory is taken from one more call, traced on its own
+    :param:  operation - The operation, called without arguments, or with the result of setup if it is given
+             items - The number of items, such as events, each call processes
+             repeat - The number of times to call it
+             setup - An optional function called before each call, which is not timed or traced
+    :return: A dictionary of the total seconds, items per second, latency percentiles and peak memory in bytes
+    """
+    timings = time_call(operation, repeat, setup)
+
+    arguments = () if setup is None else (setup(),)
+    tracemalloc.start()
+    try:
+        operation(*arguments)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    total = sum(timings)
+    return {'seconds': total,
+            'throughput': items * repeat / total if total else float('inf'),
+            'p50': percentile(timings, 0.5),
+            'p95': percentile(timings, 0.95),
+            'p99': percentile(timings, 0.99),
+            'peak_memory': peak_memory}
+
+
+def run_suite(number_of_events: int, latency: float = 0.0, repeat: int = 20, delete_count: int = 500,
+              shard_workers: int = 8, samples: int = 5):
+    """
+    Time each path of a Calendar against a generated calendar
+    :param:  number_of_events - The number of events in the calendar
+             latency - The number of seconds each request waits
+             repeat - The number of times each query is run
+             delete_count - The number of events deleted
+             shard_workers - The number of requests made at once by the sharded fetch
+             samples - The number of times each benchmark over the whole calendar is run
+    :return: A dictionary of the benchmark name, to its measurements
+    """
+    api = FakeCalendarApi(number_of_events, latency=latency)
+    calendar = Calendar(api, executor=RequestExecutor(rate=None))
+    results = {}
+
+    def fetch():
+        events = calendar.get_past_events()
+        events += calendar.get_future_events()
+        return events
+
+    results['fetch'] = measure(fetch, number_of_events, samples)
+    events = fetch()
+    results['fetch_index'] = measure(lambda: calendar.get_past_events(fields=Calendar.FIELDS_INDEX)
+                                     + calendar.get_future_events(fields=Calendar.FIELDS_INDEX), number_of_events,
+                                     samples)
+
+    sharded = Calendar(api, executor=RequestExecutor(rate=None), shard_workers=shard_workers)
+    results['fetch_sharded'] = measure(lambda: sharded.get_past_events() + sharded.get_future_events(),
+                                       number_of_events, samples)
+
+    results['index'] = measure(lambda: calendar.search_events('warm', refresh=True), number_of_events, samples)
+    keywords = itertools.cycle(SEARCH_KEYWORDS)
+    results['search'] = measure(lambda: calendar.search_events(next(keywords)), repeat=repeat * len(SEARCH_KEYWORDS))
+
+    months = [(api.start + relativedelta(months=month)).strftime('%Y-%m') for month in range(0, 84, 7)]
+    dates = itertools.cycle(months)
+    results['navigate'] = measure(lambda: calendar.navigate_to_events(next(dates)), repeat=repeat * len(months))
+
+    afternoons = [api.start + datetime.timedelta(days=day, hours=14) for day in range(0, 2555, 211)]
+    starts = itertools.cycle(afternoons)
+
+    def overlap():
+        start = next(starts)
+        return calendar.get_events_between(start, start + datetime.timedelta(hours=1.5))
+
+    results['overlap'] = measure(overlap, repeat=repeat * len(afternoons))
+    results['conflicts'] = measure(calendar.find_conflicts, number_of_events, samples)
+
+    results['reminders'] = measure(lambda: calendar.get_events_with_reminders(events), len(events), samples)
+    results['events'] = measure(lambda: calendar.to_events(events), len(events), samples)
+
+    compact_events = calendar.to_events(events)
+
+    def new_scheduler():
+        return ReminderScheduler(lambda event, reminder, fire_time: None, clock=lambda: api.start.timestamp())
+
+    def filled_scheduler():
+        scheduler = new_scheduler()
+        scheduler.add_events(compact_events)
+        return scheduler
+
+    results['schedule'] = measure(lambda scheduler: scheduler.add_events(compact_events), len(compact_events),
+                                  samples, setup=new_scheduler)
+    reminders = len(filled_scheduler())
+    results['fire'] = measure(lambda scheduler: scheduler.fire_due(float('inf')), reminders, samples,
+                              setup=filled_scheduler)
+
+    to_invite = events[:delete_count]
+    emails = ['student{}@student.monash.edu'.format(number) for number in range(20)]
+    results['invite'] = measure(lambda: calendar.invite_attendees(to_invite, emails), len(to_invite), samples)
+
+    def restore_events():
+        # Each delete runs against the whole calendar, with the indexes the deletes are removed from built
+        api.deleted.clear()
+        calendar.search_events('warm', refresh=True)
+        calendar.navigate_to_events(months[0])
+        calendar.find_conflicts()
+
+    to_delete = events[:delete_count]
+    results['delete'] = measure(lambda _: calendar.delete_events_bulk(to_delete), len(to_delete), samples,
+                                setup=restore_events)
+    return results
+
+
+def compare(results, baseline, threshold: float):
+    """
+    Compare results against a baseline, by the median time of each benchmark, which is steadier than the total
+    :param:  results - The results of a run of the suite
+             baseline - The results of an earlier run
+             threshold - The fraction a benchmark may slow down by before it is a regression
+    :return: A list of (benchmark name, ratio of the new time to the baseline time) for each regression
+    """
+    regressions = []
+    for name, measurements in results.items():
+        if name in baseline and baseline[name]['p50'] > 0:
+            ratio = measurements['p50'] / baseline[name]['p50']
+            if ratio > 1 + threshold:
+                regressions.append((name, ratio))
+    return regressions
+
+
+def print_timings(results):
+    for name, timings in results.items():
+        print('{:<10} median {:9.3f} ms   min {:9.3f} ms   max {:9.3f} ms'.format(
+            name, statistics.median(timings) * 1000, min(timings) * 1000, max(timings) * 1000))
+
+
+def print_results(results):
+    print('{:<14} {:>10} {:>14} {:>10} {:>10} {:>10} {:>12}'.format(
+        'benchmark', 'seconds', 'items/s', 'p50 ms', 'p95 ms', 'p99 ms', 'peak MiB'))
+    for name, measurements in results.items():
+        print('{:<14} {:>10.3f} {:>14.0f} {:>10.3f} {:>10.3f} {:>10.3f} {:>12.2f}'.format(
+            name, measurements['seconds'], measurements['throughput'], measurements['p50'] * 1000,
+            measurements['p95'] * 1000, measurements['p99'] * 1000, measurements['peak_memory'] / 2 ** 20))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks for the calendar application')
+    parser.add_argument('benchmark', choices=['startup', 'suite'])
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed runs')
+    parser.add_argument('--samples', type=int, default=5, help='number of runs of the whole calendar benchmarks')
+    parser.add_argument('--fake', action='store_true', help='start up against the fake API')
+    parser.add_argument('--events', type=int, default=10000, help='number of events in the fake calendar')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds each fake request waits')
+    parser.add_argument('--save-baseline', metavar='FILE', help='save the results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare the results against a baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='slow down allowed before a regression')
+    args = parser.parse_args()
+
+    if args.benchmark == 'startup':
+        if args.fake:
+            print_timings(benchmark_startup(args.repeat, lambda lazy: FakeCalendarApi(0, latency=args.latency)))
+        else:
+            print_timings(benchmark_startup(args.repeat))
+        return
+
+    results = run_suite(args.events, args.latency, args.repeat, samples=args.samples)
+    print_results(results)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        for name, ratio in regressions:
+            print('REGRESSION {}: {:.2f}x slower than the baseline'.format(name, ratio))
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
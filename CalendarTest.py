@@ -1,6 +1,48 @@
+import asyncio
+import datetime
+import io
+import json
+import socket
+import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import Mock, MagicMock, patch
-from Calendar import Calendar
+import httplib2
+from googleapiclient.errors import HttpError
+import Calendar as CalendarModule
+from Calendar import (AsyncCalendar, AuthorizedHttpPool, Calendar, DateIndex, Event, EventFormatter, EventStore,
+                      EventTable, Instrumentation, IntervalIndex, KeywordIndex, LazyCalendarApi, LoggingSink,
+                      MemorySink, MultiCalendar, PrometheusSink, Reminder, ReminderScheduler, RequestExecutor,
+                      ResponseCache, np)
+from CalendarBenchmark import FakeCalendarApi, compare, project
+
+
+class FakeBatch:
+    """
+    Stands in for a batch HTTP request, answering each added request with the next scripted error
+    for its id, or success once the script for the id runs out
+    """
+    def __init__(self, errors, batches, callback):
+        self.errors = errors
+        self.callback = callback
+        self.request_ids = []
+        batches.append(self.request_ids)
+
+    def add(self, request, request_id):
+        self.request_ids.append(request_id)
+
+    def execute(self):
+        for request_id in self.request_ids:
+            scripted = self.errors.get(request_id, [])
+            if scripted:
+                self.callback(request_id, None, scripted.pop(0))
+            else:
+                self.callback(request_id, {}, None)
+
+
+def http_error(status, content=b''):
+    return HttpError(Mock(status=status, reason='Error'), content)
 
 
 class CalendarTestGetEvents(unittest.TestCase):
@@ -81,6 +123,202 @@ class CalendarTestGetEvents(unittest.TestCase):
             self.fail("Test failed: KeyError raised for no event instance.")
 
 
+class CalendarTestIterEvents(unittest.TestCase):
+    """
+    Test suite for the paginated event iterator
+    """
+    def setUp(self) -> None:
+        self.mock_api = MagicMock()
+        self.Calendar = Calendar(self.mock_api)
+        self.time_min = "2020-01-01T00:00:00Z"
+        self.time_max = "2021-01-01T00:00:00Z"
+
+    def set_pages(self, *pages):
+        """
+        Makes the mocked events list call return the given pages in order
+        """
+        self.mock_api.events.return_value.list.return_value.execute.side_effect = list(pages)
+
+    def test_iter_events_follows_pages(self):
+        """
+        Checks that every page is requested, with the token of the previous page
+        """
+        for prefetch in [False, True]:
+            with self.subTest(prefetch=prefetch):
+                self.set_pages({'items': [{'id': '1'}, {'id': '2'}], 'nextPageToken': 'page2',
+                                'defaultReminders': [{}]},
+                               {'items': [{'id': '3'}], 'defaultReminders': [{}]})
+                self.mock_api.events.return_value.list.reset_mock()
+
+                events = list(self.Calendar.iter_events(self.time_min, self.time_max, page_size=2,
+                                                        prefetch=prefetch))
+                self.assertEqual(['1', '2', '3'], [event['id'] for event in events])
+
+                calls = self.mock_api.events.return_value.list.call_args_list
+                self.assertEqual(2, len(calls))
+                self.assertEqual(None, calls[0][1]['pageToken'])
+                self.assertEqual('page2', calls[1][1]['pageToken'])
+                self.assertEqual(2, calls[1][1]['maxResults'])
+
+    def test_iter_events_is_lazy(self):
+        """
+        Checks that the next page is only requested once the current page is consumed
+        """
+        self.set_pages({'items': [{'id': '1'}], 'nextPageToken': 'page2', 'defaultReminders': [{}]},
+                       {'items': [{'id': '2'}], 'defaultReminders': [{}]})
+
+        events = self.Calendar.iter_events(self.time_min, self.time_max)
+        self.assertEqual('1', next(events)['id'])
+        self.assertEqual(1, self.mock_api.events.return_value.list.call_count)
+
+    def test_iter_events_repeated_token(self):
+        """
+        Checks that a page token repeated by the server does not loop forever
+        """
+        self.set_pages({'items': [{'id': '1'}], 'nextPageToken': 'same', 'defaultReminders': [{}]},
+                       {'items': [{'id': '2'}], 'nextPageToken': 'same', 'defaultReminders': [{}]})
+
+        events = list(self.Calendar.iter_events(self.time_min, self.time_max))
+        self.assertEqual(['1', '2'], [event['id'] for event in events])
+
+    def test_iter_events_page_size(self):
+        """
+        Checks that an invalid page size is rejected
+        """
+        self.assertRaises(ValueError, list, self.Calendar.iter_events(self.time_min, self.time_max, 0))
+
+
+class CalendarTestEventStore(unittest.TestCase):
+    """
+    Test suite for the local event store
+    """
+    def setUp(self) -> None:
+        self.mock_api = MagicMock()
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = EventStore(self.mock_api, directory=self.directory.name)
+        self.mock_list = self.mock_api.events.return_value.list
+        self.event = {'id': '1', 'summary': 'Lecture', 'start': {'dateTime': '2020-10-13T11:30:00+05:30'},
+                      'end': {'dateTime': '2020-10-13T12:30:00+05:30'}, 'reminders': {'useDefault': True}}
+        self.all_day_event = {'id': '2', 'summary': 'Holiday', 'start': {'date': '2020-11-13'},
+                              'end': {'date': '2020-11-14'}, 'reminders': {'useDefault': True}}
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_full_then_incremental_sync(self):
+        """
+        Checks that only the first sync downloads everything, and later syncs apply the changes
+        """
+        changed_event = dict(self.event, summary='Moved Lecture')
+        self.mock_list.return_value.execute.side_effect = [
+            {'items': [self.event], 'nextPageToken': 'page2'},
+            {'items': [self.all_day_event], 'nextSyncToken': 'sync1', 'defaultReminders': [{'minutes': 10}]},
+            {'items': [changed_event, {'id': '2', 'status': 'cancelled'}], 'nextSyncToken': 'sync2'}]
+
+        self.store.sync()
+        self.assertNotIn('syncToken', self.mock_list.call_args[1])
+        self.assertEqual(['1', '2'], [event['id'] for event in self.store.get_events('2020-01-01T00:00:00Z',
+                                                                                        '2021-01-01T00:00:00Z')])
+        self.assertEqual([{'minutes': 10}], self.store.get_default_reminders())
+
+        self.store.sync()
+        self.assertEqual('sync1', self.mock_list.call_args[1]['syncToken'])
+        self.assertEqual([changed_event], self.store.get_events('2020-01-01T00:00:00Z', '2021-01-01T00:00:00Z'))
+
+    def test_expired_sync_token(self):
+        """
+        Checks that the store is rebuilt when the sync token is no longer valid
+        """
+        self.mock_list.return_value.execute.side_effect = [
+            {'items': [self.event, self.all_day_event], 'nextSyncToken': 'sync1'},
+            HttpError(Mock(status=410, reason='Gone'), b''),
+            {'items': [self.all_day_event], 'nextSyncToken': 'sync2'}]
+
+        self.store.sync()
+        self.store.sync()
+        self.assertEqual([self.all_day_event], self.store.get_events('2020-01-01T00:00:00Z',
+                                                                     '2021-01-01T00:00:00Z'))
+
+    def test_get_events_range(self):
+        """
+        Checks that only the events overlapping the window are returned
+        """
+        self.mock_list.return_value.execute.side_effect = [
+            {'items': [self.event, self.all_day_event], 'nextSyncToken': 'sync1'}]
+        self.store.sync()
+
+        self.assertEqual([self.event], self.store.get_events('2020-10-13T06:30:00Z', '2020-11-01T00:00:00Z'))
+        self.assertEqual([], self.store.get_events('2020-10-13T07:00:00Z', '2020-11-13T00:00:00Z'))
+        self.assertEqual([self.all_day_event], self.store.get_events('2020-11-13T23:00:00Z',
+                                                                     '2020-12-01T00:00:00Z'))
+
+    def test_all_day_in_calendar_time_zone(self):
+        """
+        Checks that all day events are stored from midnight in the calendar's timezone
+        """
+        self.mock_list.return_value.execute.return_value = {
+            'items': [self.all_day_event], 'nextSyncToken': 'sync1', 'timeZone': 'Australia/Melbourne'}
+        self.store.sync()
+        self.assertEqual('Australia/Melbourne', self.store.get_time_zone())
+        self.assertEqual([self.all_day_event], self.store.get_events('2020-11-12T13:30:00Z', '2020-11-12T14:00:00Z'))
+        self.assertEqual([], self.store.get_events('2020-11-13T13:30:00Z', '2020-11-13T14:00:00Z'))
+
+    def test_remove_events(self):
+        """
+        Checks that many events are removed at once, even past the statement parameter limit
+        """
+        self.mock_list.return_value.execute.return_value = {
+            'items': [self.event, self.all_day_event, dict(self.event, id='3')], 'nextSyncToken': 'sync1'}
+        self.store.sync()
+        self.store.MAX_DELETE_PARAMETERS = 1
+        self.store.remove_events({'1', '3', 'missing'})
+        self.assertEqual([self.all_day_event], self.store.get_events('2020-01-01T00:00:00Z', '2021-01-01T00:00:00Z'))
+
+    def test_iter_events(self):
+        """
+        Checks that reading the store a page of rows at a time returns the events in the same order
+        """
+        events = [dict(self.event, id=str(number)) for number in range(5)] + [self.all_day_event]
+        self.mock_list.return_value.execute.return_value = {'items': events, 'nextSyncToken': 'sync1'}
+        self.store.sync()
+        self.assertEqual(self.store.get_events('2020-01-01T00:00:00Z', '2021-01-01T00:00:00Z'),
+                         list(self.store.iter_events('2020-01-01T00:00:00Z', '2021-01-01T00:00:00Z', page_size=2)))
+
+    def test_calendar_reads_from_store(self):
+        """
+        Checks that a calendar with a store syncs it instead of listing the window, unless it asks for fields
+        the store does not hold
+        """
+        self.store.sync = MagicMock()
+        self.store.get_events = MagicMock(return_value=[self.event])
+        calendar = Calendar(self.mock_api, event_store=self.store)
+        self.mock_list.reset_mock()
+
+        self.assertEqual([self.event], calendar.get_past_events(fields=Calendar.FIELDS_INDEX))
+        self.store.sync.assert_called_once()
+        self.mock_list.assert_not_called()
+
+        self.mock_list.return_value.execute.return_value = {'items': [], 'defaultReminders': [{}]}
+        calendar.get_past_events(fields=Calendar.FIELDS_ATTENDEES)
+        calendar.get_past_events()
+        self.assertEqual([Calendar.FIELDS_ATTENDEES, None], [call[1].get('fields')
+                                                             for call in self.mock_list.call_args_list])
+        self.store.sync.assert_called_once()
+
+    def test_sync_partial_response(self):
+        """
+        Checks that syncs only ask for the fields the store keeps, which cover what the application shows
+        """
+        self.mock_list.return_value.execute.return_value = {'items': [self.event], 'nextSyncToken': 'sync1'}
+        self.store.sync()
+        self.assertEqual(EventStore.SYNC_FIELDS, self.mock_list.call_args[1]['fields'])
+        for fields in [Calendar.FIELDS_SUMMARY, Calendar.FIELDS_INDEX]:
+            self.assertTrue(self.store.holds_fields(fields))
+        for fields in [Calendar.FIELDS_ATTENDEES, 'nextPageToken,items', None]:
+            self.assertFalse(self.store.holds_fields(fields))
+
+
 class CalendarTestNavigateEvents(unittest.TestCase):
     """
     Test suite for the navigate method
@@ -121,6 +359,73 @@ class CalendarTestNavigateEvents(unittest.TestCase):
         searchResult = self.Calendar.navigate_to_events('2020-10')
         self.assertEqual("Nothing showed up at this time: 2020-10", searchResult)
 
+    def test_navigate_uses_index(self):
+        """"
+        Tests that repeated navigation is answered without fetching the events again
+        """
+        self.Calendar.get_past_events = MagicMock(return_value=[{'id': '1', 'summary': 'Past Event Summary',
+                                                                 'start': {'date': '2020-10-13'},
+                                                                 'reminders': {'useDefault': True}}])
+        self.Calendar.get_future_events = MagicMock(return_value=[])
+
+        self.Calendar.navigate_to_events('2020')
+        self.Calendar.navigate_to_events('2020-10-13')
+        self.assertEqual(1, self.Calendar.get_past_events.call_count)
+
+        self.Calendar.navigate_to_events('2020', refresh=True)
+        self.assertEqual(2, self.Calendar.get_past_events.call_count)
+
+    def test_navigate_invalid_time(self):
+        """"
+        Tests that a time which is not a year, month or day shows no events
+        """
+        self.Calendar.get_past_events = MagicMock(return_value=[{'id': '1', 'summary': 'Past Event Summary',
+                                                                 'start': {'date': '2020-10-13'},
+                                                                 'reminders': {'useDefault': True}}])
+        self.assertEqual("Nothing showed up at this time: 10-13", self.Calendar.navigate_to_events('10-13'))
+        self.assertEqual("Nothing showed up at this time: 2020-13", self.Calendar.navigate_to_events('2020-13'))
+
+
+class CalendarTestDateIndex(unittest.TestCase):
+    """
+    Test suite for the date index used by navigation
+    """
+    def setUp(self) -> None:
+        self.events = [{'id': '1', 'start': {'dateTime': '2020-12-31T23:30:00+05:30'}},
+                       {'id': '2', 'start': {'date': '2021-01-01'}},
+                       {'id': '3', 'start': {'dateTime': '2020-02-29T09:00:00Z'}},
+                       {'id': '4', 'start': {'date': '2021-01-31'}}]
+        self.index = DateIndex([Event.from_api(event) for event in self.events])
+
+    def get_ids(self, time):
+        return [event.id for event in self.index.get_events(time)]
+
+    def test_year_month_day(self):
+        """
+        Checks the boundaries of year, month and day lookups
+        """
+        self.assertEqual(['3', '1'], self.get_ids('2020'))
+        self.assertEqual(['2', '4'], self.get_ids('2021-01'))
+        self.assertEqual(['3'], self.get_ids('2020-02-29'))
+        self.assertEqual(['1'], self.get_ids('2020-12'))
+        self.assertEqual([], self.get_ids('2019'))
+
+    def test_invalid_time(self):
+        """
+        Checks that times which are not dates are rejected
+        """
+        for time in ['20', '2020-1', '2020-02-30', 'October']:
+            with self.subTest(time=time):
+                self.assertRaises(ValueError, self.index.get_events, time)
+
+    def test_remove_event(self):
+        """
+        Checks that a removed event can no longer be found
+        """
+        self.index.remove_event('2')
+        self.assertEqual(['4'], self.get_ids('2021'))
+        self.assertEqual(3, len(self.index))
+
 
 class CalendarTestSearchEvents(unittest.TestCase):
     """
@@ -188,6 +493,81 @@ class CalendarTestSearchEvents(unittest.TestCase):
             ["Nothing showed up in your search"],
             searchResult)
 
+    def test_search_after_delete(self):
+        """"
+        Tests that a deleted event no longer shows up, without the events being fetched again
+        """
+        event = {'id': '1olba0rgbijmfv72m1126kpftf', 'summary': 'Past Event Summary',
+                 'start': {'dateTime': '2020-10-13T11:30:00+05:30'}, 'reminders': {'useDefault': True}}
+        self.Calendar.get_past_events = MagicMock(return_value=[event])
+        self.Calendar.get_future_events = MagicMock(return_value=[])
+
+        self.assertEqual(1, len(self.Calendar.search_events('past')))
+        self.Calendar.delete_events(event)
+        self.assertEqual(["Nothing showed up in your search"], self.Calendar.search_events('past'))
+        self.assertEqual("Nothing showed up at this time: 2020", self.Calendar.navigate_to_events('2020'))
+        self.assertEqual(1, self.Calendar.get_past_events.call_count)
+
+
+class CalendarTestKeywordIndex(unittest.TestCase):
+    """
+    Test suite for the keyword index used by search
+    """
+    def setUp(self) -> None:
+        start = {'date': '2020-10-13'}
+        self.index = KeywordIndex([Event.from_api(event) for event in [
+            {'id': '1', 'summary': 'FIT2107 Lecture', 'location': 'Clayton Campus', 'start': start,
+             'reminders': {'useDefault': True}},
+            {'id': '2', 'summary': 'FIT2107 Tutorial', 'description': 'Bring the assignment', 'start': start,
+             'reminders': {'useDefault': False, 'overrides': [{'method': 'email', 'minutes': 20}]}},
+            {'id': '3', 'summary': 'Lunch', 'start': start, 'reminders': {'useDefault': True}}]])
+
+    def get_ids(self, query, **kwargs):
+        return [event.id for event in self.index.search(query, **kwargs)]
+
+    def test_search_fields(self):
+        """
+        Checks that the summary, description, location and reminders are all searchable
+        """
+        self.assertEqual(['1', '2'], self.get_ids('fit2107'))
+        self.assertEqual(['2'], self.get_ids('ASSIGNMENT'))
+        self.assertEqual(['1'], self.get_ids('clayton'))
+        self.assertEqual(['2'], self.get_ids('email'))
+        self.assertEqual([], self.get_ids(''))
+
+    def test_search_and_or(self):
+        """
+        Checks matching every word, or any word, of a query
+        """
+        self.assertEqual(['2'], self.get_ids('fit2107 tutorial'))
+        self.assertEqual([], self.get_ids('lecture lunch'))
+        self.assertEqual(['1', '3'], self.get_ids('lecture lunch', match_all=False))
+
+    def test_search_prefix(self):
+        """
+        Checks that words match the start of longer words, unless prefix matching is off
+        """
+        self.assertEqual(['1', '3'], self.get_ids('l', match_all=False))
+        self.assertEqual(['2'], self.get_ids('tut'))
+        self.assertEqual([], self.get_ids('tut', prefix=False))
+
+    def test_add_and_remove(self):
+        """
+        Checks that the index is updated when events are added, replaced and removed
+        """
+        start = datetime.datetime(2020, 10, 13, tzinfo=datetime.timezone.utc)
+        self.index.add_event(Event('4', 'Lecture revision', start))
+        self.assertEqual(['1', '4'], self.get_ids('lecture'))
+
+        self.index.add_event(Event('1', 'Cancelled class', start))
+        self.assertEqual(['4'], self.get_ids('lecture'))
+        self.assertEqual(['1'], self.get_ids('cancelled'))
+
+        self.index.remove_event('1')
+        self.index.remove_event('missing')
+        self.assertEqual([], self.get_ids('cancelled'))
+        self.assertEqual(3, len(self.index))
+
 
 class CalendarTestDeleteEvents(unittest.TestCase):
     """
@@ -220,18 +600,1605 @@ class CalendarTestDeleteEvents(unittest.TestCase):
         self.assertEqual([], self.Calendar.get_past_events.return_value)
 
 
+class CalendarTestBulkDelete(unittest.TestCase):
+    """
+    Test suite for deleting events with batch requests
+    """
+    def setUp(self) -> None:
+        self.mock_api = MagicMock()
+        # Without a rate limit, the only waits are between retries
+        self.Calendar = Calendar(self.mock_api, executor=RequestExecutor(rate=None))
+        self.errors = {}
+        self.batches = []
+        self.mock_api.new_batch_http_request.side_effect = \
+            lambda callback: FakeBatch(self.errors, self.batches, callback)
+        self.events = [{'id': str(number), 'summary': 'Event ' + str(number)} for number in range(120)]
+
+    @patch('Calendar.time.sleep')
+    def test_batches_of_fifty(self, mock_sleep):
+        """
+        Checks that the deletes are split into batches of at most 50
+        """
+        summary = self.Calendar.delete_events_bulk(self.events)
+
+        self.assertEqual([50, 50, 20], [len(batch) for batch in self.batches])
+        self.assertEqual([event['id'] for event in self.events], summary['deleted'])
+        self.assertEqual({}, summary['failed'])
+        self.assertEqual(0, summary['retries'])
+        mock_sleep.assert_not_called()
+
+    @patch('Calendar.time.sleep')
+    def test_retry_failed_subset(self, mock_sleep):
+        """
+        Checks that only the transiently failed deletes are retried, with increasing waits
+        """
+        self.errors['3'] = [http_error(503), http_error(429)]
+        self.errors['7'] = [http_error(404)]
+        self.errors['9'] = [http_error(403, b'{"reason": "rateLimitExceeded"}')]
+
+        summary = self.Calendar.delete_events_bulk(self.events[:10], backoff=2)
+
+        self.assertEqual(['3', '9'], self.batches[1])
+        self.assertEqual(['3'], self.batches[2])
+        self.assertEqual([call[0][0] for call in mock_sleep.call_args_list], [2, 4])
+        self.assertEqual(['7'], list(summary['failed']))
+        self.assertEqual(404, summary['failed']['7'].resp.status)
+        self.assertEqual(9, len(summary['deleted']))
+        self.assertEqual(2, summary['retries'])
+
+    @patch('Calendar.time.sleep')
+    def test_retries_exhausted(self, mock_sleep):
+        """
+        Checks that deletes still failing after the last retry are reported
+        """
+        self.errors['1'] = [http_error(500)] * 5
+
+        summary = self.Calendar.delete_events_bulk(self.events[:2], max_retries=2)
+        self.assertEqual(['1'], list(summary['failed']))
+        self.assertEqual(['0'], summary['deleted'])
+        self.assertEqual(2, summary['retries'])
+        self.assertEqual(3, len(self.batches))
+
+    def test_local_copies_updated_once(self):
+        """
+        Checks that the deleted events are removed from the store, cache and indexes in one pass each
+        """
+        events = [dict(event, start={'date': '2020-10-{:02d}'.format(1 + int(event['id']) % 28)},
+                       reminders={'useDefault': False}) for event in self.events]
+        self.Calendar._get_events_from_year = MagicMock(
+            side_effect=lambda years, fields=None: list(events[:60] if years < 0 else events[60:]))
+        self.Calendar.cache = MagicMock()
+        self.Calendar.event_store = MagicMock()
+        self.Calendar.search_events('event')
+        self.Calendar.navigate_to_events('2020-10')
+
+        deleted = self.Calendar.delete_events_bulk(events[::2])['deleted']
+
+        self.Calendar.cache.invalidate.assert_called_once_with('primary')
+        self.Calendar.event_store.remove_events.assert_called_once_with(set(deleted))
+        remaining = [event['id'] for event in events[1::2]]
+        self.assertEqual(remaining, [event.id for event in self.Calendar._indexed_events])
+        self.assertEqual(sorted(remaining), sorted(event.id for event in self.Calendar._date_index.get_events('2020')))
+        self.assertEqual(sorted(remaining), sorted(event.id for event in self.Calendar.find_events('event')))
+
+    @patch('Calendar.time.sleep')
+    def test_programming_error_raised(self, mock_sleep):
+        """
+        Checks that an error which is not from the API or the connection is raised, rather than retried
+        """
+        self.mock_api.new_batch_http_request.side_effect = None
+        self.mock_api.new_batch_http_request.return_value.execute.side_effect = KeyError('items')
+
+        self.assertRaises(KeyError, self.Calendar.delete_events_bulk, self.events)
+        self.assertEqual(1, self.mock_api.new_batch_http_request.return_value.execute.call_count)
+        mock_sleep.assert_not_called()
+
+
+class CalendarTestInviteAttendees(unittest.TestCase):
+    """
+    Test suite for inviting attendees to many events with batch requests
+    """
+    def setUp(self) -> None:
+        self.mock_api = MagicMock()
+        self.Calendar = Calendar(self.mock_api, executor=RequestExecutor(rate=None), cache=ResponseCache())
+        self.errors = {}
+        self.batches = []
+        self.mock_api.new_batch_http_request.side_effect = \
+            lambda callback: FakeBatch(self.errors, self.batches, callback)
+        self.mock_patch = self.mock_api.events.return_value.patch
+        self.mock_get = self.mock_api.events.return_value.get
+        self.events = [{'id': str(number), 'summary': 'Tutorial ' + str(number), 'attendees': []}
+                       for number in range(60)]
+        self.events[0]['attendees'] = [{'email': 'Tutor@student.monash.edu', 'responseStatus': 'accepted'}]
+
+    def get_bodies(self):
+        return {call[1]['eventId']: call[1]['body'] for call in self.mock_patch.call_args_list}
+
+    def test_invalid_addresses(self):
+        """
+        Checks that any address outside student.monash.edu is rejected before anything is sent
+        """
+        for email in ['someone@gmail.com', 'someone@monash.edu', 'someone@student.monash.edu.au', 'student.monash.edu',
+                      'a b@student.monash.edu', '@student.monash.edu']:
+            with self.subTest(email=email):
+                self.assertRaises(ValueError, self.Calendar.invite_attendees, self.events,
+                                  ['abcd0001@student.monash.edu', email])
+        self.mock_patch.assert_not_called()
+        self.mock_api.new_batch_http_request.assert_not_called()
+
+    @patch('Calendar.time.sleep')
+    def test_merged_and_batched(self, mock_sleep):
+        """
+        Checks that addresses are deduplicated and merged into the existing attendees, in batches of at most 50
+        """
+        emails = ['abcd0001@student.monash.edu', ' ABCD0001@Student.Monash.edu', 'tutor@student.monash.edu']
+        summary = self.Calendar.invite_attendees(self.events, emails)
+
+        self.assertEqual([50, 10], [len(batch) for batch in self.batches])
+        bodies = self.get_bodies()
+        self.assertEqual({'attendees': [{'email': 'Tutor@student.monash.edu', 'responseStatus': 'accepted'},
+                                        {'email': 'abcd0001@student.monash.edu'}]}, bodies['0'])
+        self.assertEqual({'attendees': [{'email': 'abcd0001@student.monash.edu'},
+                                        {'email': 'tutor@student.monash.edu'}]}, bodies['1'])
+        self.assertEqual('all', self.mock_patch.call_args[1]['sendUpdates'])
+        self.assertEqual(['abcd0001@student.monash.edu'], summary['invited']['0'])
+        self.assertEqual(60, len(summary['invited']))
+        self.assertEqual([], summary['unchanged'])
+        mock_sleep.assert_not_called()
+
+    @patch('Calendar.time.sleep')
+    def test_unchanged_and_retried(self, mock_sleep):
+        """
+        Checks that events already inviting everyone are not patched, and transient failures are retried
+        """
+        self.errors['1'] = [http_error(503)]
+        self.errors['2'] = [http_error(404)]
+
+        summary = self.Calendar.invite_attendees(self.events[:3], ['tutor@student.monash.edu'], send_updates='none')
+
+        self.assertEqual(['0'], summary['unchanged'])
+        self.assertEqual(['1', '2'], self.batches[0])
+        self.assertEqual(['1'], self.batches[1])
+        self.assertEqual({'1': ['tutor@student.monash.edu']}, summary['invited'])
+        self.assertEqual(['2'], list(summary['failed']))
+        self.assertEqual(1, summary['retries'])
+        self.assertEqual('none', self.mock_patch.call_args[1]['sendUpdates'])
+
+    @patch('Calendar.time.sleep')
+    def test_partial_events(self, mock_sleep):
+        """
+        Checks that the attendees of events fetched without them are fetched before patching, so they are kept,
+        and events whose attendees cannot be fetched are not patched
+        """
+        partial = [{'id': event['id'], 'summary': event['summary']} for event in self.events[:3]]
+        existing = [{'email': 'tutor@student.monash.edu', 'responseStatus': 'accepted'}]
+        self.errors['2'] = [http_error(404)]
+        responses = {'0': {'id': '0', 'attendees': existing}, '1': {'id': '1'}}
+
+        def new_batch(callback):
+            if self.batches:  # The first batch gets the attendees, and the ones after patch the events
+                return FakeBatch(self.errors, self.batches, callback)
+            return FakeBatch(self.errors, self.batches, lambda request_id, response, exception: callback(
+                request_id, None if exception else responses[request_id], exception))
+
+        self.mock_api.new_batch_http_request.side_effect = new_batch
+        summary = self.Calendar.invite_attendees(partial, ['abcd0001@student.monash.edu'])
+
+        self.assertEqual([['0', '1', '2'], ['0', '1']], self.batches)
+        self.assertEqual('id,attendees', self.mock_get.call_args[1]['fields'])
+        self.assertEqual({'0': {'attendees': existing + [{'email': 'abcd0001@student.monash.edu'}]},
+                          '1': {'attendees': [{'email': 'abcd0001@student.monash.edu'}]}}, self.get_bodies())
+        self.assertEqual(['0', '1'], list(summary['invited']))
+        self.assertEqual(404, summary['failed']['2'].resp.status)
+
+
+class CalendarTestMultiCalendar(unittest.TestCase):
+    """
+    Test suite for the combined view over several calendars
+    """
+    def setUp(self) -> None:
+        self.mock_api = MagicMock()
+        self.events = {
+            'work': [{'id': 'w1', 'start': {'dateTime': '2020-10-13T09:00:00+11:00'}},
+                     {'id': 'w2', 'start': {'dateTime': '2020-10-15T09:00:00+11:00'}}],
+            'uni': [{'id': 'u1', 'start': {'date': '2020-10-12'}},
+                    {'id': 'u2', 'start': {'dateTime': '2020-10-13T08:00:00Z'}}]}
+        self.reminders = {'work': {'method': 'email', 'minutes': 30}, 'uni': {'method': 'popup', 'minutes': 10}}
+
+        self.mock_api.calendarList.return_value.get.side_effect = lambda calendarId: Mock(
+            execute=Mock(return_value={'defaultReminders': [self.reminders[calendarId]]}))
+        self.mock_api.events.return_value.list.side_effect = lambda calendarId, **kwargs: Mock(
+            execute=Mock(return_value={'items': self.events[calendarId],
+                                       'defaultReminders': [self.reminders[calendarId]]}))
+
+    def test_merged_by_start_time(self):
+        """
+        Checks that the events of every calendar are merged in start time order
+        """
+        calendars = MultiCalendar(self.mock_api, ['work', 'uni', 'work'])
+        self.assertEqual(['work', 'uni'], calendars.calendar_ids)
+
+        events = calendars.get_future_events()
+        self.assertEqual([('uni', 'u1'), ('work', 'w1'), ('uni', 'u2'), ('work', 'w2')],
+                         [(calendar_id, event['id']) for calendar_id, event in events])
+        self.assertEqual(4, len(calendars.get_past_events()))
+
+    def test_all_day_in_calendar_time_zone(self):
+        """
+        Checks that all day events are merged at midnight in their own calendar's timezone
+        """
+        self.events = {
+            'melbourne': [{'id': 'a1', 'start': {'date': '2020-10-13'}},
+                          {'id': 'a2', 'start': {'dateTime': '2020-10-13T09:00:00+11:00'}}],
+            'london': [{'id': 'b1', 'start': {'dateTime': '2020-10-12T23:00:00Z'}}]}
+        time_zones = {'melbourne': 'Australia/Melbourne', 'london': 'Europe/London'}
+        self.reminders = {'melbourne': self.reminders['work'], 'london': self.reminders['uni']}
+        self.mock_api.events.return_value.list.side_effect = lambda calendarId, **kwargs: Mock(
+            execute=Mock(return_value={'items': self.events[calendarId], 'timeZone': time_zones[calendarId],
+                                       'defaultReminders': [self.reminders[calendarId]]}))
+
+        events = MultiCalendar(self.mock_api, ['london', 'melbourne']).get_future_events()
+        self.assertEqual(['a1', 'a2', 'b1'], [event['id'] for calendar_id, event in events])
+
+    def test_reminder_defaults_per_calendar(self):
+        """
+        Checks that each calendar keeps its own reminder defaults
+        """
+        calendars = MultiCalendar(self.mock_api, ['work', 'uni'])
+        event = {'id': 'e', 'reminders': {'useDefault': True}}
+
+        self.assertEqual([self.reminders['work']], calendars.get_event_reminder('work', dict(event))['reminders'])
+        self.assertEqual([self.reminders['uni']], calendars.get_event_reminder('uni', dict(event))['reminders'])
+
+    def test_invalid_workers(self):
+        """
+        Checks that at least one worker is needed
+        """
+        self.assertRaises(ValueError, MultiCalendar, self.mock_api, ['work'], 0)
+
+
+class CalendarTestAsyncCalendar(unittest.TestCase):
+    """
+    Test suite for the asyncio version of the Calendar
+    """
+    def setUp(self) -> None:
+        self.mock_api = MagicMock()
+        self.Calendar = Calendar(self.mock_api)
+
+    def test_same_results(self):
+        """
+        Checks that the awaitable methods return what the Calendar methods do
+        """
+        events = [{'id': '1', 'summary': 'Past Event Summary', 'start': {'date': '2020-10-13'},
+                   'reminders': {'useDefault': True}}]
+        self.Calendar.get_past_events = MagicMock(return_value=events)
+        self.Calendar.get_future_events = MagicMock(return_value=[])
+
+        async def run():
+            async with AsyncCalendar(self.Calendar) as calendar:
+                return (await calendar.get_past_events(3),
+                        await calendar.search_events('past'),
+                        await calendar.navigate_to_events('2020-10'))
+
+        past, search, navigate = asyncio.run(run())
+        self.assertEqual(events, past)
+        self.Calendar.get_past_events.assert_any_call(3)
+        self.assertEqual(['Event:Past Event Summary at 2020-10-13\nReminder in 10 minutes before event'], search)
+        self.assertEqual(search, navigate)
+
+    def test_exit_leaves_loop_running(self):
+        """
+        Checks that leaving the context waits for the requests in flight without blocking the event loop
+        """
+        released = threading.Event()
+        self.Calendar.get_past_events = lambda years: released.wait(5) and []
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            async with AsyncCalendar(self.Calendar) as calendar:
+                request = asyncio.ensure_future(calendar.get_past_events(1))
+                await asyncio.sleep(0.01)
+                # Only runs if the loop is free while the thread pool shuts down
+                loop.call_later(0.01, released.set)
+            return await request
+
+        start = time.monotonic()
+        self.assertEqual([], asyncio.run(run()))
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_concurrency_limit(self):
+        """
+        Checks that requests run concurrently, up to the concurrency limit
+        """
+        lock = threading.Lock()
+        running = [0, 0]  # in flight, most in flight
+        release = threading.Event()
+
+        def slow_delete(event):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            release.wait(1)
+            with lock:
+                running[0] -= 1
+
+        self.Calendar.delete_events = slow_delete
+
+        async def run():
+            async with AsyncCalendar(self.Calendar, max_concurrency=3) as calendar:
+                deletes = asyncio.gather(*(calendar.delete_events({'id': str(number)}) for number in range(6)))
+                await asyncio.sleep(0.1)
+                release.set()
+                await deletes
+
+        asyncio.run(run())
+        self.assertEqual(3, running[1])
+
+    def test_iter_events(self):
+        """
+        Checks that the async iterator yields the events of every page
+        """
+        self.mock_api.events.return_value.list.return_value.execute.side_effect = [
+            {'items': [{'id': '1'}], 'nextPageToken': 'page2', 'defaultReminders': [{}]},
+            {'items': [{'id': '2'}], 'defaultReminders': [{}]}]
+
+        async def run():
+            async with AsyncCalendar(self.Calendar) as calendar:
+                return [event['id'] async for event in calendar.iter_events('2020-01-01T00:00:00Z',
+                                                                            '2021-01-01T00:00:00Z')]
+
+        self.assertEqual(['1', '2'], asyncio.run(run()))
+        self.assertRaises(ValueError, AsyncCalendar, self.Calendar, 0)
+
+
+class CalendarTestResponseCache(unittest.TestCase):
+    """
+    Test suite for caching event list responses
+    """
+    def setUp(self) -> None:
+        self.now = [0]
+        self.cache = ResponseCache(ttl=60, max_entries=2, clock=lambda: self.now[0])
+        self.mock_api = MagicMock()
+        self.mock_list = self.mock_api.events.return_value.list
+        self.mock_list.return_value.execute.return_value = {
+            'items': [{'id': '1', 'summary': 'Event', 'reminders': {'useDefault': True}}],
+            'defaultReminders': [{'method': 'popup', 'minutes': 10}]}
+        self.Calendar = Calendar(self.mock_api, cache=self.cache)
+
+    def test_ttl_and_lru(self):
+        """
+        Checks that entries expire, and the least recently used entry is evicted
+        """
+        self.cache.put('a', 1)
+        self.cache.put('b', 2)
+        self.assertEqual(1, self.cache.get('a'))
+        self.cache.put('c', 3)
+        self.assertEqual(None, self.cache.get('b'))
+        self.assertEqual(1, self.cache.get('a'))
+
+        self.now[0] = 60
+        self.assertEqual(None, self.cache.get('a'))
+        self.assertEqual(2, self.cache.hits)
+        self.assertEqual(2, self.cache.misses)
+        self.assertEqual(1, len(self.cache))
+
+    def test_repeated_windows_hit_cache(self):
+        """
+        Checks that repeated views of the same window are only requested once
+        """
+        first = self.Calendar.get_past_events()
+        first += self.Calendar.get_future_events()
+        second = self.Calendar.get_past_events()
+        second += self.Calendar.get_future_events()
+
+        self.assertEqual(2, self.mock_list.return_value.execute.call_count)
+        self.assertEqual(first, second)
+        self.assertEqual(1, len(self.Calendar.get_past_events()))
+        self.assertEqual((2, 3), (self.cache.misses, self.cache.hits))
+
+        # Reformatting reminders does not change the cached events
+        for event in self.Calendar.get_events_with_reminders(self.Calendar.get_past_events()):
+            self.assertEqual([self.Calendar.reminder_defaults], event['reminders'])
+        self.assertEqual({'useDefault': True}, self.Calendar.get_past_events()[0]['reminders'])
+
+    def test_delete_invalidates(self):
+        """
+        Checks that deleting an event drops the cached windows of its calendar only
+        """
+        self.cache.put(('other', 'min', 'max', True, 'startTime'), [])
+        self.Calendar.get_past_events()
+        self.Calendar.delete_events({'id': '1', 'summary': 'Event'})
+
+        self.Calendar.get_past_events()
+        self.assertEqual(2, self.mock_list.return_value.execute.call_count)
+        self.assertEqual([], self.cache.get(('other', 'min', 'max', True, 'startTime')))
+
+
+class CalendarTestLazyStartup(unittest.TestCase):
+    """
+    Test suite for deferring API work until it is needed
+    """
+    def setUp(self) -> None:
+        self.mock_api = MagicMock()
+        self.mock_api.calendarList.return_value.get.return_value.execute.return_value = {
+            'defaultReminders': [{'method': 'popup', 'minutes': 10}]}
+        self.mock_api.events.return_value.list.return_value.execute.return_value = {
+            'items': [], 'defaultReminders': [{'method': 'email', 'minutes': 30}]}
+
+    def test_lazy_api(self):
+        """
+        Checks that the API is built on first use, and only once
+        """
+        build_api = MagicMock(return_value=self.mock_api)
+        api = LazyCalendarApi(build_api)
+        build_api.assert_not_called()
+
+        api.events()
+        api.calendarList()
+        build_api.assert_called_once()
+        self.assertIs(self.mock_api, api.get_api())
+
+    def test_reminder_defaults_on_first_use(self):
+        """
+        Checks that a lazy calendar only requests its reminder defaults when they are needed
+        """
+        calendar = Calendar(self.mock_api, lazy=True)
+        self.mock_api.calendarList.assert_not_called()
+
+        self.assertEqual({'method': 'popup', 'minutes': 10}, calendar.reminder_defaults)
+        self.assertEqual({'method': 'popup', 'minutes': 10}, calendar.event_reminder_defaults)
+        self.assertEqual(1, self.mock_api.calendarList.return_value.get.call_count)
+
+    def test_reminder_defaults_from_events_list(self):
+        """
+        Checks that a lazy calendar takes its reminder defaults from the first events list
+        """
+        calendar = Calendar(self.mock_api, lazy=True)
+        calendar.get_future_events()
+
+        self.assertEqual({'method': 'email', 'minutes': 30}, calendar.reminder_defaults)
+        self.mock_api.calendarList.assert_not_called()
+
+
+class CalendarTestEventModel(unittest.TestCase):
+    """
+    Test suite for the compact event model
+    """
+    def test_from_api(self):
+        """
+        Checks that the times are parsed and the reminders resolved when an event is converted
+        """
+        event = Event.from_api({'id': '1', 'summary': 'Lecture', 'location': 'Clayton',
+                                'start': {'dateTime': '2020-10-13T11:30:00+05:30'},
+                                'end': {'dateTime': '2020-10-13T12:30:00+05:30'},
+                                'reminders': {'useDefault': False, 'overrides': [{'method': 'email', 'minutes': 20}]}})
+
+        self.assertEqual(datetime.datetime(2020, 10, 13, 6, 0, tzinfo=datetime.timezone.utc), event.start)
+        self.assertEqual(datetime.timedelta(hours=1), event.end - event.start)
+        self.assertEqual('2020-10-13T11:30:00+05:30', event.start_text)
+        self.assertFalse(event.all_day)
+        self.assertEqual('Clayton', event.location)
+        self.assertEqual((Reminder('email', 20),), event.reminders)
+
+    def test_default_reminders(self):
+        """
+        Checks that default reminders are resolved, and missing reminders left empty
+        """
+        default = {'method': 'popup', 'minutes': 10}
+        all_day = Event.from_api({'id': '1', 'start': {'date': '2020-10-13'}, 'reminders': {'useDefault': True}},
+                                 default)
+        self.assertTrue(all_day.all_day)
+        self.assertTrue(all_day.uses_default_reminders)
+        self.assertEqual((Reminder('popup', 10),), all_day.reminders)
+        self.assertEqual('', all_day.summary)
+
+        no_reminders = Event.from_api({'id': '2', 'start': {'date': '2020-10-13'},
+                                       'reminders': {'useDefault': False}}, [default])
+        self.assertEqual((), no_reminders.reminders)
+
+    def test_immutable(self):
+        """
+        Checks that events and reminders cannot be changed, or given new attributes
+        """
+        event = Event.from_api({'id': '1', 'start': {'date': '2020-10-13'}, 'reminders': {'useDefault': True}})
+        for target in [event, Reminder('popup', 10)]:
+            with self.subTest(target=target):
+                self.assertRaises(AttributeError, setattr, target, 'summary', 'Changed')
+                self.assertFalse(hasattr(target, '__dict__'))
+
+    def test_get_event_reminder_repeated(self):
+        """
+        Checks that reformatting an event's reminders twice gives the same result
+        """
+        calendar = Calendar(MagicMock())
+        event = {'id': '1', 'reminders': {'useDefault': False, 'overrides': [{'method': 'email', 'minutes': 20}]}}
+
+        first = calendar.get_event_reminder(event)
+        self.assertEqual(first, calendar.get_event_reminder(event))
+        self.assertEqual([first], calendar.get_events_with_reminders([event]))
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class CalendarTestEventTable(unittest.TestCase):
+    """
+    Test suite for the columnar event table
+    """
+    def setUp(self) -> None:
+        reminder = {'useDefault': False, 'overrides': [{'method': 'email', 'minutes': 30},
+                                                       {'method': 'popup', 'minutes': 5}]}
+        api_events = [
+            {'id': '1', 'start': {'date': '2020-10-01'}, 'end': {'date': '2020-10-02'},
+             'reminders': {'useDefault': True}},
+            {'id': '2', 'start': {'dateTime': '2020-10-06T10:00:00Z'}, 'end': {'dateTime': '2020-10-06T11:00:00Z'},
+             'reminders': reminder},
+            {'id': '3', 'start': {'dateTime': '2020-10-31T23:30:00Z'}, 'end': {'dateTime': '2020-11-01T00:30:00Z'},
+             'reminders': {'useDefault': False}},
+            {'id': '4', 'start': {'dateTime': '2020-11-02T09:00:00Z'}, 'end': {'dateTime': '2020-11-02T10:00:00Z'},
+             'reminders': {'useDefault': True}}]
+        events = [Event.from_api(event, {'method': 'popup', 'minutes': 15}) for event in api_events]
+        self.table = EventTable(events, ['uni', 'work', 'uni', 'work'])
+
+    def get_ids(self, mask):
+        return [event.id for event in self.table.to_events(mask)]
+
+    def test_columns(self):
+        """
+        Checks the columns built from the events
+        """
+        self.assertEqual(4, len(self.table))
+        self.assertEqual([True, False, False, False], self.table.all_day.tolist())
+        self.assertEqual([15, 5, EventTable.NO_REMINDER, 15], self.table.reminder_minutes.tolist())
+        self.assertEqual(['uni', 'work'], self.table.calendar_ids)
+
+    def test_range_masks(self):
+        """
+        Checks the overlapping and starting masks at the edges of a month
+        """
+        self.assertEqual(['1', '2', '3'], self.get_ids(self.table.starting_between('2020-10-01T00:00:00Z',
+                                                                                   '2020-11-01T00:00:00Z')))
+        self.assertEqual(['3', '4'], self.get_ids(self.table.overlapping('2020-11-01T00:00:00Z',
+                                                                         '2020-12-01T00:00:00Z')))
+
+    def test_reminder_and_calendar_masks(self):
+        """
+        Checks the reminder and calendar masks, and combining masks
+        """
+        self.assertEqual(['1', '2', '4'], self.get_ids(self.table.with_reminder_under(16)))
+        self.assertEqual(['2'], self.get_ids(self.table.with_reminder_under(10)))
+        self.assertEqual(['4'], self.get_ids(self.table.with_reminder_under(16) & self.table.from_calendar('work')
+                                             & ~self.table.with_reminder_under(10)))
+        self.assertEqual([], self.get_ids(self.table.from_calendar('other')))
+
+    def test_events_per_week(self):
+        """
+        Checks counting the events in each week
+        """
+        start = datetime.datetime(2020, 10, 1, tzinfo=datetime.timezone.utc)
+        counts, week_starts = self.table.events_per_week(start, start + datetime.timedelta(weeks=5))
+        self.assertEqual([2, 0, 0, 0, 2], counts.tolist())
+        self.assertEqual(start.timestamp(), week_starts[0])
+
+        counts, week_starts = self.table.events_per_week(start, start + datetime.timedelta(weeks=5),
+                                                         mask=self.table.from_calendar('uni'))
+        self.assertEqual([1, 0, 0, 0, 1], counts.tolist())
+
+
+class CalendarTestEventFormatter(unittest.TestCase):
+    """
+    Test suite for streaming events to an output
+    """
+    def setUp(self) -> None:
+        self.events = [
+            Event.from_api({'id': '1', 'summary': 'Lecture', 'start': {'dateTime': '2020-10-13T11:30:00+05:30'},
+                            'end': {'dateTime': '2020-10-13T12:30:00+05:30'},
+                            'reminders': {'useDefault': False, 'overrides': [{'method': 'email', 'minutes': 20},
+                                                                             {'method': 'popup', 'minutes': 10}]}}),
+            Event.from_api({'id': '2', 'summary': 'Holiday, all day', 'start': {'date': '2020-11-13'},
+                            'end': {'date': '2020-11-14'}, 'reminders': {'useDefault': False}})]
+        self.stream = io.StringIO()
+
+    def test_text(self):
+        """
+        Checks that text output is numbered in the same way as the printed results
+        """
+        formatter = EventFormatter(self.stream)
+        self.assertEqual(2, formatter.write_events(self.events))
+        formatter.write_result('Nothing else')
+        self.assertEqual('1 Event:Lecture at 2020-10-13T11:30:00+05:30\n'
+                         'Reminder in 20 minutes before event as email\n'
+                         'Reminder in 10 minutes before event as popup\n'
+                         '2 Event:Holiday, all day at 2020-11-13\n'
+                         '3 Nothing else\n', self.stream.getvalue())
+
+    def test_json_lines(self):
+        """
+        Checks that each event is written as one JSON object per line
+        """
+        formatter = EventFormatter(self.stream, EventFormatter.JSON_LINES)
+        formatter.write_events(self.events)
+
+        lines = [json.loads(line) for line in self.stream.getvalue().splitlines()]
+        self.assertEqual(['1', '2'], [line['id'] for line in lines])
+        self.assertEqual([{'method': 'email', 'minutes': 20}, {'method': 'popup', 'minutes': 10}],
+                         lines[0]['reminders'])
+        self.assertEqual('2020-11-14', lines[1]['end'])
+        self.assertTrue(lines[1]['all_day'])
+        self.assertRaises(ValueError, formatter.write_result, 'Nothing else')
+
+    def test_csv(self):
+        """
+        Checks that events are written as CSV rows below a header
+        """
+        EventFormatter(self.stream, EventFormatter.CSV).write_events(self.events)
+
+        lines = self.stream.getvalue().splitlines()
+        self.assertEqual(','.join(EventFormatter.CSV_COLUMNS), lines[0])
+        self.assertEqual(3, len(lines))
+        self.assertIn('"Holiday, all day"', lines[2])
+        self.assertRaises(ValueError, EventFormatter, self.stream, 'xml')
+
+    def test_past_and_future_streamed(self):
+        """
+        Checks that past and future events are written a page at a time, or from the cache if it holds them
+        """
+        api = FakeCalendarApi(3000)
+        calendar = Calendar(api, executor=RequestExecutor(rate=None), lazy=True, cache=ResponseCache())
+        events = calendar.iter_past_events()
+        first = next(events)
+        # Only the first page, and the page requested in the background, have been fetched
+        self.assertLessEqual(api.requests, 2)
+        self.assertEqual([first.id] + [event.id for event in events],
+                         [event['id'] for event in calendar.get_past_events(fields=Calendar.FIELDS_INDEX)])
+
+        requests = api.requests
+        formatter = EventFormatter(self.stream, EventFormatter.JSON_LINES)
+        self.assertEqual(len(calendar.get_past_events(fields=Calendar.FIELDS_INDEX)),
+                         formatter.write_events(calendar.iter_past_events()))
+        self.assertEqual(requests, api.requests)
+        self.assertRaises(ValueError, calendar.iter_future_events, -1)
+
+    def test_export_events(self):
+        """
+        Checks that exporting writes the events of every page of a single window
+        """
+        mock_api = MagicMock()
+        mock_api.events.return_value.list.return_value.execute.side_effect = [
+            {'items': [{'id': '1', 'summary': 'One', 'start': {'date': '2020-10-13'},
+                        'reminders': {'useDefault': False}}],
+             'nextPageToken': 'page2', 'defaultReminders': [{}]},
+            {'items': [{'id': '2', 'summary': 'Two', 'start': {'date': '2020-10-14'},
+                        'reminders': {'useDefault': False}}],
+             'defaultReminders': [{}]}]
+        calendar = Calendar(mock_api)
+
+        written = calendar.export_events(EventFormatter(self.stream, EventFormatter.JSON_LINES), 1, 1)
+        self.assertEqual(2, written)
+        self.assertEqual(2, len(self.stream.getvalue().splitlines()))
+        self.assertEqual(2, mock_api.events.return_value.list.call_count)
+        self.assertRaises(ValueError, calendar.export_events, EventFormatter(self.stream), -1)
+
+
+class CalendarTestBatchQueries(unittest.TestCase):
+    """
+    Test suite for running many command line queries against one calendar
+    """
+    def setUp(self) -> None:
+        self.mock_api = MagicMock()
+        self.Calendar = Calendar(self.mock_api)
+        past_events = [{'id': '1', 'summary': 'FIT2107 Lecture', 'start': {'date': '2020-10-13'},
+                        'reminders': {'useDefault': False}}]
+        future_events = [{'id': '2', 'summary': 'FIT2107 Exam', 'start': {'dateTime': '2021-06-01T09:00:00+10:00'},
+                          'reminders': {'useDefault': False}}]
+        self.Calendar._get_events_from_year = MagicMock(
+            side_effect=lambda years, fields=None: list(past_events if years < 0 else future_events))
+        # The past and future commands stream their window a page at a time
+        last_year = CalendarModule.get_date_iso(datetime.datetime.utcnow() - datetime.timedelta(days=1))
+        self.Calendar.iter_events = MagicMock(
+            side_effect=lambda time_min, *args, **kwargs: iter(past_events if time_min < last_year else future_events))
+        self.stream = io.StringIO()
+
+    def run_batch(self, lines, mode=EventFormatter.JSON_LINES):
+        with patch('sys.stderr', new=io.StringIO()):
+            errors = CalendarModule.run_batch(self.Calendar, lines, EventFormatter(self.stream, mode))
+        return errors, [json.loads(line) for line in self.stream.getvalue().splitlines()] \
+            if mode == EventFormatter.JSON_LINES else self.stream.getvalue()
+
+    def test_queries_share_one_fetch(self):
+        """
+        Checks that every query is answered, with the events fetched only once
+        """
+        errors, records = self.run_batch(['# comment', 'search fit2107', '', 'navigate 2020-10',
+                                          'search "lecture exam" --any', 'future --years 1'])
+
+        self.assertEqual(0, errors)
+        self.assertEqual([('search fit2107', '1'), ('search fit2107', '2'), ('navigate 2020-10', '1'),
+                          ('search "lecture exam" --any', '1'), ('search "lecture exam" --any', '2'),
+                          ('future --years 1', '2')],
+                         [(record['query'], record['id']) for record in records])
+        self.assertEqual([-5, 2], [call[0][0] for call in self.Calendar._get_events_from_year.call_args_list])
+        self.assertEqual(Calendar.FIELDS_INDEX, self.Calendar.iter_events.call_args[1]['fields'])
+
+    def test_delete_and_errors(self):
+        """
+        Checks that deletes report each event, and invalid queries are reported without stopping the batch
+        """
+        self.Calendar.delete_events_bulk = MagicMock(return_value={'deleted': ['1'], 'failed': {'2': 'Not Found'},
+                                                                   'retries': 0})
+        errors, records = self.run_batch(['delete 1 2', 'unknown', 'future --years -1', 'search fit2107'])
+
+        self.assertEqual(2, errors)
+        self.assertEqual({'id': '1', 'status': 'deleted', 'query': 'delete 1 2'}, records[0])
+        self.assertEqual('failed: Not Found', records[1]['status'])
+        self.assertEqual(['error: invalid command', 'error: Year Input cannot be negative'],
+                         [record['status'] for record in records[2:4]])
+        self.assertEqual(['1', '2'], [record['id'] for record in records[4:]])
+
+    def test_api_errors_isolated(self):
+        """
+        Checks that a query failing at the API or the connection is reported, and the batch carries on
+        """
+        self.Calendar.get_event_details = MagicMock(side_effect=http_error(404))
+        self.Calendar.delete_events_bulk = MagicMock(side_effect=socket.timeout('timed out'))
+        errors, records = self.run_batch(['show missing', 'delete 1', 'past --years 1'])
+
+        self.assertEqual(2, errors)
+        self.assertTrue(records[0]['status'].startswith('error: <HttpError 404'))
+        self.assertEqual('error: timed out', records[1]['status'])
+        self.assertEqual([('past --years 1', '1')], [(record['query'], record['id']) for record in records[2:]])
+
+    def test_text_output(self):
+        """
+        Checks that text output heads each query and numbers its results
+        """
+        errors, output = self.run_batch(['navigate 2020', 'navigate 2021'], EventFormatter.TEXT)
+        self.assertEqual('> navigate 2020\n1 Event:FIT2107 Lecture at 2020-10-13\n'
+                         '> navigate 2021\n1 Event:FIT2107 Exam at 2021-06-01T09:00:00+10:00\n', output)
+
+
+class ScriptedRequest:
+    """
+    Stands in for an API request, raising each scripted error in turn before returning the response
+    """
+    def __init__(self, errors, response=None):
+        self.errors = list(errors)
+        self.response = response
+        self.calls = 0
+
+    def execute(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.response
+
+
+class CalendarTestRequestExecutor(unittest.TestCase):
+    """
+    Test suite for rate limiting and retrying requests
+    """
+    def setUp(self) -> None:
+        self.now = [0.0]
+        self.waits = []
+
+        def sleep(seconds):
+            self.waits.append(seconds)
+            self.now[0] += seconds
+
+        self.executor = RequestExecutor(rate=2, burst=2, max_retries=3, backoff=1, clock=lambda: self.now[0],
+                                        sleep=sleep, jitter=lambda: 0.5)
+
+    def test_token_bucket(self):
+        """
+        Checks that requests past the burst wait for the bucket to refill
+        """
+        for _ in range(4):
+            self.executor.execute(ScriptedRequest([]))
+        self.assertEqual([0.5, 0.5], self.waits)
+
+        self.now[0] += 10
+        self.executor.execute(ScriptedRequest([]), cost=3)
+        self.assertEqual([0.5, 0.5, 0.5], self.waits)
+        self.assertEqual({'requests': 7, 'retries': 0, 'throttled_seconds': 1.5}, self.executor.stats())
+
+    def test_backoff_and_retry_after(self):
+        """
+        Checks that transient errors are retried with growing waits, or the wait the server asks for
+        """
+        retry_after = HttpError(Mock(status=429, reason='Too Many Requests', get=lambda header: '7'), b'')
+        request = ScriptedRequest([http_error(503), http_error(500), retry_after], response={'ok': True})
+
+        self.assertEqual({'ok': True}, self.executor.execute(request))
+        self.assertEqual(4, request.calls)
+        self.assertEqual([0.75, 1.5, 7], [wait for wait in self.waits if wait > 0.5])
+        self.assertEqual(3, self.executor.stats()['retries'])
+
+    def test_errors_raised(self):
+        """
+        Checks that permanent errors are raised at once, and transient errors once the retries run out
+        """
+        request = ScriptedRequest([http_error(404)])
+        self.assertRaises(HttpError, self.executor.execute, request)
+        self.assertEqual(1, request.calls)
+
+        request = ScriptedRequest([http_error(503)] * 5)
+        self.assertRaises(HttpError, self.executor.execute, request)
+        self.assertEqual(4, request.calls)
+
+    def test_transport_errors(self):
+        """
+        Checks that transport errors are retried, and any other error is raised at once without waiting
+        """
+        request = ScriptedRequest([socket.timeout(), ConnectionResetError(), httplib2.ServerNotFoundError()],
+                                  response={'ok': True})
+        self.assertEqual({'ok': True}, self.executor.execute(request))
+        self.assertEqual(3, self.executor.stats()['retries'])
+
+        self.waits.clear()
+        for error in [KeyError('items'), TypeError(), AttributeError()]:
+            with self.subTest(error=error):
+                request = ScriptedRequest([error])
+                self.assertRaises(type(error), self.executor.execute, request)
+                self.assertEqual(1, request.calls)
+        self.assertEqual(3, self.executor.stats()['retries'])
+        self.assertEqual([], [wait for wait in self.waits if wait > 0.5])
+
+    def test_calendar_requests_go_through_executor(self):
+        """
+        Checks that the calendar makes its requests through its executor
+        """
+        mock_api = MagicMock()
+        mock_api.events.return_value.list.return_value.execute.side_effect = [
+            http_error(503), {'items': [{'id': '1'}], 'defaultReminders': [{}]}]
+        calendar = Calendar(mock_api, executor=self.executor)
+
+        self.assertEqual([{'id': '1'}], calendar.get_future_events())
+        self.assertEqual(1, self.executor.stats()['retries'])
+        self.assertEqual(3, self.executor.stats()['requests'])
+
+
+class CalendarTestInstrumentation(unittest.TestCase):
+    """
+    Test suite for recording the timings and counters of calendar operations
+    """
+    def setUp(self) -> None:
+        self.now = [0.0]
+        self.sink = MemorySink()
+        self.instrumentation = Instrumentation(self.sink, clock=lambda: self.now[0])
+        self.mock_api = MagicMock()
+        self.mock_list = self.mock_api.events.return_value.list
+        self.mock_list.return_value.execute.return_value = {
+            'items': [{'id': '1', 'summary': 'Lecture', 'start': {'dateTime': '2020-08-03T10:00:00+10:00'},
+                       'reminders': {'useDefault': True}}],
+            'defaultReminders': [{'method': 'popup', 'minutes': 10}]}
+        self.Calendar = Calendar(self.mock_api, lazy=True, cache=ResponseCache(),
+                                 instrumentation=self.instrumentation)
+
+    def test_spans(self):
+        """
+        Checks that spans record their count, total and maximum, even when the block raises
+        """
+        with self.instrumentation.span('operation'):
+            self.now[0] += 2
+        with self.assertRaises(ValueError):
+            with self.instrumentation.span('operation'):
+                self.now[0] += 1
+                raise ValueError
+        self.assertEqual({'count': 2, 'total': 3.0, 'mean': 1.5, 'max': 2.0},
+                         self.sink.stats()['timings']['operation'])
+
+    def test_disabled(self):
+        """
+        Checks that nothing is recorded while disabled
+        """
+        self.instrumentation.enabled = False
+        with self.instrumentation.span('operation'):
+            self.instrumentation.count('calls')
+        self.assertEqual({'timings': {}, 'counters': {}}, self.sink.stats())
+
+    def test_calendar_operations(self):
+        """
+        Checks that searching records the API calls, events, cache hits and timings
+        """
+        self.Calendar.search_events('lecture')
+        self.Calendar.get_past_events(fields=Calendar.FIELDS_INDEX)
+
+        stats = self.sink.stats()
+        self.assertEqual(2, stats['counters']['api_calls'])
+        self.assertEqual(2, stats['counters']['events_received'])
+        self.assertEqual(2, stats['counters']['cache_misses'])
+        self.assertEqual(1, stats['counters']['cache_hits'])
+        for name in ['search_events', 'keyword_search', 'build_keyword_index', 'fetch_window', 'api_request',
+                     'get_past_events', 'to_events']:
+            self.assertIn(name, stats['timings'])
+
+    def test_retries_counted(self):
+        """
+        Checks that failed requests and their retries are counted
+        """
+        executor = RequestExecutor(rate=None, sleep=lambda seconds: None, instrumentation=self.instrumentation)
+        executor.execute(ScriptedRequest([http_error(503)], response={'ok': True}))
+        self.assertEqual({'api_calls': 2, 'api_errors': 1, 'api_retries': 1},
+                         self.sink.stats()['counters'])
+
+    def test_logging_sink(self):
+        """
+        Checks that the logging sink logs each timing and counter
+        """
+        instrumentation = Instrumentation(LoggingSink(), clock=lambda: self.now[0])
+        with self.assertLogs('Calendar', level='DEBUG') as logs:
+            with instrumentation.span('operation'):
+                instrumentation.count('calls', 3)
+        self.assertEqual(['DEBUG:Calendar:calls +3', 'DEBUG:Calendar:operation took 0.000 ms'], logs.output)
+
+    def test_prometheus_sink(self):
+        """
+        Checks that the Prometheus sink writes a summary of the timings, and a counter for each counter
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            sink = PrometheusSink(directory + '/calendar.prom')
+            sink.record_timing('search_events', 0.5)
+            sink.add('api_calls', 2)
+            sink.write()
+            with open(sink.path) as metrics_file:
+                self.assertEqual('# TYPE calendar_operation_seconds summary\n'
+                                 'calendar_operation_seconds_sum{operation="search_events"} 0.5\n'
+                                 'calendar_operation_seconds_count{operation="search_events"} 1\n'
+                                 '# TYPE calendar_api_calls_total counter\n'
+                                 'calendar_api_calls_total 2\n', metrics_file.read())
+
+
+class CalendarTestShardedFetch(unittest.TestCase):
+    """
+    Test suite for fetching a window as shards requested concurrently
+    """
+    def setUp(self) -> None:
+        self.api = FakeCalendarApi(3000)
+        self.calendar = Calendar(self.api, executor=RequestExecutor(rate=None))
+
+    def test_sharded_fetch(self):
+        """
+        Checks that fetching shards concurrently returns the same events, in the same order, as paging in order
+        """
+        sharded = Calendar(self.api, executor=RequestExecutor(rate=None), shard_workers=4)
+        self.assertEqual(self.calendar.get_past_events(), sharded.get_past_events())
+        self.assertEqual(self.calendar.get_future_events(), sharded.get_future_events())
+
+    def test_sparse_window_not_split(self):
+        """
+        Checks that a window fitting in one page is fetched with a single request
+        """
+        sparse = FakeCalendarApi(100, start=self.api.start)
+        sharded = Calendar(sparse, executor=RequestExecutor(rate=None), shard_workers=8, lazy=True)
+        self.assertEqual(100, len({event['id'] for event in sharded.get_past_events() + sharded.get_future_events()}))
+        self.assertEqual(2, sparse.requests)
+
+    def test_dense_shards_split(self):
+        """
+        Checks that shards holding more than a page are split again, or paged through when they cannot be
+        """
+        sharded = Calendar(self.api, executor=RequestExecutor(rate=None), shard_workers=4)
+        time_min, time_max = self.calendar._get_year_window(-5)
+        expected = list(self.calendar.iter_events(time_min, time_max))
+
+        requests = self.api.requests
+        self.assertEqual(expected, sharded._get_sharded_events(time_min, time_max, page_size=20))
+        self.assertGreater(self.api.requests - requests, len(expected) // 20)
+
+        dense = FakeCalendarApi(500, start=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+        dense.spacing = datetime.timedelta(minutes=1)
+        dense_calendar = Calendar(dense, executor=RequestExecutor(rate=None), shard_workers=4)
+        time_min, time_max = '2019-12-01T00:00:00Z', '2020-03-01T00:00:00Z'
+        self.assertEqual(list(dense_calendar.iter_events(time_min, time_max)),
+                         dense_calendar._get_sharded_events(time_min, time_max, page_size=50))
+
+
+class CalendarTestPartialResponses(unittest.TestCase):
+    """
+    Test suite for requesting only the fields of events an operation uses
+    """
+    def setUp(self) -> None:
+        self.mock_api = MagicMock()
+        self.mock_list = self.mock_api.events.return_value.list
+        self.mock_list.return_value.execute.return_value = {
+            'items': [{'id': '1', 'summary': 'Lecture', 'start': {'dateTime': '2020-08-03T10:00:00+10:00'},
+                       'reminders': {'useDefault': True}}],
+            'defaultReminders': [{'method': 'popup', 'minutes': 10}]}
+        self.Calendar = Calendar(self.mock_api, cache=ResponseCache())
+
+    def test_projections(self):
+        """
+        Checks that search asks for the fields it indexes, and that whole events are fetched by default
+        """
+        self.Calendar.search_events('lecture')
+        self.assertEqual([Calendar.FIELDS_INDEX, Calendar.FIELDS_INDEX],
+                         [call[1]['fields'] for call in self.mock_list.call_args_list])
+
+        self.Calendar.get_past_events()
+        self.assertNotIn('fields', self.mock_list.call_args[1])
+        self.assertEqual(3, self.mock_list.call_count)
+
+        # Each projection is cached separately
+        self.Calendar.get_past_events(fields=Calendar.FIELDS_INDEX)
+        self.Calendar.get_past_events()
+        self.assertEqual(3, self.mock_list.call_count)
+
+    def test_event_details(self):
+        """
+        Checks that the whole of a single event can be fetched
+        """
+        mock_get = self.mock_api.events.return_value.get
+        mock_get.return_value.execute.return_value = {'id': '1', 'description': 'Details'}
+        self.assertEqual({'id': '1', 'description': 'Details'}, self.Calendar.get_event_details('1'))
+        mock_get.assert_called_once_with(calendarId='primary', eventId='1')
+
+    def test_smaller_payloads(self):
+        """
+        Checks that a partial response of the generated calendar is a fraction of the whole
+        """
+        api = FakeCalendarApi(1000)
+        whole = api.list_events('primary')
+        self.assertEqual(project(whole, Calendar.FIELDS_INDEX),
+                         api.list_events('primary', fields=Calendar.FIELDS_INDEX))
+        self.assertLess(3 * len(json.dumps(project(whole, Calendar.FIELDS_SUMMARY))), len(json.dumps(whole)))
+        self.assertNotIn('attendees', project(whole, Calendar.FIELDS_INDEX)['items'][0])
+
+
+class CalendarTestRecurringEvents(unittest.TestCase):
+    """
+    Test suite for expanding recurring events locally from their recurrence rules
+    """
+    def setUp(self) -> None:
+        self.weekly = {'id': 'weekly', 'summary': 'FIT2107 Lecture', 'reminders': {'useDefault': True},
+                       'start': {'dateTime': '2020-03-02T10:00:00+11:00', 'timeZone': 'Australia/Melbourne'},
+                       'end': {'dateTime': '2020-03-02T11:00:00+11:00', 'timeZone': 'Australia/Melbourne'},
+                       'recurrence': ['RRULE:FREQ=WEEKLY;UNTIL=20200430T000000Z',
+                                      'EXDATE;TZID=Australia/Melbourne:20200316T100000']}
+        self.cancelled = {'id': 'weekly_20200322T230000Z', 'status': 'cancelled', 'recurringEventId': 'weekly',
+                          'originalStartTime': {'dateTime': '2020-03-23T10:00:00+11:00'}}
+        self.moved = {'id': 'weekly_20200413T000000Z', 'summary': 'FIT2107 Lecture (moved)', 'status': 'confirmed',
+                      'recurringEventId': 'weekly', 'reminders': {'useDefault': True},
+                      'originalStartTime': {'dateTime': '2020-04-13T10:00:00+10:00'},
+                      'start': {'dateTime': '2020-04-14T10:00:00+10:00'},
+                      'end': {'dateTime': '2020-04-14T11:00:00+10:00'}}
+        self.single = {'id': 'exam', 'summary': 'FIT2107 Exam', 'reminders': {'useDefault': True},
+                       'start': {'dateTime': '2020-04-01T09:00:00+11:00'},
+                       'end': {'dateTime': '2020-04-01T11:00:00+11:00'}}
+
+        self.mock_api = MagicMock()
+        self.mock_list = self.mock_api.events.return_value.list
+        self.mock_list.return_value.execute.return_value = {
+            'items': [self.weekly, self.single, self.cancelled, self.moved],
+            'defaultReminders': [{'method': 'popup', 'minutes': 10}]}
+        self.Calendar = Calendar(self.mock_api, expand_recurring=True)
+
+    def test_expansion(self):
+        """
+        Checks that instances keep their wall clock time, and exdates and cancelled instances are left out
+        """
+        window_start = CalendarModule.parse_iso_time('2020-03-01T00:00:00Z')
+        window_end = CalendarModule.parse_iso_time('2020-12-01T00:00:00Z')
+        instances = list(CalendarModule.expand_recurring_event(self.weekly, window_start, window_end))
+
+        self.assertEqual(['2020-03-02T10:00:00+11:00', '2020-03-09T10:00:00+11:00', '2020-03-23T10:00:00+11:00',
+                          '2020-03-30T10:00:00+11:00', '2020-04-06T10:00:00+10:00', '2020-04-13T10:00:00+10:00',
+                          '2020-04-20T10:00:00+10:00', '2020-04-27T10:00:00+10:00'],
+                         [instance['start']['dateTime'] for instance in instances])
+        self.assertEqual('weekly_20200301T230000Z', instances[0]['id'])
+        self.assertEqual('weekly', instances[0]['recurringEventId'])
+        self.assertNotIn('recurrence', instances[0])
+
+        # Only the instances within the window are expanded
+        window_start = CalendarModule.parse_iso_time('2020-04-06T00:30:00Z')
+        window_end = CalendarModule.parse_iso_time('2020-04-20T00:00:00Z')
+        self.assertEqual(['weekly_20200406T000000Z', 'weekly_20200413T000000Z'],
+                         [instance['id'] for instance in
+                          CalendarModule.expand_recurring_event(self.weekly, window_start, window_end)])
+
+    def test_without_time_zone(self):
+        """
+        Checks that instances of an event without a timezone keep its offset, rather than the machine's timezone
+        """
+        del self.weekly['start']['timeZone'], self.weekly['end']['timeZone']
+        window_start = CalendarModule.parse_iso_time('2020-03-01T00:00:00Z')
+        window_end = CalendarModule.parse_iso_time('2020-03-10T00:00:00Z')
+        with patch.object(CalendarModule.tz, 'gettz', return_value=CalendarModule.tz.UTC):
+            instances = list(CalendarModule.expand_recurring_event(self.weekly, window_start, window_end))
+
+        self.assertEqual(['2020-03-02T10:00:00+11:00', '2020-03-09T10:00:00+11:00'],
+                         [instance['start']['dateTime'] for instance in instances])
+        self.assertEqual('weekly_20200301T230000Z', instances[0]['id'])
+
+    def test_all_day_until_and_exdate(self):
+        """
+        Checks that all day events include the day of a date UNTIL, and leave out date EXDATEs
+        """
+        yearly = {'id': 'birthday', 'start': {'date': '2020-01-01'}, 'end': {'date': '2020-01-02'},
+                  'recurrence': ['RRULE:FREQ=YEARLY;UNTIL=20230101', 'EXDATE;VALUE=DATE:20210101']}
+        window_start = CalendarModule.parse_iso_time('2019-06-01T00:00:00Z')
+        window_end = CalendarModule.parse_iso_time('2030-01-01T00:00:00Z')
+        self.assertEqual(['2020-01-01', '2022-01-01', '2023-01-01'],
+                         [instance['start']['date'] for instance in
+                          CalendarModule.expand_recurring_event(yearly, window_start, window_end)])
+
+    def test_window_events(self):
+        """
+        Checks that recurring events are requested once, and their instances merged in order with the other events
+        """
+        events = self.Calendar._get_expanded_events('2020-03-01T00:00:00Z', '2020-12-01T00:00:00Z',
+                                                    Calendar.FIELDS_INDEX)
+
+        kwargs = self.mock_list.call_args[1]
+        self.assertFalse(kwargs['singleEvents'])
+        self.assertNotIn('orderBy', kwargs)
+        self.assertIn('recurrence', kwargs['fields'])
+        self.assertEqual(['2020-03-02', '2020-03-09', '2020-03-30', '2020-04-01', '2020-04-06', '2020-04-14',
+                          '2020-04-20', '2020-04-27'],
+                         [event['start']['dateTime'][:10] for event in events])
+        self.assertEqual('FIT2107 Lecture (moved)', events[5]['summary'])
+
+    def test_search_expanded(self):
+        """
+        Checks that search finds the expanded instances
+        """
+        response = self.mock_list.return_value.execute.return_value
+        self.mock_list.return_value.execute.return_value = None
+        self.mock_list.side_effect = lambda timeMin, **kwargs: Mock(execute=lambda: response if timeMin < '2021' else
+                                                                   dict(response, items=[]))
+        self.Calendar._get_year_window = lambda years: (('2020-03-01T00:00:00Z', '2020-12-01T00:00:00Z') if years < 0
+                                                        else ('2020-12-01T00:00:00Z', '2022-12-01T00:00:00Z'))
+        self.assertEqual(7, len(self.Calendar.find_events('lecture')))
+        self.assertEqual(1, len(self.Calendar.find_events('moved')))
+
+
+class CalendarTestReminderScheduler(unittest.TestCase):
+    """
+    Test suite for firing the reminders of events at their time
+    """
+    def setUp(self) -> None:
+        self.now = [CalendarModule.parse_iso_time('2020-08-03T09:00:00Z').timestamp()]
+        self.fired = []
+        self.scheduler = ReminderScheduler(lambda event, reminder, fire_time: self.fired.append((event.id, fire_time)),
+                                           clock=lambda: self.now[0])
+        self.lecture = self.make_event('lecture', '2020-08-03T10:00:00Z', 10, 30)
+        self.exam = self.make_event('exam', '2020-08-03T09:30:00Z', 5)
+
+    @staticmethod
+    def make_event(event_id, start, *minutes):
+        return Event(event_id, event_id.title(), CalendarModule.parse_iso_time(start),
+                     reminders=[Reminder('popup', minute) for minute in minutes])
+
+    def test_due_in_order(self):
+        """
+        Checks that reminders come due in order of their fire time, and past reminders are not scheduled
+        """
+        self.scheduler.add_events([self.lecture, self.exam, self.make_event('past', '2020-08-03T08:00:00Z', 5)])
+        self.assertEqual(3, len(self.scheduler))
+        self.assertEqual(self.now[0] + 25 * 60, self.scheduler.next_fire_time())
+
+        self.assertEqual([], self.scheduler.due())
+        due = self.scheduler.due(self.now[0] + 50 * 60)
+        self.assertEqual([('exam', 5), ('lecture', 30), ('lecture', 10)],
+                         [(event.id, reminder.minutes) for fire_time, event, reminder in due])
+        self.assertEqual(0, len(self.scheduler))
+        self.assertEqual(None, self.scheduler.next_fire_time())
+
+    def test_update_and_remove(self):
+        """
+        Checks that updating an event replaces its reminders, and removing it cancels them
+        """
+        self.scheduler.add_events([self.lecture, self.exam])
+        self.scheduler.update_event(self.make_event('lecture', '2020-08-03T11:00:00Z', 10))
+        self.scheduler.remove_event('exam')
+        self.assertEqual(1, len(self.scheduler))
+
+        self.now[0] += 2 * 60 * 60
+        self.assertEqual(1, self.scheduler.fire_due())
+        self.assertEqual([('lecture', CalendarModule.parse_iso_time('2020-08-03T10:50:00Z').timestamp())], self.fired)
+
+    def test_stale_entries_compacted(self):
+        """
+        Checks that repeatedly updating events does not grow the heap without bound
+        """
+        for _ in range(1000):
+            self.scheduler.update_event(self.lecture)
+        self.assertEqual(2, len(self.scheduler))
+        self.assertLess(len(self.scheduler._heap), 100)
+
+    def test_finished_events_forgotten(self):
+        """
+        Checks that events with no reminders left to fire are not kept, and removed events can be added again
+        """
+        past = self.make_event('past', '2020-08-03T08:00:00Z', 5)
+        self.scheduler.add_events([past, self.lecture])
+        self.scheduler.remove_event('lecture')
+        self.assertEqual(({}, {}, {}), (self.scheduler._events, self.scheduler._versions, self.scheduler._pending))
+
+        self.scheduler.add_event(self.lecture)
+        self.assertEqual(2, self.scheduler.fire_due(self.now[0] + 60 * 60))
+        self.assertEqual(({}, {}, {}), (self.scheduler._events, self.scheduler._versions, self.scheduler._pending))
+
+    def test_failing_callback(self):
+        """
+        Checks that a callback raising an error is logged, and the reminders after it still fire
+        """
+        def callback(event, reminder, fire_time):
+            self.fired.append(event.id)
+            if event.id == 'exam':
+                raise RuntimeError('notification failed')
+
+        scheduler = ReminderScheduler(callback, clock=lambda: self.now[0])
+        scheduler.add_events([self.lecture, self.exam])
+        with self.assertLogs('Calendar', level='ERROR') as logs:
+            self.assertEqual(3, scheduler.fire_due(self.now[0] + 60 * 60))
+        self.assertEqual(['exam', 'lecture', 'lecture'], self.fired)
+        self.assertIn('Reminder callback failed for event exam', logs.output[0])
+
+    def test_background_thread(self):
+        """
+        Checks that the background thread fires a reminder added while it is waiting
+        """
+        fired = threading.Event()
+        scheduler = ReminderScheduler(lambda event, reminder, fire_time: fired.set())
+        scheduler.start()
+        try:
+            soon = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(milliseconds=50)
+            scheduler.add_event(Event('soon', 'Soon', soon, reminders=[Reminder('popup', 0)]))
+            self.assertTrue(fired.wait(5))
+        finally:
+            scheduler.stop()
+
+    def test_calendar_schedules_reminders(self):
+        """
+        Checks that the calendar schedules its future events, and cancels the reminders of deleted events
+        """
+        start = (datetime.datetime.utcnow() + datetime.timedelta(days=1)).isoformat() + 'Z'
+        mock_api = MagicMock()
+        mock_api.events.return_value.list.return_value.execute.return_value = {
+            'items': [{'id': '1', 'summary': 'Lecture', 'start': {'dateTime': start}, 'end': {'dateTime': start},
+                       'reminders': {'useDefault': True}}],
+            'defaultReminders': [{'method': 'popup', 'minutes': 10}]}
+        calendar = Calendar(mock_api, lazy=True)
+        scheduler = calendar.schedule_reminders(lambda event, reminder, fire_time: None)
+        try:
+            self.assertEqual(1, len(scheduler))
+            with patch('builtins.print'):
+                calendar.delete_events({'id': '1', 'summary': 'Lecture'})
+            self.assertEqual(0, len(scheduler))
+        finally:
+            scheduler.stop()
+
+
+class CalendarTestIntervalIndex(unittest.TestCase):
+    """
+    Test suite for overlap, conflict and free slot queries over the time events take
+    """
+    def setUp(self) -> None:
+        self.day = datetime.datetime(2020, 8, 3, tzinfo=datetime.timezone.utc)
+        events = [Event.from_api({'id': 'holiday', 'start': {'date': '2020-08-04'}, 'end': {'date': '2020-08-05'}})]
+        for number, (hour, hours) in enumerate([(9, 2), (10, 1), (13, 1.5), (14, 1), (16, 0.5), (0, 40)]):
+            start = self.day + datetime.timedelta(hours=hour)
+            events.append(Event(str(number), 'Event ' + str(number), start, start + datetime.timedelta(hours=hours)))
+        self.events = events
+        self.index = IntervalIndex(events)
+
+    def at(self, hours):
+        return self.day + datetime.timedelta(hours=hours)
+
+    def test_overlapping(self):
+        """
+        Checks that every event overlapping a range is found, matching a scan of every event
+        """
+        self.assertEqual(['5', '2', '3'], [event.id for event in self.index.overlapping(self.at(14), self.at(15.5))])
+        self.assertEqual(['5', '0'], [event.id for event in self.index.overlapping(self.at(9), self.at(10))])
+        self.assertEqual(['5', 'holiday'], [event.id for event in self.index.overlapping(self.at(30), self.at(31))])
+        self.assertEqual([], self.index.overlapping(self.at(50), self.at(60)))
+
+        for start in range(0, 48):
+            for length in (0.5, 1, 3):
+                expected = {event.id for event in self.events
+                            if event.start < self.at(start + length) and event.end > self.at(start)}
+                found = self.index.overlapping(self.at(start), self.at(start + length))
+                self.assertEqual(expected, {event.id for event in found})
+
+    def test_conflicts(self):
+        """
+        Checks that every overlapping pair is found once, and removed events are left out
+        """
+        pairs = [(earlier.id, later.id) for earlier, later in self.index.conflicts()]
+        self.assertEqual([('5', '0'), ('5', '1'), ('0', '1'), ('5', '2'), ('5', '3'), ('2', '3'), ('5', '4'),
+                          ('5', 'holiday')], pairs)
+
+        self.index.remove_event('5')
+        self.assertEqual([('0', '1'), ('2', '3')],
+                         [(earlier.id, later.id) for earlier, later in self.index.conflicts()])
+        self.assertEqual(6, len(self.index))
+
+    def test_free_slots(self):
+        """
+        Checks that the gaps at least as long as the duration are found, including at the ends of the range
+        """
+        index = IntervalIndex(self.events[1:6])
+        self.assertEqual([(self.at(8), self.at(9)), (self.at(11), self.at(13)), (self.at(15), self.at(16)),
+                          (self.at(16.5), self.at(18))],
+                         index.free_slots(self.at(8), self.at(18), datetime.timedelta(minutes=45)))
+        self.assertEqual([(self.at(11), self.at(13))],
+                         index.free_slots(self.at(8), self.at(18), datetime.timedelta(hours=2)))
+
+    def test_all_day_excluded(self):
+        """
+        Checks that all day events can be left out of the index
+        """
+        self.assertNotIn('holiday', [event.id for event in IntervalIndex(self.events, include_all_day=False)
+                                     .overlapping(self.at(30), self.at(31))])
+
+    def test_calendar_queries(self):
+        """
+        Checks that the calendar answers overlaps and free slots from its events, or from the free/busy endpoint
+        """
+        mock_api = MagicMock()
+        past_events = {'items': [{'id': '1', 'summary': 'Lecture', 'start': {'dateTime': '2020-08-03T10:00:00Z'},
+                                  'end': {'dateTime': '2020-08-03T11:00:00Z'}, 'reminders': {'useDefault': True}}],
+                       'defaultReminders': [{'method': 'popup', 'minutes': 10}]}
+        mock_api.events.return_value.list.return_value.execute.side_effect = [past_events,
+                                                                              dict(past_events, items=[])]
+        mock_api.freebusy.return_value.query.return_value.execute.return_value = {'calendars': {
+            'a@student.monash.edu': {'busy': [{'start': '2020-08-03T09:00:00Z', 'end': '2020-08-03T12:00:00Z'}]},
+            'b@student.monash.edu': {'busy': [{'start': '2020-08-03T13:00:00Z', 'end': '2020-08-03T14:00:00Z'}]},
+            'c@gmail.com': {'errors': [{'domain': 'global', 'reason': 'notFound'}]}}}
+        calendar = Calendar(mock_api, lazy=True)
+
+        self.assertEqual(['1'], [event.id for event in calendar.get_events_between('2020-08-03T10:30:00Z',
+                                                                                   '2020-08-03T10:45:00Z')])
+        self.assertEqual([(self.at(8), self.at(10)), (self.at(11), self.at(12))],
+                         calendar.find_free_slots(self.at(8), self.at(12), datetime.timedelta(hours=1)))
+
+        slots = calendar.find_free_slots(self.at(8), self.at(15), datetime.timedelta(hours=1),
+                                         calendar_ids=['a@student.monash.edu', 'b@student.monash.edu'])
+        self.assertEqual([(self.at(8), self.at(9)), (self.at(12), self.at(13)), (self.at(14), self.at(15))], slots)
+        body = mock_api.freebusy.return_value.query.call_args[1]['body']
+        self.assertEqual('2020-08-03T08:00:00Z', body['timeMin'])
+        self.assertEqual([{'id': 'a@student.monash.edu'}, {'id': 'b@student.monash.edu'}], body['items'])
+
+        self.assertRaises(ValueError, calendar.get_busy_intervals, self.at(8), self.at(15), ['c@gmail.com'])
+
+    def test_calendar_time_zone_and_transparency(self):
+        """
+        Checks that all day events take up their dates in the calendar's timezone, and transparent events
+        leave their time free
+        """
+        mock_api = MagicMock()
+        past_events = {'items': [{'id': 'holiday', 'start': {'date': '2020-10-13'}, 'end': {'date': '2020-10-14'},
+                                  'reminders': {'useDefault': True}},
+                                 {'id': 'busy', 'start': {'dateTime': '2020-10-14T09:00:00+11:00'},
+                                  'end': {'dateTime': '2020-10-14T10:00:00+11:00'}, 'reminders': {'useDefault': True}},
+                                 {'id': 'free', 'start': {'dateTime': '2020-10-14T09:30:00+11:00'},
+                                  'end': {'dateTime': '2020-10-14T12:00:00+11:00'}, 'transparency': 'transparent',
+                                  'reminders': {'useDefault': True}}],
+                       'defaultReminders': [{'method': 'popup', 'minutes': 10}], 'timeZone': 'Australia/Melbourne'}
+        mock_api.events.return_value.list.return_value.execute.side_effect = [past_events,
+                                                                              dict(past_events, items=[])]
+        calendar = Calendar(mock_api, lazy=True)
+
+        self.assertEqual(['busy', 'free'], [event.id for event in calendar.get_events_between(
+            '2020-10-14T09:00:00+11:00', '2020-10-14T10:00:00+11:00')])
+        self.assertEqual(['holiday'], [event.id for event in calendar.get_events_between(
+            '2020-10-13T23:00:00+11:00', '2020-10-14T00:00:00+11:00')])
+        melbourne = datetime.timezone(datetime.timedelta(hours=11))
+        day = datetime.datetime(2020, 10, 14, tzinfo=melbourne)
+        self.assertEqual([(day, day + datetime.timedelta(hours=9)),
+                          (day + datetime.timedelta(hours=10), day + datetime.timedelta(hours=24))],
+                         calendar.find_free_slots(day, day + datetime.timedelta(hours=24), datetime.timedelta(hours=1)))
+        self.assertEqual([], calendar.find_conflicts())
+        self.assertIn('transparency', Calendar.FIELDS_INDEX)
+
+
+class PooledConnection:
+    """
+    Stands in for an authorised HTTP connection, recording how many connections are in use at once
+    """
+    def __init__(self, usage):
+        self.usage = usage
+        self.closed = False
+
+    def request(self, uri, method='GET', body=None, headers=None):
+        with self.usage['lock']:
+            self.usage['active'] += 1
+            self.usage['peak'] = max(self.usage['peak'], self.usage['active'])
+        time.sleep(0.01)
+        with self.usage['lock']:
+            self.usage['active'] -= 1
+        return httplib2.Response({'status': '200', 'content-type': 'application/json'}), b'{"items": []}'
+
+    def close(self):
+        self.closed = True
+
+
+class CalendarTestHttpPool(unittest.TestCase):
+    """
+    Test suite for sharing a bounded pool of connections between threads
+    """
+    def setUp(self) -> None:
+        self.usage = {'lock': threading.Lock(), 'active': 0, 'peak': 0}
+        self.opened = []
+        self.credentials = Mock(valid=True, universe_domain='googleapis.com')
+
+        def open_connection():
+            connection = PooledConnection(self.usage)
+            self.opened.append(connection)
+            return connection
+
+        self.pool = AuthorizedHttpPool(self.credentials, size=3, http_factory=open_connection)
+
+    def test_bounded_and_reused(self):
+        """
+        Checks that concurrent requests share at most the pool size of connections, which are reused
+        """
+        threads = [threading.Thread(target=self.pool.request, args=('https://example.com',)) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertLessEqual(self.usage['peak'], 3)
+        self.assertLessEqual(len(self.opened), 3)
+        self.pool.request('https://example.com')
+        self.assertLessEqual(len(self.opened), 3)
+
+        self.pool.close()
+        self.assertTrue(all(connection.closed for connection in self.opened))
+
+    def test_timeout(self):
+        """
+        Checks that waiting for a connection gives up after the timeout
+        """
+        pool = AuthorizedHttpPool(self.credentials, size=1, http_factory=lambda: PooledConnection(self.usage),
+                                  timeout=0.01)
+        with pool.connection():
+            self.assertRaises(TimeoutError, pool.acquire)
+        pool.acquire()
+
+    def test_refreshed_once(self):
+        """
+        Checks that expired credentials are refreshed by one thread, while the others wait for it
+        """
+        self.credentials.valid = False
+
+        def refresh(request):
+            time.sleep(0.01)
+            self.credentials.valid = True
+
+        self.credentials.refresh.side_effect = refresh
+        threads = [threading.Thread(target=self.pool.request, args=('https://example.com',)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, self.credentials.refresh.call_count)
+
+    def test_api_built_on_pool(self):
+        """
+        Checks that the API client makes its requests through the pool
+        """
+        api = CalendarModule.build('calendar', 'v3', http=self.pool, static_discovery=True, cache_discovery=False)
+        self.assertEqual({'items': []}, api.events().list(calendarId='primary').execute())
+        self.assertEqual(1, len(self.opened))
+
+    def test_bytes_received(self):
+        """
+        Checks that the bytes of each response body are counted as they are received
+        """
+        sink = MemorySink()
+        pool = AuthorizedHttpPool(self.credentials, http_factory=lambda: PooledConnection(self.usage),
+                                  instrumentation=Instrumentation(sink))
+        api = CalendarModule.build('calendar', 'v3', http=pool, static_discovery=True, cache_discovery=False)
+        for _ in range(2):
+            api.events().list(calendarId='primary', fields=Calendar.FIELDS_INDEX).execute()
+        self.assertEqual({'bytes_received': 2 * len(b'{"items": []}')}, sink.stats()['counters'])
+
+
+class CalendarTestBenchmarkApi(unittest.TestCase):
+    """
+    Test suite for the generated calendar the benchmarks run against
+    """
+    def setUp(self) -> None:
+        self.api = FakeCalendarApi(3000)
+        self.calendar = Calendar(self.api, executor=RequestExecutor(rate=None))
+
+    def test_fetch_pages_through_every_event(self):
+        """
+        Checks that fetching the past and future windows pages through every generated event
+        """
+        events = self.calendar.get_past_events() + self.calendar.get_future_events()
+        ids = [event['id'] for event in events]
+        # An event may overlap the start of the future window, and so be fetched twice
+        self.assertEqual(len(set(ids)), 3000)
+        self.assertGreater(self.api.requests, 3000 // FakeCalendarApi.DEFAULT_PAGE_SIZE)
+
+    def test_events_are_deterministic(self):
+        """
+        Checks that the same event is generated each time, and that all day and timed events are mixed
+        """
+        other = FakeCalendarApi(3000, start=self.api.start)
+        self.assertEqual(self.api.make_event(123), other.make_event(123))
+        self.assertIn('date', self.api.make_event(0)['start'])
+        self.assertIn('dateTime', self.api.make_event(1)['start'])
+
+    def test_deleted_events_are_not_listed(self):
+        """
+        Checks that events deleted in bulk are no longer listed
+        """
+        events = self.calendar.get_past_events()[:60]
+        result = self.calendar.delete_events_bulk(events)
+        self.assertEqual(len(result['deleted']), 60)
+        remaining = {event['id'] for event in self.calendar.get_past_events()}
+        self.assertFalse(remaining & set(result['deleted']))
+
+    def test_compare_reports_regressions(self):
+        """
+        Checks that only benchmarks slowing down past the threshold are regressions
+        """
+        baseline = {'fetch': {'p50': 1.0}, 'search': {'p50': 1.0}}
+        results = {'fetch': {'p50': 1.1}, 'search': {'p50': 1.5}, 'delete': {'p50': 1.0}}
+        self.assertEqual(compare(results, baseline, 0.2), [('search', 1.5)])
+
+
 def main():
     # Create the test suite from the cases above.
     get_event_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestGetEvents)
+    iter_events_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestIterEvents)
+    event_store_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestEventStore)
     navigate_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestNavigateEvents)
+    date_index_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestDateIndex)
     search_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestSearchEvents)
+    keyword_index_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestKeywordIndex)
     delete_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestDeleteEvents)
+    bulk_delete_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestBulkDelete)
+    invite_attendees_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestInviteAttendees)
+    multi_calendar_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestMultiCalendar)
+    async_calendar_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestAsyncCalendar)
+    response_cache_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestResponseCache)
+    lazy_startup_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestLazyStartup)
+    event_model_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestEventModel)
+    event_table_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestEventTable)
+    event_formatter_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestEventFormatter)
+    batch_queries_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestBatchQueries)
+    request_executor_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestRequestExecutor)
+    instrumentation_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestInstrumentation)
+    sharded_fetch_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestShardedFetch)
+    partial_responses_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestPartialResponses)
+    recurring_events_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestRecurringEvents)
+    reminder_scheduler_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestReminderScheduler)
+    interval_index_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestIntervalIndex)
+    http_pool_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestHttpPool)
+    benchmark_api_suite = unittest.TestLoader().loadTestsFromTestCase(CalendarTestBenchmarkApi)
 
     # This will run the test suite.
     unittest.TextTestRunner(verbosity=2).run(get_event_suite)
+    unittest.TextTestRunner(verbosity=2).run(iter_events_suite)
+    unittest.TextTestRunner(verbosity=2).run(event_store_suite)
     unittest.TextTestRunner(verbosity=2).run(navigate_suite)
+    unittest.TextTestRunner(verbosity=2).run(date_index_suite)
     unittest.TextTestRunner(verbosity=2).run(search_suite)
+    unittest.TextTestRunner(verbosity=2).run(keyword_index_suite)
     unittest.TextTestRunner(verbosity=2).run(delete_suite)
+    unittest.TextTestRunner(verbosity=2).run(bulk_delete_suite)
+    unittest.TextTestRunner(verbosity=2).run(invite_attendees_suite)
+    unittest.TextTestRunner(verbosity=2).run(multi_calendar_suite)
+    unittest.TextTestRunner(verbosity=2).run(async_calendar_suite)
+    unittest.TextTestRunner(verbosity=2).run(response_cache_suite)
+    unittest.TextTestRunner(verbosity=2).run(lazy_startup_suite)
+    unittest.TextTestRunner(verbosity=2).run(event_model_suite)
+    unittest.TextTestRunner(verbosity=2).run(event_table_suite)
+    unittest.TextTestRunner(verbosity=2).run(event_formatter_suite)
+    unittest.TextTestRunner(verbosity=2).run(batch_queries_suite)
+    unittest.TextTestRunner(verbosity=2).run(request_executor_suite)
+    unittest.TextTestRunner(verbosity=2).run(instrumentation_suite)
+    unittest.TextTestRunner(verbosity=2).run(sharded_fetch_suite)
+    unittest.TextTestRunner(verbosity=2).run(partial_responses_suite)
+    unittest.TextTestRunner(verbosity=2).run(recurring_events_suite)
+    unittest.TextTestRunner(verbosity=2).run(reminder_scheduler_suite)
+    unittest.TextTestRunner(verbosity=2).run(interval_index_suite)
+    unittest.TextTestRunner(verbosity=2).run(http_pool_suite)
+    unittest.TextTestRunner(verbosity=2).run(benchmark_api_suite)
 
 
 if __name__ == "__main__":